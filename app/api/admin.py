@@ -0,0 +1,81 @@
+"""
+Admin API endpoints - operational information about the loaded models and hot reload.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.api.deps import current_models
+from app.core.cache import response_cache
+from app.services.batching import coalescer
+from app.services import model_store
+from app.services.model_store import ModelBundle
+
+router = APIRouter()
+
+
+# ─── Loaded Models ────────────────────────────────────────────
+@router.get("/models", summary="Loaded Models / Modelos Cargados")
+def get_loaded_models(models: ModelBundle = Depends(current_models)):
+    """
+    **EN**: Version, load time and memory footprint of every artifact held by the shared model store, plus the versions available on disk.
+    **ES**: Versión, tiempo de carga y memoria ocupada por cada artefacto del almacén de modelos compartido, y las versiones disponibles en disco.
+    """
+    info = models.info()
+    info["available_versions"] = model_store.list_versions(model_store.MODEL_PATH)
+    info["current_version_on_disk"] = model_store.current_version(model_store.MODEL_PATH)
+    return info
+
+
+# ─── Hot Reload ───────────────────────────────────────────────
+@router.post("/models/reload", status_code=202, summary="Reload Models / Recargar Modelos")
+def reload_models(version: Optional[str] = Query(default=None)):
+    """
+    **EN**: Load a model version (default: the one named in `models/CURRENT`) in the background and swap it in atomically. In-flight requests finish on the previous version.
+    **ES**: Carga una versión de los modelos (por defecto: la indicada en `models/CURRENT`) en segundo plano y la activa de forma atómica. Las peticiones en curso terminan con la versión anterior.
+    """
+    if version is not None and version not in model_store.list_versions(model_store.MODEL_PATH):
+        raise HTTPException(status_code=404, detail=f"Model version {version!r} not found")
+    try:
+        return model_store.reload_models(version)
+    except model_store.ReloadInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/models/reload", summary="Reload Status / Estado de la Recarga")
+def get_reload_status():
+    """
+    **EN**: State of the last model reload, including load time and the memory footprint of the new and previous bundles (memory-mapped part included).
+    **ES**: Estado de la última recarga de modelos, incluyendo tiempo de carga y la memoria de los modelos nuevos y anteriores (incluida la parte mapeada en memoria).
+    """
+    return model_store.reload_status()
+
+
+# ─── Response Cache ───────────────────────────────────────────
+@router.get("/cache", summary="Response Cache Stats / Estadísticas de la Caché de Respuestas")
+def get_cache_stats():
+    """
+    **EN**: Size, limits and hit/miss/eviction/invalidation counters of the in-process response cache.
+    **ES**: Tamaño, límites y contadores de aciertos/fallos/desalojos/invalidaciones de la caché de respuestas en proceso.
+    """
+    return response_cache.stats()
+
+
+@router.delete("/cache", summary="Clear Response Cache / Vaciar Caché de Respuestas")
+def clear_cache():
+    """
+    **EN**: Drop every cached response. Counters are kept.
+    **ES**: Elimina todas las respuestas en caché. Los contadores se conservan.
+    """
+    response_cache.clear()
+    return response_cache.stats()
+
+
+# ─── Scoring Coalescer ────────────────────────────────────────
+@router.get("/coalescer", summary="Scoring Coalescer Stats / Estadísticas del Agrupador de Puntuación")
+def get_coalescer_stats():
+    """
+    **EN**: Batch sizes and queueing delay of the collaborative-filtering micro-batching coalescer (`RECSYS_COALESCE=1`).
+    **ES**: Tamaños de lote y demora en cola del agrupador de micro-lotes del filtro colaborativo (`RECSYS_COALESCE=1`).
+    """
+    return coalescer.stats()
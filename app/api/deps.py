@@ -0,0 +1,20 @@
+"""
+Shared FastAPI dependencies.
+"""
+from fastapi import Response
+
+from app.services.model_store import ModelBundle, get_models
+
+MODEL_VERSION_HEADER = "X-Model-Version"
+
+
+def current_models(response: Response) -> ModelBundle:
+    """
+    Resolve the serving model bundle once per request.
+
+    The request keeps this bundle even if a reload swaps in a new version
+    meanwhile, and the response reports which version produced it.
+    """
+    models = get_models()
+    response.headers[MODEL_VERSION_HEADER] = models.version
+    return models
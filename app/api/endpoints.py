@@ -1,169 +1,275 @@
-
-from fastapi import APIRouter, HTTPException, Query
-from pydantic import BaseModel
-from typing import List, Optional
-import pickle
-import pandas as pd
 import numpy as np
-import os
-import glob
-
-router = APIRouter()
-
-# --- Carga de Modelos ---
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "../services/models")
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 
-try:
-    with open(os.path.join(MODEL_PATH, "association_rules.pkl"), "rb") as f:
-        rules = pickle.load(f)
-    print("Reglas de asociación cargadas.")
+from app.core.metrics import stage
+from app.services.batching import score_user
+from app.services.collaborative import DEFAULT_NEIGHBORS, score_fold_in, score_fold_in_rows, score_users
+from app.api.deps import current_models
+from app.services.model_store import ModelBundle
 
-    with open(os.path.join(MODEL_PATH, "user_correlation_matrix.pkl"), "rb") as f:
-        corr_matrix = pickle.load(f)
-    print("Matriz de correlación cargada.")
-
-    # Cargar matriz usuario-item para saber qué compraron
-    with open(os.path.join(MODEL_PATH, "user_item_matrix.pkl"), "rb") as f:
-        user_item_matrix = pickle.load(f)
-    print("Matriz usuario-item cargada.")
+router = APIRouter()
 
-    with open(os.path.join(MODEL_PATH, "product_catalog.pkl"), "rb") as f:
-        product_catalog = pickle.load(f)
-    print("Catálogo de productos cargado.")
-    
-except FileNotFoundError as e:
-    print(f"Error cargando modelos: {e}. Asegúrese de ejecutar el script de entrenamiento primero.")
-    rules = None
-    corr_matrix = None
-    user_item_matrix = None
-    product_catalog = None
-
-# --- Load translations ---
-translations_path = os.path.join(MODEL_PATH, "product_translations.pkl")
-product_translations = {}
-if os.path.exists(translations_path):
-    with open(translations_path, "rb") as f:
-        product_translations = pickle.load(f)
-    print(f"✅ Traducciones cargadas: {len(product_translations)} entradas.")
-else:
-    print("⚠️  Traducciones no encontradas. Ejecute scripts/translate_catalog.py.")
-
-
-def _translate(name: str, lang: str) -> str:
-    """Translate a product name to the requested language."""
-    if lang == "es" and product_translations:
-        return product_translations.get(name, product_translations.get(name.upper(), name))
-    return name
+# Los modelos se cargan una sola vez por proceso en app.services.model_store
+# y se comparten con el router del dashboard.
 
 
 # --- Schemas ---
 class RecommendationRequest(BaseModel):
     user_id: int
-    top_n: int = 5
+    top_n: int = Field(5, ge=1)
 
 class AssociationRequest(BaseModel):
     cart_items: List[str] # Lista de nombres de productos o IDs
-    top_n: int = 3
+    top_n: int = Field(3, ge=1)
+    # "any": algún antecedente está en el carrito; "subset": todos los antecedentes están en el carrito
+    match_mode: Literal["any", "subset"] = "any"
 
 class ProductRecommendation(BaseModel):
     rank: int
     product_name: str
     score: Optional[float] = None # Confianza o similitud
 
+MAX_BATCH_USERS = 5000
+
+# Origen y antigüedad de las recomendaciones de /recommend/user/{user_id}
+SOURCE_HEADER = "X-Recommendations-Source"
+GENERATED_AT_HEADER = "X-Recommendations-Generated-At"
+
+class BatchRecommendationRequest(BaseModel):
+    user_ids: List[int] = Field(..., max_length=MAX_BATCH_USERS)
+    top_n: int = Field(5, ge=1)
+    weighted: bool = False
+    fold_in: bool = False # Igual que en /recommend/user/{user_id}
+    n_probe: Optional[int] = Field(default=None, ge=1) # Celdas del índice ANN a recorrer (más = más recall)
+
+class FoldInRequest(BaseModel):
+    items: List[str] = Field(..., min_length=1, max_length=1000) # StockCodes comprados o en el carrito
+    top_n: int = Field(5, ge=1)
+    weighted: bool = False
+    n_probe: Optional[int] = Field(default=None, ge=1) # Celdas del índice ANN a recorrer (más = más recall)
+
+class SimilarItemsRequest(BaseModel):
+    items: List[str] = Field(..., min_length=1, max_length=1000) # StockCodes (carrito, sesión o lista)
+    top_n: int = Field(5, ge=1)
+
+class UserRecommendations(BaseModel):
+    user_id: int
+    recommendations: List[ProductRecommendation]
+
+class UserError(BaseModel):
+    user_id: int
+    detail: str
+
+class BatchRecommendationResponse(BaseModel):
+    results: List[UserRecommendations]
+    errors: List[UserError]
+
+
+def _format_recommendations(models: ModelBundle, item_cols, scores, lang: str) -> List[ProductRecommendation]:
+    """Convierte columnas de la matriz usuario-item y sus puntajes en la respuesta de la API."""
+    # Nombres precalculados por idioma: una sola indexación por lote
+    with stage("names"):
+        names = models.item_names.lookup(item_cols, lang, unknown="Unknown Product ({code})")
+    return [
+        ProductRecommendation(rank=i + 1, product_name=name, score=float(score))
+        for i, (name, score) in enumerate(zip(names, scores))
+    ]
+
+def _fold_in(models: ModelBundle, bought_cols, top_n: int, weighted: bool, exclude_row=None, n_probe=None):
+    """Proyecta las compras en el espacio latente (SVD) y puntúa con los vecinos encontrados al momento."""
+    if models.latent is None:
+        raise HTTPException(status_code=503, detail="Modelo SVD no cargado; reentrene para habilitar fold-in")
+    with stage("neighbors"):
+        factors = models.latent.project(bought_cols)
+        # Con índice ANN (IVF) solo se recorren las `n_probe` celdas más cercanas
+        neighbor_rows, similarities = models.latent.nearest(
+            factors, DEFAULT_NEIGHBORS, exclude=exclude_row, ann=models.user_ann, n_probe=n_probe
+        )
+    return score_fold_in(models.user_item_matrix, neighbor_rows, similarities, bought_cols, top_n, weighted=weighted)
+
+def _fold_in_rows(models: ModelBundle, rows, top_n: int, weighted: bool, n_probe=None):
+    """Fold-in de varios usuarios de la matriz: una proyección, una búsqueda de vecinos y un puntaje para todos."""
+    if models.latent is None:
+        raise HTTPException(status_code=503, detail="Modelo SVD no cargado; reentrene para habilitar fold-in")
+    bought = models.user_item_matrix.purchased[rows]
+    with stage("neighbors"):
+        factors = models.latent.project_rows(bought)
+        neighbors = models.latent.nearest_rows(
+            factors, DEFAULT_NEIGHBORS, exclude=rows, ann=models.user_ann, n_probe=n_probe
+        )
+    return score_fold_in_rows(models.user_item_matrix, neighbors, bought, top_n, weighted=weighted)
+
+def _without_neighbors(models: ModelBundle, rows) -> np.ndarray:
+    """Filas de la matriz sin vecinos precalculados (usuarios nuevos desde el último entrenamiento)."""
+    rows = np.asarray(rows, dtype=np.int64)
+    index = models.neighbor_index
+    missing = rows >= index.n_users
+    if index.k == 0:
+        return np.ones(len(rows), dtype=bool)
+    missing[~missing] = index.neighbors[rows[~missing], 0] < 0
+    return missing
+
 # --- Endpoints ---
 
 @router.get("/user/{user_id}", response_model=List[ProductRecommendation], summary="Personalized User Recommendations / Recomendaciones Personalizadas de Usuario")
-def recommend_user(user_id: int, top_n: int = 5, lang: str = Query(default="en")):
+def recommend_user(response: Response, user_id: int, top_n: int = Query(default=5, ge=1), lang: str = Query(default="en"), weighted: bool = Query(default=False), fold_in: bool = Query(default=False), n_probe: Optional[int] = Query(default=None, ge=1), models: ModelBundle = Depends(current_models)):
     """
-    **EN**: Get personalized recommendations using Collaborative Filtering.
-    **ES**: Obtiene recomendaciones personalizadas usando Filtro Colaborativo.
+    **EN**: Get personalized recommendations using Collaborative Filtering. With `weighted=true` scores are the summed similarity of the neighbors who bought each product instead of their count. With `fold_in=true` the user's current purchases are projected into the SVD latent space and neighbors are found at request time; this is automatic for users added since the last full training. Neighbor search uses the approximate (IVF) index when the model has one; `n_probe` sets how many of its cells are scanned (higher is slower with better recall). When the model version has precomputed lists (`notebooks/materialize_recommendations.py`) covering the request they are served directly; the `X-Recommendations-Source` header (`materialized`/`online`) and `X-Recommendations-Generated-At` report where the list came from and how fresh it is.
+    **ES**: Obtiene recomendaciones personalizadas usando Filtro Colaborativo. Con `weighted=true` el puntaje es la suma de similitudes de los vecinos que compraron cada producto en lugar de su cantidad. Con `fold_in=true` las compras actuales del usuario se proyectan en el espacio latente SVD y los vecinos se buscan al momento; es automático para usuarios agregados desde el último entrenamiento completo. La búsqueda de vecinos usa el índice aproximado (IVF) si el modelo lo tiene; `n_probe` fija cuántas de sus celdas se recorren (más alto es más lento con mejor recall). Si la versión del modelo tiene listas precalculadas (`notebooks/materialize_recommendations.py`) que cubren la petición se sirven directamente; los encabezados `X-Recommendations-Source` (`materialized`/`online`) y `X-Recommendations-Generated-At` indican el origen de la lista y su antigüedad.
     """
-    if corr_matrix is None or user_item_matrix is None:
+    if models.neighbor_index is None or models.user_item_matrix is None:
         raise HTTPException(status_code=503, detail="Modelos no cargados")
     
-    if user_id not in user_item_matrix.index:
+    user_idx = models.user_item_matrix.row_of(user_id)
+    if user_idx is None:
          raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
-    # Lógica de recomendación (copiada y adaptada del notebook)
-    user_idx = list(user_item_matrix.index).index(user_id)
-    
-    # Top similares
-    similar_users_indices = corr_matrix[user_idx].argsort()[::-1][1:6]
-    
-    recommended_products = []
-    for similar_idx in similar_users_indices:
-        # Productos que compraron los vecinos
-        vecino_series = user_item_matrix.iloc[similar_idx]
-        products_bought = vecino_series[vecino_series > 0].index.tolist()
-        
-        # Productos que ya compró el usuario objetivo
-        user_series = user_item_matrix.iloc[user_idx]
-        already_bought = user_series[user_series > 0].index.tolist()
-        
-        new_recs = [p for p in products_bought if p not in already_bought]
-        recommended_products.extend(new_recs)
-        
-    from collections import Counter
-    rec_counts = Counter(recommended_products)
-    top_recs_codes = [code for code, count in rec_counts.most_common(top_n)]
+    # Usuarios sin vecinos precalculados (nuevos desde el último entrenamiento): fold-in
+    no_neighbors = bool(_without_neighbors(models, [user_idx])[0])
+    if fold_in or (no_neighbors and models.latent is not None):
+        bought_cols, _ = models.user_item_matrix.row_items(user_idx)
+        top_recs_cols, top_recs_scores = _fold_in(models, bought_cols, top_n, weighted, exclude_row=user_idx, n_probe=n_probe)
+        response.headers[SOURCE_HEADER] = "online"
+        return _format_recommendations(models, top_recs_cols, top_recs_scores, lang)
+
+    # Listas precalculadas: lectura O(1) de la fila del usuario
+    materialized = models.materialized
+    if materialized is not None and user_idx < materialized.n_users and materialized.covers(top_n, weighted):
+        with stage("materialized"):
+            top_recs_cols, top_recs_scores = materialized.lookup(user_idx, top_n)
+        response.headers[SOURCE_HEADER] = "materialized"
+        response.headers[GENERATED_AT_HEADER] = materialized.generated_at_iso
+        return _format_recommendations(models, top_recs_cols, top_recs_scores, lang)
+
+    # Filtro colaborativo vectorizado: suma de las filas de los vecinos,
+    # enmascarando lo que el usuario ya compró y selección parcial del top-N.
+    # Con RECSYS_COALESCE=1 las peticiones concurrentes se puntúan juntas en un lote.
+    top_recs_cols, top_recs_scores = score_user(models, user_idx, top_n, weighted=weighted)
+    response.headers[SOURCE_HEADER] = "online"
     
     # Formatear respuesta
-    results = []
-    for i, code in enumerate(top_recs_codes):
-        # Buscar nombre en catálogo
-        try:
-            name = product_catalog.loc[code, 'Description']
-            # Si hay duplicados puede devolver series, tomamos el primero
-            if isinstance(name, pd.Series):
-                name = name.iloc[0]
-        except KeyError:
-            name = f"Unknown Product ({code})"
-            
-        results.append(ProductRecommendation(rank=i+1, product_name=_translate(str(name), lang), score=rec_counts[code]))
-        
-    return results
+    return _format_recommendations(models, top_recs_cols, top_recs_scores, lang)
+
+@router.post("/users/batch", response_model=BatchRecommendationResponse, summary="Batch User Recommendations / Recomendaciones de Usuario por Lote")
+def recommend_users_batch(request: BatchRecommendationRequest, lang: str = Query(default="en"), models: ModelBundle = Depends(current_models)):
+    """
+    **EN**: Personalized recommendations for many users in one call (e.g. email or push campaigns), with the same sources and order as `/recommend/user/{user_id}`: fold-in for users without precomputed neighbors (or all of them with `fold_in=true`), then the precomputed lists when they cover the request, and the remaining users are scored together in one vectorized pass. Each source handles all of its users at once: fold-in users share one projection, neighbor search and scoring pass, and the precomputed lists are read in one slice. `n_probe` tunes the approximate neighbor search of fold-in as in `/recommend/user/{user_id}`. Unknown users are reported in `errors`.
+    **ES**: Recomendaciones personalizadas para muchos usuarios en una sola llamada (p. ej. campañas de email o push), con los mismos orígenes y orden que `/recommend/user/{user_id}`: fold-in para los usuarios sin vecinos precalculados (o todos con `fold_in=true`), luego las listas precalculadas si cubren la petición, y el resto se puntúa junto en una sola pasada vectorizada. Cada origen atiende a todos sus usuarios a la vez: los de fold-in comparten una proyección, una búsqueda de vecinos y una pasada de puntaje, y las listas precalculadas se leen en un solo corte. `n_probe` ajusta la búsqueda aproximada de vecinos del fold-in como en `/recommend/user/{user_id}`. Los usuarios desconocidos se informan en `errors`.
+    """
+    if models.neighbor_index is None or models.user_item_matrix is None:
+        raise HTTPException(status_code=503, detail="Modelos no cargados")
+
+    rows = models.user_item_matrix.rows_of(request.user_ids)
+    found = rows >= 0
+    found_ids = [uid for uid, ok in zip(request.user_ids, found) if ok]
+
+    rows = rows[found]
+    top_n, weighted = request.top_n, request.weighted
+    scored = [None] * len(rows)
+    pending = np.ones(len(rows), dtype=bool)
+
+    # Mismo orden que /recommend/user/{user_id}: fold-in (pedido o sin vecinos), listas precalculadas, puntaje en línea
+    fold_in = np.ones(len(rows), dtype=bool) if request.fold_in else _without_neighbors(models, rows)
+    if (request.fold_in or models.latent is not None) and fold_in.any():
+        folded = np.flatnonzero(fold_in)
+        for i, result in zip(folded, _fold_in_rows(models, rows[folded], top_n, weighted, n_probe=request.n_probe)):
+            scored[i] = result
+        pending &= ~fold_in
+
+    materialized = models.materialized
+    if materialized is not None and materialized.covers(top_n, weighted):
+        with stage("materialized"):
+            stored = np.flatnonzero(pending & (rows < materialized.n_users))
+            for i, result in zip(stored, materialized.lookup_rows(rows[stored], top_n)):
+                scored[i] = result
+            pending[stored] = False
+
+    online = np.flatnonzero(pending)
+    for i, result in zip(online, score_users(models.user_item_matrix, models.neighbor_index, rows[online], top_n, weighted=weighted)):
+        scored[i] = result
+
+    return BatchRecommendationResponse(
+        results=[
+            UserRecommendations(user_id=uid, recommendations=_format_recommendations(models, cols, scores, lang))
+            for uid, (cols, scores) in zip(found_ids, scored)
+        ],
+        errors=[
+            UserError(user_id=uid, detail="Usuario no encontrado")
+            for uid, ok in zip(request.user_ids, found) if not ok
+        ],
+    )
+
+@router.post("/fold-in", response_model=List[ProductRecommendation], summary="Recommendations from Items / Recomendaciones a partir de Productos")
+def recommend_fold_in(request: FoldInRequest, lang: str = Query(default="en"), models: ModelBundle = Depends(current_models)):
+    """
+    **EN**: Collaborative-filtering recommendations for an ad-hoc list of stock codes (e.g. an anonymous session or a customer not yet in the model). The items are projected into the SVD latent space and scored with the most similar users; unknown stock codes are ignored. `n_probe` tunes the approximate neighbor search as in `/recommend/user/{user_id}`.
+    **ES**: Recomendaciones de filtro colaborativo para una lista de códigos de producto (p. ej. una sesión anónima o un cliente aún no incluido en el modelo). Los productos se proyectan en el espacio latente SVD y se puntúan con los usuarios más similares; los códigos desconocidos se ignoran. `n_probe` ajusta la búsqueda aproximada de vecinos como en `/recommend/user/{user_id}`.
+    """
+    if models.user_item_matrix is None:
+        raise HTTPException(status_code=503, detail="Modelos no cargados")
+
+    cols = models.user_item_matrix.cols_of(request.items)
+    cols = np.unique(cols[cols >= 0])
+    if len(cols) == 0:
+        raise HTTPException(status_code=404, detail="Ningún producto conocido")
+
+    top_recs_cols, top_recs_scores = _fold_in(models, cols, request.top_n, request.weighted, n_probe=request.n_probe)
+    return _format_recommendations(models, top_recs_cols, top_recs_scores, lang)
+
+@router.get("/item/{stock_code}", response_model=List[ProductRecommendation], summary="Similar Products / Productos Similares")
+def recommend_item(stock_code: str, top_n: int = Query(default=5, ge=1), lang: str = Query(default="en"), models: ModelBundle = Depends(current_models)):
+    """
+    **EN**: Products most often bought by the same customers as `stock_code` (item-to-item cosine similarity, precomputed at training time). Does not need a known customer.
+    **ES**: Productos comprados con más frecuencia por los mismos clientes que `stock_code` (similitud coseno entre productos, precalculada en el entrenamiento). No requiere un cliente conocido.
+    """
+    if models.item_neighbors is None or models.user_item_matrix is None:
+        raise HTTPException(status_code=503, detail="Modelo de similitud de productos no cargado")
+
+    col = models.user_item_matrix.cols_of([stock_code])[0]
+    if col < 0:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+
+    # Lista top-K precalculada: una sola lectura de fila
+    with stage("neighbors"):
+        top_recs_cols, top_recs_scores = models.item_neighbors.neighbors_of(col, top_n)
+    return _format_recommendations(models, top_recs_cols, top_recs_scores, lang)
+
+@router.post("/similar-items", response_model=List[ProductRecommendation], summary="Similar to Items in a List / Similares a una Lista de Productos")
+def recommend_similar_items(request: SimilarItemsRequest, lang: str = Query(default="en"), models: ModelBundle = Depends(current_models)):
+    """
+    **EN**: Products similar to a list of stock codes taken together (e.g. a cart or browsing session): each candidate scores the sum of its similarities to the listed products, which are excluded. Unknown stock codes are ignored.
+    **ES**: Productos similares a una lista de códigos tomados en conjunto (p. ej. un carrito o una sesión de navegación): cada candidato suma sus similitudes con los productos de la lista, que se excluyen. Los códigos desconocidos se ignoran.
+    """
+    if models.item_neighbors is None or models.user_item_matrix is None:
+        raise HTTPException(status_code=503, detail="Modelo de similitud de productos no cargado")
+
+    cols = models.user_item_matrix.cols_of(request.items)
+    cols = cols[cols >= 0]
+    if len(cols) == 0:
+        raise HTTPException(status_code=404, detail="Ningún producto conocido")
+
+    with stage("aggregate"):
+        top_recs_cols, top_recs_scores = models.item_neighbors.similar_to(cols, request.top_n)
+    return _format_recommendations(models, top_recs_cols, top_recs_scores, lang)
 
 @router.post("/association", response_model=List[ProductRecommendation], summary="Recommendations by Cart / Recomendaciones por Carrito")
-def recommend_association(request: AssociationRequest, lang: str = Query(default="en")):
+def recommend_association(request: AssociationRequest, lang: str = Query(default="en"), models: ModelBundle = Depends(current_models)):
     """
-    **EN**: Get recommendations based on items in the cart.
-    **ES**: Obtiene recomendaciones basadas en los productos del carrito.
+    **EN**: Get recommendations based on items in the cart. `match_mode="subset"` only uses rules whose antecedents are all in the cart.
+    **ES**: Obtiene recomendaciones basadas en los productos del carrito. `match_mode="subset"` solo usa reglas cuyos antecedentes están todos en el carrito.
     """
-    if rules is None:
+    if models.rule_index is None:
         raise HTTPException(status_code=503, detail="Modelo de reglas no cargado")
     
-    recommendations = []
-    
-    # Buscar reglas donde los antecedentes estén en el carrito
-    # Simplificación: Buscamos reglas donde el antecedente sea EXACTAMENTE uno de los items del carrito
-    # Una implementación más compleja buscaría subconjuntos.
-    
-    cart_set = set(request.cart_items)
-    
-    # Filtrar reglas relevantes
-    # rules['antecedents'] es un frozenset
-    relevant_rules = rules[rules['antecedents'].apply(lambda x: len(x.intersection(cart_set)) > 0)]
-    
-    # Ordenar por confianza y lift
-    relevant_rules = relevant_rules.sort_values(by=['confidence', 'lift'], ascending=False)
-    
-    seen_products = set(request.cart_items)
-    rank = 1
+    # Solo se recorren las reglas que mencionan items del carrito (índice invertido),
+    # ya ordenadas por confianza y lift
+    with stage("rules"):
+        matches = models.rule_index.recommend(request.cart_items, request.top_n, mode=request.match_mode)
     
-    for _, row in relevant_rules.iterrows():
-        consequents = list(row['consequents'])
-        for product in consequents:
-            if product not in seen_products:
-                recommendations.append(ProductRecommendation(
-                    rank=rank,
-                    product_name=_translate(str(product), lang),
-                    score=row['confidence']
-                ))
-                seen_products.add(product)
-                rank += 1
-                if rank > request.top_n:
-                    break
-        if rank > request.top_n:
-            break
-            
-    return recommendations
+    with stage("names"):
+        return [
+            ProductRecommendation(rank=i + 1, product_name=models.translate(str(product), lang), score=confidence)
+            for i, (product, confidence) in enumerate(matches)
+        ]
@@ -0,0 +1,211 @@
+"""
+In-process response cache for read-only GET endpoints.
+
+Dashboard responses and per-user recommendations are pure functions of
+(path, query parameters, model version), so `ResponseCacheMiddleware` keeps
+their bodies in a bounded LRU (entry count, total bytes and a TTL) keyed on
+those inputs. The model version comes from the serving bundle (version name
+and load time, so reloading the same version also counts as a change), and
+every entry of an older bundle is dropped as soon as a new one is served.
+
+Cached and freshly computed responses carry an ETag (the endpoint's own if
+it set one, else a hash of the body) and a matching `If-None-Match` gets a
+bodiless 304. Hit, miss, eviction and invalidation counters are exposed by
+`ResponseCache.stats()` for sizing the cache.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode
+
+from app.services.model_store import get_models
+
+CACHE_ENABLED = os.environ.get("RECSYS_CACHE", "1").lower() not in ("0", "false", "no")
+CACHE_MAX_ENTRIES = int(os.environ.get("RECSYS_CACHE_MAX_ENTRIES", "4096"))
+CACHE_MAX_BYTES = int(os.environ.get("RECSYS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL = float(os.environ.get("RECSYS_CACHE_TTL", "600"))
+# GET routes whose responses only depend on the path, query and model version
+CACHEABLE_PREFIXES = ("/dashboard/", "/recommend/user/")
+CACHE_HEADER = "X-Cache"
+
+
+class _Entry:
+    __slots__ = ("status", "headers", "body", "etag", "expires", "size")
+
+    def __init__(self, status, headers, body, etag, expires):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.expires = expires
+        self.size = len(body) + sum(len(k) + len(v) for k, v in headers)
+
+
+class ResponseCache:
+    """LRU of response bodies bounded by entry count, total bytes and age."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES, ttl: float = CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+
+    def _sync_version(self, version):
+        # A new model version makes every stored response stale
+        if version != self._version:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self.bytes = 0
+            self._version = version
+
+    def get(self, key, version):
+        with self._lock:
+            self._sync_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, version, entry: _Entry):
+        with self._lock:
+            # Responses computed on a version that is no longer serving are not stored
+            if version != self._version or entry.size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self.bytes += entry.size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": CACHE_ENABLED,
+                "model_version": self._version,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+response_cache = ResponseCache()
+
+
+def _bundle_version():
+    models = get_models()
+    return f"{models.version}@{models.loaded_at}"
+
+
+def _etag_matches(if_none_match, etag) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware serving cacheable GET responses from `response_cache`."""
+
+    def __init__(self, app, cache: ResponseCache = response_cache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not CACHE_ENABLED
+            or scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not scope["path"].startswith(CACHEABLE_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        if_none_match = request_headers.get("if-none-match")
+        # Parameter order does not change the response
+        query = urlencode(sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)))
+        key = (scope["path"], query)
+        version = _bundle_version()
+
+        entry = self.cache.get(key, version)
+        if entry is not None:
+            await self._send(send, entry, if_none_match, "HIT")
+            return
+
+        start = None
+        chunks = []
+
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+
+        body = b"".join(chunks)
+        headers = [
+            (k.decode("latin-1"), v.decode("latin-1")) for k, v in start.get("headers", [])
+            if k.lower() not in (b"content-length", CACHE_HEADER.lower().encode())
+        ]
+        if start["status"] != 200:
+            await self._send(send, _Entry(start["status"], headers, body, None, 0), None, "BYPASS")
+            return
+
+        # Keep an ETag set by the endpoint; otherwise derive one from the body
+        etag = next((v for k, v in headers if k.lower() == "etag"), None)
+        if etag is None:
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            headers.append(("etag", etag))
+        entry = _Entry(200, headers, body, etag, time.monotonic() + self.cache.ttl)
+        # Skipped if a reload swapped the bundle while this response was computed
+        if _bundle_version() == version:
+            self.cache.put(key, version, entry)
+        await self._send(send, entry, if_none_match, "MISS")
+
+    async def _send(self, send, entry: _Entry, if_none_match, cache_state: str):
+        headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in entry.headers]
+        headers.append((CACHE_HEADER.lower().encode(), cache_state.encode()))
+        if entry.etag is not None and _etag_matches(if_none_match, entry.etag):
+            headers = [(k, v) for k, v in headers if k.lower() != b"content-type"]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers.append((b"content-length", str(len(entry.body)).encode()))
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        await send({"type": "http.response.body", "body": entry.body})
@@ -0,0 +1,276 @@
+"""
+Request metrics in the Prometheus text format, plus per-request stage timings.
+
+`MetricsMiddleware` counts every HTTP request and observes its latency per
+route template (`/recommend/user/{user_id}`, not the raw path, so label
+cardinality stays bounded; cached responses are attributed to their route
+too), and counts 4xx/5xx responses separately.
+
+Hot paths mark their internal steps with `stage(name)`: neighbor lookup,
+candidate aggregation, name resolution, ... (`record_stage()` reports time
+measured elsewhere, such as a coalesced request's queueing and batch scoring
+on the coalescer thread, where the request's context is not visible). Each stage is observed in the
+`recsys_stage_duration_seconds` histogram and, within a request, added to a
+per-request record held in a context variable, which the middleware reports
+in a `Server-Timing` header (milliseconds, visible in browser dev tools).
+`serialize` in that header is the time from the end of the last stage to the
+response start (response-model validation and JSON encoding), and `total`
+the whole time until the response start.
+
+`registry.render()` returns every metric as Prometheus text; state that
+already lives elsewhere (model load timings, cache counters) is added at
+scrape time by collectors registered with `registry.register_collector()`.
+No client library is needed.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from starlette.routing import compile_path
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+SERVER_TIMING_HEADER = "Server-Timing"
+REQUEST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def metric_lines(name: str, help_text: str, samples, kind: str = "gauge") -> list:
+    """Prometheus text lines of a gauge (or counter) from (labels dict, value) samples, for collectors."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+    return lines
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> list:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in values]
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self) -> list:
+        with self._lock:
+            series = sorted((k, (list(counts), total)) for k, (counts, total) in self._series.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metrics owned by this process plus collectors that report external state at scrape time."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help_text: str, labelnames=()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames=(), buckets=REQUEST_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """`collector()` returns Prometheus text lines (see `metric_lines`)."""
+        self._collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.collect()
+        for collector in self._collectors:
+            lines += collector()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+http_requests = registry.counter(
+    "recsys_http_requests_total", "HTTP requests by method, route template and status.", ("method", "route", "status"),
+)
+http_errors = registry.counter(
+    "recsys_http_errors_total", "HTTP responses with a 4xx or 5xx status.", ("method", "route", "status_class"),
+)
+http_duration = registry.histogram(
+    "recsys_http_request_duration_seconds", "HTTP request latency until the end of the response body.", ("method", "route"),
+)
+stage_duration = registry.histogram(
+    "recsys_stage_duration_seconds", "Duration of internal stages of the recommendation hot paths.", ("stage",),
+    buckets=STAGE_BUCKETS,
+)
+
+
+# ─── Per-request stage timings ────────────────────────────────
+class _RequestTimings:
+    __slots__ = ("stages", "last_end")
+
+    def __init__(self):
+        self.stages = {}
+        self.last_end = None
+
+    def add(self, name: str, seconds: float, end: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.last_end = end
+
+    def server_timing(self, total: float, now: float) -> str:
+        entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items()]
+        if self.last_end is not None:
+            entries.append(f"serialize;dur={(now - self.last_end) * 1000:.3f}")
+        entries.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(entries)
+
+
+_request_timings = contextvars.ContextVar("recsys_request_timings", default=None)
+
+
+def record_stage(name: str, seconds: float, end: float = None):
+    """Record `seconds` spent in stage `name` that ended at `end` (default: now), e.g. work done on another thread."""
+    stage_duration.observe(seconds, name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(name, seconds, time.perf_counter() if end is None else end)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as stage `name` (histogram, plus the current request's Server-Timing if any)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        record_stage(name, end - start, end)
+
+
+# ─── Middleware ───────────────────────────────────────────────
+def route_templates(app) -> list:
+    """
+    (regex, methods, template) of every route of a FastAPI `app`.
+
+    Routes of included routers are taken from the OpenAPI paths (full
+    templates on every FastAPI version), the rest from `app.routes`.
+    """
+    templates = {}
+    for route in app.routes:
+        path = getattr(route, "path", None)
+        if path:
+            templates.setdefault(path, set()).update(getattr(route, "methods", None) or ())
+    for path, operations in app.openapi().get("paths", {}).items():
+        templates.setdefault(path, set()).update(method.upper() for method in operations)
+    return [(compile_path(path)[0], methods, path) for path, methods in templates.items()]
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, errors and latency, and adding `Server-Timing`."""
+
+    def __init__(self, app, routes_of=None):
+        self.app = app
+        # FastAPI app whose route templates label the metrics (built on first use)
+        self.routes_of = routes_of
+        self._templates = None
+
+    def _route(self, scope) -> str:
+        if self.routes_of is None:
+            return "unmatched"
+        if self._templates is None:
+            self._templates = route_templates(self.routes_of)
+        path, method = scope["path"], scope["method"]
+        for regex, methods, template in self._templates:
+            if (not methods or method in methods) and regex.match(path):
+                return template
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = _RequestTimings()
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                now = time.perf_counter()
+                header = timings.server_timing(now - start, now)
+                message = {**message, "headers": [*message.get("headers", []), (SERVER_TIMING_HEADER.lower().encode(), header.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            _request_timings.reset(token)
+            route = self._route(scope)
+            method = scope["method"]
+            http_duration.observe(time.perf_counter() - start, method, route)
+            http_requests.inc(method, route, str(status))
+            if status >= 400:
+                http_errors.inc(method, route, f"{status // 100}xx")
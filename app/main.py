@@ -1,8 +1,25 @@
-
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from app.api.endpoints import router as recommendation_router
 from app.api.dashboard import router as dashboard_router
+from app.api.admin import router as admin_router
+from app.core.cache import ResponseCacheMiddleware, response_cache
+from app.core.metrics import CONTENT_TYPE, SERVER_TIMING_HEADER, MetricsMiddleware, metric_lines, registry
+from app.services.model_store import get_models, watch_models
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load every model artifact once, before serving the first request
+    get_models()
+    # Optionally pick up new model versions written by the training script
+    if os.environ.get("RECSYS_WATCH_MODELS", "").lower() in ("1", "true", "yes"):
+        watch_models(float(os.environ.get("RECSYS_WATCH_INTERVAL", "5")))
+    yield
+
 
 app = FastAPI(
     title="RecSys Engine APIs — Motor de Recomendaciones",
@@ -23,9 +40,13 @@ Esta API proporciona recomendaciones personalizadas de productos utilizando Filt
 * **Recomendaciones de Usuario**: Sugerencias personalizadas basadas en el comportamiento del usuario.
 * **Reglas de Asociación**: Análisis de canasta (productos que se compran juntos frecuentemente).
 * **Datos del Dashboard**: Estadísticas y analíticas para el frontend.""",
-    version="1.0"
+    version="1.0",
+    lifespan=lifespan,
 )
 
+# Response cache for read-only GET endpoints (inside CORS, so cached responses get CORS headers)
+app.add_middleware(ResponseCacheMiddleware)
+
 # CORS for React frontend
 app.add_middleware(
     CORSMiddleware,
@@ -33,11 +54,63 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browser dev tools show the per-stage timings of cross-origin responses
+    expose_headers=[SERVER_TIMING_HEADER],
 )
 
+# Request counts, latency histograms and Server-Timing for every request (outermost, so cache hits count too)
+app.add_middleware(MetricsMiddleware, routes_of=app)
+
 app.include_router(recommendation_router, prefix="/recommend", tags=["recommendations"])
 app.include_router(dashboard_router, prefix="/dashboard", tags=["dashboard"])
+app.include_router(admin_router, prefix="/admin", tags=["admin"])
 
 @app.get("/")
 def health_check():
     return {"status": "ok", "message": "Recommender Engine is running"}
+
+
+# ─── Metrics ──────────────────────────────────────────────────
+@registry.register_collector
+def _model_metrics():
+    models = get_models()
+    artifacts = models.info()["artifacts"]
+    lines = metric_lines("recsys_model_info", "Serving model version.", [({"version": models.version}, 1)])
+    lines += metric_lines("recsys_model_loaded_timestamp_seconds", "When the serving model bundle was loaded.", [({}, models.loaded_at)])
+    lines += metric_lines(
+        "recsys_model_artifact_load_seconds", "Load duration per model artifact.",
+        [({"artifact": name}, a["load_seconds"]) for name, a in artifacts.items()],
+    )
+    lines += metric_lines(
+        "recsys_model_artifact_bytes", "Approximate in-memory size per model artifact.",
+        [({"artifact": name}, a["memory_bytes"]) for name, a in artifacts.items()],
+    )
+    lines += metric_lines(
+        "recsys_model_artifact_loaded", "1 if the artifact was found and loaded.",
+        [({"artifact": name}, int(a["loaded"])) for name, a in artifacts.items()],
+    )
+    lines += metric_lines(
+        "recsys_model_artifact_memory_mapped", "1 if the artifact is memory-mapped.",
+        [({"artifact": name}, int(a["memory_mapped"])) for name, a in artifacts.items()],
+    )
+    return lines
+
+
+@registry.register_collector
+def _cache_metrics():
+    stats = response_cache.stats()
+    lines = []
+    for counter in ("hits", "misses", "evictions", "expirations", "invalidations"):
+        lines += metric_lines(
+            f"recsys_response_cache_{counter}_total", f"Response cache {counter}.", [({}, stats[counter])], kind="counter",
+        )
+    lines += metric_lines("recsys_response_cache_hit_ratio", "Response cache hits / lookups.", [({}, stats["hit_ratio"])])
+    lines += metric_lines("recsys_response_cache_entries", "Responses held by the cache.", [({}, stats["entries"])])
+    lines += metric_lines("recsys_response_cache_bytes", "Bytes held by the cache.", [({}, stats["bytes"])])
+    return lines
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint: request, stage, model and cache metrics."""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
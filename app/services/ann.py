@@ -0,0 +1,231 @@
+"""
+Approximate nearest-neighbor (IVF) index over standardized user factors.
+
+Exact neighbor search is linear in the number of customers (and building the
+neighbor table is quadratic). The IVF index partitions the standardized SVD
+user factors (`standardize_rows`, so a dot product is a Pearson correlation)
+with spherical k-means into `n_lists` cells. A query scores only the
+centroids, then the users of its `n_probe` best cells, so its cost is about
+`n_lists + n_probe * n_users / n_lists` dot products instead of `n_users`.
+
+Knobs: `n_lists` is fixed at build time (default ~sqrt(n_users)); `n_probe`
+trades recall for latency at query time (saved in the manifest; overridden
+for the whole API by `RECSYS_ANN_NPROBE` or per request). `recall_report()` measures recall@k against exact
+search for several `n_probe` values.
+
+The index is saved as the memory-mappable `user_ann` array artifact.
+"""
+import os
+import time
+
+import numpy as np
+
+from app.services.array_store import is_memory_mapped, load_arrays, save_arrays
+from app.services.neighbors import DEFAULT_BLOCK_SIZE, NeighborIndex, _top_k_rows
+
+ARRAY_ARTIFACT = "user_ann"
+DEFAULT_N_PROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 100_000
+ASSIGN_BLOCK = 65536
+# Serving-time override of the n_probe saved with the index
+ENV_N_PROBE = int(os.environ.get("RECSYS_ANN_NPROBE", "0"))
+
+
+def default_n_lists(n_users: int) -> int:
+    return int(max(1, min(n_users, round(np.sqrt(n_users)))))
+
+
+def _assign(z, centroids):
+    """Index of the most similar centroid for every row of `z`, computed in blocks."""
+    assignments = np.empty(len(z), dtype=np.int32)
+    for start in range(0, len(z), ASSIGN_BLOCK):
+        assignments[start:start + ASSIGN_BLOCK] = np.argmax(z[start:start + ASSIGN_BLOCK] @ centroids.T, axis=1)
+    return assignments
+
+
+def _normalize(rows):
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (rows / norms).astype(np.float32)
+
+
+def spherical_kmeans(z, n_lists: int, n_iter: int = KMEANS_ITERATIONS, sample: int = KMEANS_SAMPLE, seed: int = 42):
+    """Unit-norm centroids of `n_lists` cells, trained on a sample of at most `sample` rows."""
+    rng = np.random.default_rng(seed)
+    points = z[rng.choice(len(z), size=min(len(z), sample), replace=False)] if len(z) > sample else z
+    n_lists = min(n_lists, len(points))
+    centroids = points[rng.choice(len(points), size=n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _assign(points, centroids)
+        sums = np.zeros_like(centroids, dtype=np.float64)
+        np.add.at(sums, assignments, points)
+        empty = np.bincount(assignments, minlength=n_lists) == 0
+        # Empty cells are reseeded with random points
+        sums[empty] = points[rng.choice(len(points), size=int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index: centroids plus, per cell, the user rows assigned to it."""
+
+    def __init__(self, centroids, assignments, list_rows=None, offsets=None, n_probe: int = DEFAULT_N_PROBE):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        if list_rows is None or offsets is None:
+            # Users grouped by cell: rows of cell c are list_rows[offsets[c]:offsets[c + 1]]
+            list_rows = np.argsort(self.assignments, kind="stable").astype(np.int32)
+            counts = np.bincount(self.assignments, minlength=self.n_lists)
+            offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.list_rows = np.asarray(list_rows, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.n_probe = int(n_probe)
+
+    @property
+    def n_lists(self) -> int:
+        return int(self.centroids.shape[0])
+
+    @property
+    def n_users(self) -> int:
+        return int(self.assignments.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.centroids.nbytes + self.assignments.nbytes + self.list_rows.nbytes + self.offsets.nbytes)
+
+    @property
+    def memory_mapped(self) -> bool:
+        return is_memory_mapped(self.centroids)
+
+    def candidates(self, query, n_probe: int = None) -> np.ndarray:
+        """User rows in the `n_probe` cells whose centroids are most similar to `query`."""
+        n_probe = max(1, min(n_probe or ENV_N_PROBE or self.n_probe, self.n_lists))
+        scores = self.centroids @ query
+        cells = np.argpartition(-scores, n_probe - 1)[:n_probe] if n_probe < self.n_lists else np.arange(self.n_lists)
+        return np.concatenate([self.list_rows[self.offsets[c]:self.offsets[c + 1]] for c in cells])
+
+    def search(self, z, query, k: int, n_probe: int = None, exclude=None):
+        """(user_rows, similarities) of the approximate top-`k` rows of `z` for a standardized `query`."""
+        rows = self.candidates(query, n_probe)
+        sims = z[rows] @ query
+        if exclude is not None:
+            sims[rows == exclude] = -np.inf
+        k = min(k, int(np.isfinite(sims).sum()))
+        if k <= 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        part = np.argpartition(-sims, k - 1)[:k]
+        order = np.argsort(-sims[part], kind="stable")
+        return rows[part[order]].astype(np.int32), sims[part[order]].astype(np.float32)
+
+    def reassign(self, z, rows) -> "IVFIndex":
+        """Index with `rows` of `z` (new or updated users) assigned to their nearest cell."""
+        assignments = np.zeros(len(z), dtype=np.int32)
+        assignments[:self.n_users] = self.assignments
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows):
+            assignments[rows] = _assign(z[rows], self.centroids)
+        return IVFIndex(self.centroids, assignments, n_probe=self.n_probe)
+
+    def save(self, directory: str):
+        save_arrays(
+            directory, ARRAY_ARTIFACT,
+            {"centroids": self.centroids, "assignments": self.assignments, "list_rows": self.list_rows, "offsets": self.offsets},
+            n_lists=self.n_lists, n_probe=self.n_probe,
+        )
+
+
+def build_ivf_index(z, n_lists: int = None, n_probe: int = DEFAULT_N_PROBE, seed: int = 42) -> IVFIndex:
+    """Train the IVF index on standardized user factors `z`."""
+    z = np.asarray(z, dtype=np.float32)
+    centroids = spherical_kmeans(z, n_lists or default_n_lists(len(z)), seed=seed)
+    return IVFIndex(centroids, _assign(z, centroids), n_probe=n_probe)
+
+
+def load_ivf_index(model_path: str, mmap: bool = True):
+    """The model version's IVFIndex, or None if it was trained without one."""
+    loaded = load_arrays(model_path, ARRAY_ARTIFACT, mmap=mmap)
+    if loaded is None:
+        return None
+    arrays, manifest = loaded
+    return IVFIndex(
+        arrays["centroids"], arrays["assignments"], arrays["list_rows"], arrays["offsets"],
+        n_probe=manifest.get("n_probe", DEFAULT_N_PROBE),
+    )
+
+
+def build_neighbor_index_ann(z, ivf: IVFIndex, k: int, n_probe: int = None, block_size: int = DEFAULT_BLOCK_SIZE) -> NeighborIndex:
+    """
+    Top-K neighbor table using the IVF index instead of all pairs.
+
+    Users of one cell share their candidate set (the `n_probe` cells nearest
+    to that cell's centroid), scored `block_size` members at a time, so memory
+    stays O(block_size x candidates) however skewed the cells are.
+    """
+    z = np.asarray(z, dtype=np.float32)
+    n_users = len(z)
+    k = max(0, min(k, n_users - 1))
+    neighbors = np.full((n_users, k), -1, dtype=np.int32)
+    similarities = np.full((n_users, k), np.nan, dtype=np.float32)
+    if k == 0:
+        return NeighborIndex(neighbors, similarities)
+
+    for cell in range(ivf.n_lists):
+        members = ivf.list_rows[ivf.offsets[cell]:ivf.offsets[cell + 1]]
+        if len(members) == 0:
+            continue
+        candidates = ivf.candidates(ivf.centroids[cell], n_probe)
+        width = min(k, len(candidates) - 1)
+        if width <= 0:
+            continue
+        # Position of each member among the candidates (sorted lookup), to mask self-matches
+        order = np.argsort(candidates, kind="stable")
+        sorted_candidates = candidates[order]
+        z_candidates = z[candidates]
+        for start in range(0, len(members), block_size):
+            chunk = members[start:start + block_size]
+            block = z[chunk] @ z_candidates.T
+            # A user is never its own neighbor
+            pos = np.minimum(np.searchsorted(sorted_candidates, chunk), len(candidates) - 1)
+            own = np.flatnonzero(sorted_candidates[pos] == chunk)
+            block[own, order[pos[own]]] = -np.inf
+            ids, sims = _top_k_rows(block, width)
+            found = np.isfinite(sims)
+            neighbors[chunk, :width] = np.where(found, candidates[ids], -1)
+            similarities[chunk, :width] = np.where(found, sims, np.nan)
+    return NeighborIndex(neighbors, similarities)
+
+
+def recall_report(z, ivf: IVFIndex, k: int = 10, n_probes=(1, 2, 4, 8, 16, 32), sample: int = 1000, seed: int = 0) -> dict:
+    """Recall@k and mean query latency of IVF search against exact search, per `n_probe`."""
+    z = np.asarray(z, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(len(z), size=min(sample, len(z)), replace=False)
+    k = max(1, min(k, len(z) - 1))
+
+    start = time.perf_counter()
+    exact = []
+    for row in queries:
+        sims = z @ z[row]
+        sims[row] = -np.inf
+        exact.append(set(np.argpartition(-sims, k - 1)[:k].tolist()))
+    exact_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+    results = []
+    for n_probe in sorted({min(p, ivf.n_lists) for p in n_probes}):
+        start = time.perf_counter()
+        hits = 0
+        for row, truth in zip(queries, exact):
+            rows, _ = ivf.search(z, z[row], k, n_probe=n_probe, exclude=row)
+            hits += len(truth.intersection(rows.tolist()))
+        elapsed = (time.perf_counter() - start) / len(queries) * 1000
+        results.append({
+            "n_probe": int(n_probe),
+            "recall_at_k": round(hits / (k * len(queries)), 4),
+            "query_ms": round(elapsed, 4),
+            "scanned_fraction": round(min(n_probe, ivf.n_lists) / ivf.n_lists, 4),
+        })
+    return {
+        "k": k, "n_users": len(z), "n_lists": ivf.n_lists, "queries": len(queries),
+        "exact_query_ms": round(exact_ms, 4), "results": results,
+    }
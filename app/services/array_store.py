@@ -0,0 +1,83 @@
+"""
+Memory-mappable on-disk format for numeric model artifacts.
+
+An artifact `<name>` is stored as one raw `.npy` file per array
+(`<name>.<key>.npy`) plus a small `<name>.json` manifest with each array's
+file, dtype and shape and any id vocabularies. Opening the arrays with
+`mmap_mode="r"` lets every uvicorn worker share the same page-cache pages
+instead of deserializing a private copy, and makes loading nearly instant.
+
+Files are never rewritten in place: each one is written to a temporary file
+and renamed over the old name, so a process that still maps the previous
+file keeps reading its (now unlinked) pages instead of a truncated file.
+"""
+import json
+import mmap
+import os
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+def manifest_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.json")
+
+
+def has_arrays(directory: str, name: str) -> bool:
+    return os.path.exists(manifest_path(directory, name))
+
+
+def _replace_file(path: str, write):
+    """Call `write(f)` on a temporary file next to `path`, then rename it over `path`."""
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_arrays(directory: str, name: str, arrays: dict, **meta):
+    """Write `arrays` as `.npy` files plus the JSON manifest (written last), each replaced atomically."""
+    manifest = {"name": name, "format_version": FORMAT_VERSION, "arrays": {}}
+    for key, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        if array.dtype == object:
+            raise TypeError(f"{name}.{key}: object arrays cannot be memory-mapped; store them in the manifest")
+        filename = f"{name}.{key}.npy"
+        _replace_file(os.path.join(directory, filename), lambda f, a=array: np.save(f, a, allow_pickle=False))
+        manifest["arrays"][key] = {"file": filename, "dtype": array.dtype.str, "shape": list(array.shape)}
+    manifest.update(meta)
+    _replace_file(manifest_path(directory, name), lambda f: f.write(json.dumps(manifest).encode("utf-8")))
+
+
+def load_arrays(directory: str, name: str, mmap: bool = True):
+    """
+    (arrays, manifest) for artifact `name`, or None if it has no manifest.
+
+    With `mmap=True` arrays are read-only memory maps of the `.npy` files.
+    """
+    if not has_arrays(directory, name):
+        return None
+    with open(manifest_path(directory, name)) as f:
+        manifest = json.load(f)
+    arrays = {}
+    for key, spec in manifest["arrays"].items():
+        array = np.load(os.path.join(directory, spec["file"]), mmap_mode="r" if mmap else None, allow_pickle=False)
+        if array.dtype.str != spec["dtype"] or list(array.shape) != spec["shape"]:
+            raise ValueError(f"{spec['file']} does not match its manifest entry in {name}.json")
+        arrays[key] = array
+    return arrays, manifest
+
+
+def is_memory_mapped(array) -> bool:
+    """True if `array` (or an array it is a view of) is backed by a memory-mapped file."""
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, "base", None)
+    return False
@@ -0,0 +1,131 @@
+"""
+Inverted index over association rules for cart-based recommendations.
+
+Rules are sorted once by (confidence, lift), so a rule's position in that
+order is its rank. For every item the index keeps the ranks of the rules whose
+antecedents contain it, so a cart lookup only touches the rules that mention
+cart items and merges their ranks instead of scanning the whole rule table.
+
+The same order serves the dashboard rule table: confidence is descending
+along the ranks, so a `min_confidence` cutoff is a binary search and a page
+is a slice. Rule items are also encoded as ids into a sorted item vocabulary
+(`items`), so a page's display names come from one gather over a `NameTable`.
+"""
+import sys
+
+import numpy as np
+
+from app.services.names import rule_items
+
+MATCH_ANY = "any"
+MATCH_SUBSET = "subset"
+
+
+class RuleIndex:
+    """Association rules pre-sorted by (confidence, lift) with an item -> rule-rank index."""
+
+    def __init__(self, rules):
+        confidence = rules["confidence"].to_numpy(dtype=np.float64)
+        lift = rules["lift"].to_numpy(dtype=np.float64)
+        # Best rule first; lexsort is stable, so equal rules keep their original order
+        order = np.lexsort((-lift, -confidence))
+
+        self.rule_ids = rules.index.to_numpy()[order]
+        self.confidence = confidence[order]
+        self.lift = lift[order]
+        self.support = rules["support"].to_numpy(dtype=np.float64)[order]
+        self.antecedents = [rules["antecedents"].iat[i] for i in order]
+        self.consequents = [list(rules["consequents"].iat[i]) for i in order]
+        self.antecedent_sizes = np.array([len(a) for a in self.antecedents], dtype=np.int32)
+
+        by_item = {}
+        for rank, antecedent in enumerate(self.antecedents):
+            for item in antecedent:
+                by_item.setdefault(item, []).append(rank)
+        self._by_item = {item: np.array(ranks, dtype=np.int32) for item, ranks in by_item.items()}
+
+        # Rule items as ids into `items`, flattened with per-rule offsets
+        self.items = rule_items(rules)
+        item_ids = {item: i for i, item in enumerate(self.items)}
+        self.antecedent_ids, self.antecedent_offsets = _encode(self.antecedents, item_ids)
+        self.consequent_ids, self.consequent_offsets = _encode(self.consequents, item_ids)
+
+    def __len__(self) -> int:
+        return len(self.rule_ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate footprint: numeric arrays, rule item containers and posting lists."""
+        arrays = (
+            self.rule_ids, self.confidence, self.lift, self.support, self.antecedent_sizes,
+            self.antecedent_ids, self.antecedent_offsets, self.consequent_ids, self.consequent_offsets,
+        )
+        total = sum(a.nbytes for a in arrays)
+        total += sum(sys.getsizeof(a) for a in self.antecedents) + sum(sys.getsizeof(c) for c in self.consequents)
+        total += sys.getsizeof(self._by_item) + sum(p.nbytes for p in self._by_item.values())
+        return int(total)
+
+    def antecedent_item_ids(self) -> np.ndarray:
+        """Ids into `items` of every item that appears in some antecedent, in vocabulary order."""
+        return np.unique(self.antecedent_ids)
+
+    def count_at_least(self, min_confidence: float) -> int:
+        """Number of rules with confidence >= `min_confidence`; they are ranks 0..count-1."""
+        if min_confidence <= 0:
+            return len(self)
+        return int(np.searchsorted(-self.confidence, -min_confidence, side="right"))
+
+    def display_page(self, start: int, end: int, names, lang: str):
+        """(antecedent_names, consequent_names) of ranks start..end-1, using a NameTable over `items`."""
+        end = min(end, len(self))
+        if start >= end:
+            return []
+        antecedents = _split_names(self.antecedent_ids, self.antecedent_offsets, start, end, names, lang)
+        consequents = _split_names(self.consequent_ids, self.consequent_offsets, start, end, names, lang)
+        return list(zip(antecedents, consequents))
+
+    def matching_ranks(self, cart_items, mode: str = MATCH_ANY) -> np.ndarray:
+        """
+        Ranks of the rules triggered by the cart, best rule first.
+
+        `any`: at least one antecedent is in the cart.
+        `subset`: every antecedent is in the cart.
+        """
+        postings = [self._by_item[item] for item in set(cart_items) if item in self._by_item]
+        if not postings:
+            return np.empty(0, dtype=np.int32)
+        ranks, hits = np.unique(np.concatenate(postings), return_counts=True)
+        if mode == MATCH_SUBSET:
+            # Each cart item appears at most once per rule, so the rule is fully
+            # covered when its hit count equals its antecedent size
+            ranks = ranks[hits == self.antecedent_sizes[ranks]]
+        return ranks
+
+    def recommend(self, cart_items, top_n: int, mode: str = MATCH_ANY):
+        """Up to `top_n` (product, confidence) pairs not already in the cart, by rule rank."""
+        seen = set(cart_items)
+        recommendations = []
+        if top_n <= 0:
+            return recommendations
+        for rank in self.matching_ranks(cart_items, mode):
+            for product in self.consequents[rank]:
+                if product not in seen:
+                    recommendations.append((product, float(self.confidence[rank])))
+                    seen.add(product)
+                    if len(recommendations) >= top_n:
+                        return recommendations
+        return recommendations
+
+
+def _encode(itemsets, item_ids):
+    offsets = np.zeros(len(itemsets) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(itemset) for itemset in itemsets])
+    ids = np.fromiter((item_ids[item] for itemset in itemsets for item in itemset), dtype=np.int32, count=offsets[-1])
+    return ids, offsets
+
+
+def _split_names(ids, offsets, start, end, names, lang):
+    base = offsets[start]
+    flat = names.lookup(ids[base:offsets[end]], lang)
+    bounds = (offsets[start:end + 1] - base).tolist()
+    return [flat[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
@@ -0,0 +1,168 @@
+"""
+Micro-batching coalescer for collaborative-filtering scoring.
+
+Under concurrent `GET /recommend/user/{id}` traffic each request would be
+scored on its own. When enabled (`RECSYS_COALESCE=1`), `score_user()` instead
+queues the request for a single worker thread, which waits up to
+`RECSYS_COALESCE_WINDOW_MS` (or until `RECSYS_COALESCE_MAX_BATCH` requests are
+queued), scores every queued user of the same model bundle in one
+`score_users()` call and hands each waiting request its own result.
+
+The coalescer records batch sizes and queueing delay (time from enqueue until
+the batch starts scoring) for tuning the window. Each coalesced request also
+reports its own wait and its batch's scoring time as the `queue` and `score`
+stages (metrics and `Server-Timing`), since the scoring stages themselves run
+on the worker thread, outside the request's context.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from app.core.metrics import record_stage
+from app.services.collaborative import score_users
+
+COALESCE_ENABLED = os.environ.get("RECSYS_COALESCE", "").lower() in ("1", "true", "yes")
+COALESCE_WINDOW_MS = float(os.environ.get("RECSYS_COALESCE_WINDOW_MS", "2"))
+COALESCE_MAX_BATCH = int(os.environ.get("RECSYS_COALESCE_MAX_BATCH", "64"))
+# Upper bounds of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class _Pending:
+    __slots__ = ("models", "row", "top_n", "weighted", "enqueued", "started", "future")
+
+    def __init__(self, models, row, top_n, weighted):
+        self.models = models
+        self.row = row
+        self.top_n = top_n
+        self.weighted = weighted
+        self.enqueued = time.perf_counter()
+        self.started = None
+        self.future = Future()
+
+
+class ScoreCoalescer:
+    """Collects single-user scoring requests and scores them in batches on one worker thread."""
+
+    def __init__(self, window_ms: float = COALESCE_WINDOW_MS, max_batch: int = COALESCE_MAX_BATCH):
+        self.window = window_ms / 1000.0
+        self.max_batch = max(int(max_batch), 1)
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.max_batch_seen = 0
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+        self.size_histogram = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._start_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="cf-coalescer", daemon=True)
+                    self._worker.start()
+
+    def _enqueue(self, models, row: int, top_n: int, weighted: bool) -> _Pending:
+        self._ensure_worker()
+        pending = _Pending(models, int(row), int(top_n), bool(weighted))
+        self._queue.put(pending)
+        return pending
+
+    def score(self, models, row: int, top_n: int, weighted: bool = False):
+        """Score one user row and record its `queue` and `score` stages for the calling request."""
+        pending = self._enqueue(models, row, top_n, weighted)
+        result = pending.future.result()
+        finished = time.perf_counter()
+        record_stage("queue", pending.started - pending.enqueued, pending.started)
+        record_stage("score", finished - pending.started, finished)
+        return result
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for pending in batch:
+                pending.started = started
+            self._record(batch, started)
+            # Requests resolved against different bundles or weightings are scored separately
+            groups = {}
+            for pending in batch:
+                groups.setdefault((id(pending.models), pending.weighted), []).append(pending)
+            for group in groups.values():
+                self._score_group(group)
+
+    def _score_group(self, group):
+        models = group[0].models
+        try:
+            rows = np.array([p.row for p in group], dtype=np.int64)
+            # Each row's results are sorted best first, so a request takes a prefix of the largest top-N
+            scored = score_users(
+                models.user_item_matrix, models.neighbor_index, rows,
+                max(p.top_n for p in group), weighted=group[0].weighted,
+            )
+        except Exception as e:
+            for pending in group:
+                pending.future.set_exception(e)
+            return
+        for pending, (cols, scores) in zip(group, scored):
+            top_n = max(pending.top_n, 0)
+            pending.future.set_result((cols[:top_n], scores[:top_n]))
+
+    def _record(self, batch, started):
+        delays = [started - p.enqueued for p in batch]
+        bucket = next((i for i, bound in enumerate(BATCH_SIZE_BUCKETS) if len(batch) <= bound), len(BATCH_SIZE_BUCKETS))
+        with self._stats_lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self.total_delay += sum(delays)
+            self.max_delay = max(self.max_delay, max(delays))
+            self.size_histogram[bucket] += 1
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            labels = [str(bound) for bound in BATCH_SIZE_BUCKETS] + ["+Inf"]
+            return {
+                "enabled": COALESCE_ENABLED,
+                "window_ms": self.window * 1000.0,
+                "max_batch": self.max_batch,
+                "requests": self.requests,
+                "batches": self.batches,
+                "mean_batch_size": round(self.requests / self.batches, 3) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_seen,
+                "batch_size_histogram": dict(zip(labels, self.size_histogram)),
+                "mean_queue_delay_ms": round(self.total_delay / self.requests * 1000.0, 3) if self.requests else 0.0,
+                "max_queue_delay_ms": round(self.max_delay * 1000.0, 3),
+                "queued": self._queue.qsize(),
+            }
+
+
+coalescer = ScoreCoalescer()
+
+
+def score_user(models, row: int, top_n: int, weighted: bool = False):
+    """(item_columns, scores) for one user, through the coalescer when it is enabled."""
+    if COALESCE_ENABLED:
+        return coalescer.score(models, row, top_n, weighted)
+    [(cols, scores)] = score_users(models.user_item_matrix, models.neighbor_index, [row], top_n, weighted=weighted)
+    return cols, scores
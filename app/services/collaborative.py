@@ -0,0 +1,129 @@
+"""
+Vectorized user-based collaborative filtering scoring.
+
+A user's candidate items are the items bought by their nearest neighbors
+(from the top-K neighbor table) that the user has not bought yet. Each
+candidate is scored by the number of neighbors who bought it, or by the sum
+of those neighbors' similarities when `weighted=True`. Scoring is one sparse
+product for a whole batch of users: the neighbor weights form a
+(batch x users) sparse matrix that is multiplied by the binary user-item matrix.
+
+`score_fold_in()` scores a single purchase vector the same way, given
+neighbors found at request time (see `app.services.latent`), and
+`score_fold_in_rows()` a batch of them.
+
+The neighbor lookup and the candidate aggregation are timed as the
+`neighbors` and `aggregate` stages (`app.core.metrics`).
+"""
+import numpy as np
+from scipy import sparse
+
+from app.core.metrics import stage
+
+DEFAULT_NEIGHBORS = 5
+
+
+def neighbor_weights(neighbor_index, rows, n_neighbors: int = DEFAULT_NEIGHBORS, weighted: bool = False):
+    """Sparse (len(rows) x users) matrix with each row's neighbor weights."""
+    rows = np.asarray(rows, dtype=np.int64)
+    ids = neighbor_index.neighbors[rows, :n_neighbors]
+    valid = ids >= 0
+    if weighted:
+        weights = neighbor_index.similarities[rows, :n_neighbors][valid]
+    else:
+        weights = np.ones(int(valid.sum()), dtype=np.float32)
+    batch_rows = np.nonzero(valid)[0]
+    return sparse.csr_matrix(
+        (weights, (batch_rows, ids[valid])),
+        shape=(len(rows), neighbor_index.n_users),
+        dtype=np.float32,
+    )
+
+
+def top_n_from_scores(scores, top_n: int):
+    """
+    Per-row top-N of a sparse (batch x items) score matrix.
+
+    Returns a list of (item_columns, scores) pairs sorted by descending score,
+    with ties broken by column index. Uses partial selection on each row's
+    non-zero entries only.
+    """
+    scores = sparse.csr_matrix(scores)
+    top_n = max(int(top_n), 0)
+    results = []
+    for i in range(scores.shape[0]):
+        start, end = scores.indptr[i], scores.indptr[i + 1]
+        cols, vals = scores.indices[start:end], scores.data[start:end]
+        if 0 < top_n < len(vals):
+            keep = np.argpartition(-vals, top_n - 1)[:top_n]
+            # Keep every entry tied with the N-th score so ties resolve by column
+            threshold = vals[keep].min()
+            keep = np.nonzero(vals >= threshold)[0]
+            cols, vals = cols[keep], vals[keep]
+        order = np.lexsort((cols, -vals))[:top_n]
+        results.append((cols[order], vals[order]))
+    return results
+
+
+def score_users(user_item, neighbor_index, rows, top_n: int, n_neighbors: int = DEFAULT_NEIGHBORS, weighted: bool = False):
+    """
+    Top-N recommendations for the users at `rows` of the user-item matrix.
+
+    Returns one (item_columns, scores) pair per row, in the same order as `rows`.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    purchased = user_item.purchased
+    with stage("neighbors"):
+        weights = neighbor_weights(neighbor_index, rows, n_neighbors, weighted)
+    with stage("aggregate"):
+        scores = weights @ purchased
+        # Mask out what each user already bought
+        scores = scores - scores.multiply(purchased[rows])
+        scores = sparse.csr_matrix(scores)
+        scores.eliminate_zeros()
+        scores.sort_indices()
+        return top_n_from_scores(scores, top_n)
+
+
+def score_fold_in(user_item, neighbor_rows, similarities, bought_cols, top_n: int, weighted: bool = False):
+    """
+    Top-N recommendations from neighbors found at request time.
+
+    `neighbor_rows` / `similarities` are the query's nearest users (best
+    first) and `bought_cols` the item columns it already has, which are
+    excluded. Returns one (item_columns, scores) pair.
+    """
+    bought_cols = np.unique(np.asarray(bought_cols, dtype=np.int64))
+    bought = sparse.csr_matrix(
+        (np.ones(len(bought_cols), dtype=np.float32), bought_cols, [0, len(bought_cols)]),
+        shape=(1, user_item.n_items),
+    )
+    return score_fold_in_rows(user_item, [(neighbor_rows, similarities)], bought, top_n, weighted=weighted)[0]
+
+
+def score_fold_in_rows(user_item, neighbors, bought, top_n: int, weighted: bool = False):
+    """
+    `score_fold_in()` for a batch of queries in one sparse product.
+
+    `neighbors` holds one (neighbor_rows, similarities) pair per query and
+    `bought` is the binary (batch x items) matrix of what each query already
+    has. Returns one (item_columns, scores) pair per query, in order.
+    """
+    counts = [len(rows) for rows, _ in neighbors]
+    neighbor_rows = np.concatenate([np.asarray(rows, dtype=np.int64) for rows, _ in neighbors] or [np.empty(0, dtype=np.int64)])
+    if weighted:
+        weights = np.concatenate([np.asarray(sims, dtype=np.float32) for _, sims in neighbors] or [np.empty(0, dtype=np.float32)])
+    else:
+        weights = np.ones(len(neighbor_rows), dtype=np.float32)
+    with stage("aggregate"):
+        w = sparse.csr_matrix(
+            (weights, (np.repeat(np.arange(len(neighbors)), counts), neighbor_rows)),
+            shape=(len(neighbors), user_item.n_users),
+            dtype=np.float32,
+        )
+        scores = w @ user_item.purchased
+        # Mask out what each query already has
+        scores = sparse.csr_matrix(scores - scores.multiply(bought))
+        scores.eliminate_zeros()
+        scores.sort_indices()
+        return top_n_from_scores(scores, top_n)
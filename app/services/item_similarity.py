@@ -0,0 +1,213 @@
+"""
+Item-to-item similarity model with precomputed top-K lists.
+
+Two products are similar when the same customers bought them: the cosine
+similarity between their columns of the binary user-item matrix, i.e. the
+number of common buyers divided by the geometric mean of their buyer counts.
+Training computes it one block of items at a time as a sparse product
+(`X[:, block].T @ X`), so memory stays O(block_size x items), and keeps for
+every item only its K most similar items (int32 columns) and similarities
+(float32), padded with -1 / NaN when an item has fewer than K co-purchased
+items.
+
+Columns are aligned with the user-item matrix (`stock_codes`). Unlike the user
+neighbor table, recommendations need neither a known customer nor any
+per-customer state: a product's list is one row read, and a list of products
+(a cart or session) is scored by summing their lists (`similar_to()`).
+
+The table is saved as the memory-mappable `item_neighbors` array artifact.
+"""
+import numpy as np
+from scipy import sparse
+
+from app.services.array_store import is_memory_mapped, load_arrays, save_arrays
+from app.services.neighbors import _top_k_rows
+
+ARRAY_ARTIFACT = "item_neighbors"
+DEFAULT_K = 20
+# Cells of the dense (block x items) similarity block computed at once
+BLOCK_CELLS = 16_000_000
+
+
+class ItemNeighborIndex:
+    """Fixed-width table of the K most similar items of every item, sorted by similarity."""
+
+    def __init__(self, neighbors, similarities):
+        self.neighbors = np.asarray(neighbors, dtype=np.int32)
+        self.similarities = np.asarray(similarities, dtype=np.float32)
+        if self.neighbors.shape != self.similarities.shape:
+            raise ValueError("neighbors and similarities must have the same shape")
+
+    @property
+    def n_items(self) -> int:
+        return int(self.neighbors.shape[0])
+
+    @property
+    def k(self) -> int:
+        return int(self.neighbors.shape[1])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.neighbors.nbytes + self.similarities.nbytes)
+
+    @property
+    def memory_mapped(self) -> bool:
+        return is_memory_mapped(self.neighbors)
+
+    def neighbors_of(self, col: int, n: int):
+        """The `n` most similar items of column `col` and their similarities, best first."""
+        # A negative n would slice from the end of the row
+        n = max(0, min(n, self.k))
+        ids = self.neighbors[col, :n]
+        sims = self.similarities[col, :n]
+        valid = ids >= 0
+        return ids[valid], sims[valid]
+
+    def similar_to(self, cols, top_n: int):
+        """
+        (item_columns, scores) of the items most similar to the columns `cols` together.
+
+        Each candidate scores the sum of its similarities to the given items
+        (from their top-K lists); the given items themselves are excluded.
+        Ties are broken by column index.
+        """
+        cols = np.unique(np.asarray(cols, dtype=np.int64))
+        cols = cols[(cols >= 0) & (cols < self.n_items)]
+        ids = self.neighbors[cols].ravel()
+        sims = self.similarities[cols].ravel()
+        valid = ids >= 0
+        scores = np.bincount(ids[valid], weights=sims[valid], minlength=self.n_items)
+        scores[cols] = 0
+        candidates = np.flatnonzero(scores > 0)
+        top_n = max(int(top_n), 0)
+        if 0 < top_n < len(candidates):
+            keep = np.argpartition(-scores[candidates], top_n - 1)[:top_n]
+            # Keep every candidate tied with the N-th score so ties resolve by column
+            threshold = scores[candidates[keep]].min()
+            candidates = candidates[scores[candidates] >= threshold]
+        order = np.lexsort((candidates, -scores[candidates]))[:top_n]
+        return candidates[order], scores[candidates[order]].astype(np.float32)
+
+    def save(self, directory: str):
+        """Write the table as a memory-mappable array artifact."""
+        save_arrays(
+            directory, ARRAY_ARTIFACT,
+            {"neighbors": self.neighbors, "similarities": self.similarities},
+            k=self.k,
+        )
+
+
+def _cosine_inputs(purchased):
+    """(csc matrix, its transpose as csr, column norms) of a binary (users x items) matrix."""
+    x = sparse.csc_matrix(purchased, dtype=np.float32)
+    norms = np.sqrt(np.asarray(x.sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    return x, x.T.tocsr(), norms
+
+
+def _similarity_blocks(x, xt, norms, cols, block_cells: int = BLOCK_CELLS):
+    """Yield (block_cols, dense cosine block of those items with every item), self-similarity zeroed."""
+    n_items = x.shape[1]
+    block_size = max(1, block_cells // n_items)
+    for start in range(0, len(cols), block_size):
+        block_cols = cols[start:start + block_size]
+        # Common buyers of the block's items with every item, scaled to cosine
+        block = (xt[block_cols] @ x).toarray()
+        block /= norms[block_cols, None]
+        block /= norms[None, :]
+        # An item is never its own neighbor
+        block[np.arange(len(block_cols)), block_cols] = 0
+        yield block_cols, block
+
+
+def _fill_top_k(neighbors, similarities, rows, block, k: int):
+    """Write the top-`k` positive entries of each `block` row into `rows` of the table."""
+    ids, sims = _top_k_rows(block, k)
+    found = sims > 0
+    neighbors[rows] = np.where(found, ids, -1)
+    similarities[rows] = np.where(found, sims, np.nan)
+
+
+def build_item_neighbors(purchased, k: int = DEFAULT_K, block_cells: int = BLOCK_CELLS) -> ItemNeighborIndex:
+    """
+    Build the top-K item table from a binary (users x items) sparse matrix.
+
+    Similarities are cosine between item columns; items with no common buyer
+    are never neighbors.
+    """
+    x, xt, norms = _cosine_inputs(purchased)
+    n_items = x.shape[1]
+    k = max(0, min(k, n_items - 1))
+
+    neighbors = np.full((n_items, k), -1, dtype=np.int32)
+    similarities = np.full((n_items, k), np.nan, dtype=np.float32)
+    if k == 0:
+        return ItemNeighborIndex(neighbors, similarities)
+
+    for block_cols, block in _similarity_blocks(x, xt, norms, np.arange(n_items), block_cells):
+        _fill_top_k(neighbors, similarities, block_cols, block, k)
+
+    return ItemNeighborIndex(neighbors, similarities)
+
+
+def update_item_neighbors(index: ItemNeighborIndex, purchased, changed_cols, block_cells: int = BLOCK_CELLS) -> ItemNeighborIndex:
+    """
+    The top-K table of `purchased` (a grown or updated user-item matrix),
+    recomputing only what the items at `changed_cols` can affect.
+
+    A cosine changes only if one of its two items gained or lost buyers, so:
+    changed items get their rows recomputed exactly; every other item keeps
+    its list minus the changed items, merged with its (new) similarities to
+    the changed items. If that merge cannot prove the result (an item lost
+    changed neighbors and its K-th entry fell below its old K-th similarity,
+    the bound on items outside its old list), the row is recomputed exactly.
+    Columns past `index.n_items` are new items and must be in `changed_cols`.
+    """
+    x, xt, norms = _cosine_inputs(purchased)
+    n_items, k = x.shape[1], index.k
+    if k == 0:
+        return build_item_neighbors(purchased, k=DEFAULT_K, block_cells=block_cells)
+    changed_cols = np.unique(np.asarray(changed_cols, dtype=np.int64))
+    changed = np.zeros(n_items, dtype=bool)
+    changed[changed_cols] = True
+
+    neighbors = np.full((n_items, k), -1, dtype=np.int32)
+    similarities = np.full((n_items, k), np.nan, dtype=np.float32)
+    neighbors[:index.n_items] = index.neighbors
+    similarities[:index.n_items] = index.similarities
+    # Lower bound of the items outside each full old list (0: the list held every co-purchased item)
+    full = neighbors[:, -1] >= 0
+    bound = np.where(full, similarities[:, -1], 0).astype(np.float32)
+    # Drop changed items from the kept lists; they come back with their new similarities
+    stale = (neighbors >= 0) & changed[np.maximum(neighbors, 0)]
+    neighbors[stale] = -1
+    similarities[stale] = np.nan
+
+    for block_cols, block in _similarity_blocks(x, xt, norms, changed_cols, block_cells):
+        _fill_top_k(neighbors, similarities, block_cols, block, k)
+        # Merge this block's similarities into the lists of the unchanged items
+        others = np.flatnonzero(~changed)
+        kept = np.where(neighbors[others] >= 0, similarities[others], 0)
+        merged = np.hstack([kept, block[:, others].T])
+        ids = np.hstack([neighbors[others], np.broadcast_to(block_cols.astype(np.int32), (len(others), len(block_cols)))])
+        top, sims = _top_k_rows(merged, k)
+        found = sims > 0
+        neighbors[others] = np.where(found, np.take_along_axis(ids, top, axis=1), -1)
+        similarities[others] = np.where(found, sims, np.nan)
+
+    # Unchanged items whose merged K-th entry no longer covers the items outside their old list
+    kth = np.where(neighbors[:, -1] >= 0, similarities[:, -1], 0)
+    dirty = np.flatnonzero(~changed & stale.any(axis=1) & (kth < bound))
+    for block_cols, block in _similarity_blocks(x, xt, norms, dirty, block_cells):
+        _fill_top_k(neighbors, similarities, block_cols, block, k)
+
+    return ItemNeighborIndex(neighbors, similarities)
+
+
+def load_item_neighbors(model_path: str, mmap: bool = True):
+    """The model version's ItemNeighborIndex, or None if it was trained without one."""
+    loaded = load_arrays(model_path, ARRAY_ARTIFACT, mmap=mmap)
+    if loaded is None:
+        return None
+    arrays, _ = loaded
+    return ItemNeighborIndex(arrays["neighbors"], arrays["similarities"])
@@ -0,0 +1,145 @@
+"""
+Latent factor model for fold-in scoring.
+
+Training persists the fitted TruncatedSVD components (factors x items), the
+users' latent factors and their standardized rows (`standardize_rows`) as the
+memory-mappable `svd` array artifact, so workers share all three. A
+purchase vector `x` (binary, over the user-item matrix columns) folds into
+the latent space as `x @ components.T`, which for a binary vector is the sum
+of the components' columns of the purchased items. Its nearest users are then
+found by Pearson correlation against the stored user factors, the same
+similarity the neighbor table was built with, so new customers, customers
+with purchases since the last training and ad-hoc item lists all get fresh
+neighbors at request time. `project_rows()` and `nearest_rows()` do the same
+for a batch of users, with the exact search as one matrix product per block.
+
+With an IVF index (`app.services.ann`) the nearest users are searched in the
+index's closest cells only, instead of scanning every user.
+"""
+import numpy as np
+
+from app.services.array_store import is_memory_mapped, load_arrays, save_arrays
+from app.services.neighbors import standardize_rows
+
+ARRAY_ARTIFACT = "svd"
+
+
+class LatentModel:
+    """SVD item components and per-user factors, aligned with the user-item matrix rows and columns."""
+
+    def __init__(self, components, user_factors, standardized=None):
+        self.components = np.asarray(components, dtype=np.float32)
+        self.user_factors = np.asarray(user_factors, dtype=np.float32)
+        if self.components.shape[0] != self.user_factors.shape[1]:
+            raise ValueError(
+                f"{self.components.shape[0]} components do not match {self.user_factors.shape[1]} user factors"
+            )
+        # Standardized rows (a dot product is a Pearson correlation); artifacts
+        # written before they were saved get a private copy computed here
+        if standardized is None:
+            standardized = standardize_rows(self.user_factors)
+        self._standardized = np.asarray(standardized, dtype=np.float32)
+        if self._standardized.shape != self.user_factors.shape:
+            raise ValueError("standardized factors must have the shape of the user factors")
+
+    @property
+    def n_components(self) -> int:
+        return int(self.components.shape[0])
+
+    @property
+    def n_users(self) -> int:
+        return int(self.user_factors.shape[0])
+
+    @property
+    def n_items(self) -> int:
+        return int(self.components.shape[1])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.components.nbytes + self.user_factors.nbytes + self._standardized.nbytes)
+
+    @property
+    def memory_mapped(self) -> bool:
+        return is_memory_mapped(self.components)
+
+    def project(self, item_cols) -> np.ndarray:
+        """Latent factors of a binary purchase vector given by its item columns."""
+        item_cols = np.asarray(item_cols, dtype=np.int64)
+        item_cols = item_cols[(item_cols >= 0) & (item_cols < self.n_items)]
+        return self.components[:, item_cols].sum(axis=1, dtype=np.float64).astype(np.float32)
+
+    def project_rows(self, purchased) -> np.ndarray:
+        """Latent factors of each row of a sparse binary (batch x items) purchase matrix."""
+        return np.asarray(purchased @ self.components.T.astype(np.float64)).astype(np.float32)
+
+    def nearest(self, factors, k: int, exclude=None, ann=None, n_probe: int = None):
+        """
+        (user_rows, similarities) of the `k` users most correlated with `factors`, best first.
+
+        With `ann` (an IVFIndex over these users) the search is approximate and
+        scans `n_probe` cells; otherwise it is exact.
+        """
+        exclude = None if exclude is None else [exclude]
+        return self.nearest_rows(np.asarray(factors)[None, :], k, exclude=exclude, ann=ann, n_probe=n_probe)[0]
+
+    def nearest_rows(self, factors, k: int, exclude=None, ann=None, n_probe: int = None, block_size: int = 256):
+        """
+        `nearest()` for each row of a (batch x components) `factors` matrix;
+        `exclude` gives one user row (or -1) per query. Exact search scores
+        `block_size` queries per matrix product.
+        """
+        queries = standardize_rows(np.asarray(factors, dtype=np.float32))
+        exclude = np.full(len(queries), -1, dtype=np.int64) if exclude is None else np.asarray(exclude, dtype=np.int64)
+        if ann is not None and ann.n_users == self.n_users:
+            # Each query scans its own cells
+            return [
+                ann.search(self._standardized, query, k, n_probe=n_probe, exclude=row if row >= 0 else None)
+                for query, row in zip(queries, exclude)
+            ]
+        results = []
+        for start in range(0, len(queries), block_size):
+            sims = queries[start:start + block_size] @ self._standardized.T
+            excluded = exclude[start:start + block_size]
+            masked = (excluded >= 0) & (excluded < self.n_users)
+            sims[np.flatnonzero(masked), excluded[masked]] = -np.inf
+            k_block = min(k, self.n_users)
+            if k_block <= 0:
+                results.extend((np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)) for _ in sims)
+                continue
+            part = np.argpartition(-sims, k_block - 1, axis=1)[:, :k_block]
+            top = np.take_along_axis(sims, part, axis=1)
+            order = np.argsort(-top, axis=1, kind="stable")
+            part, top = np.take_along_axis(part, order, axis=1), np.take_along_axis(top, order, axis=1)
+            for row, row_sims in zip(part, top):
+                # The excluded user can only fill a slot when k covers every user
+                valid = np.isfinite(row_sims)
+                results.append((row[valid].astype(np.int32), row_sims[valid].astype(np.float32)))
+        return results
+
+
+def save_latent_model(directory: str, components, user_factors, standardized=None):
+    """
+    Write SVD components, user factors and their standardized rows (computed
+    if not given) as a memory-mappable array artifact.
+    """
+    components = np.asarray(components, dtype=np.float32)
+    if standardized is None:
+        standardized = standardize_rows(user_factors)
+    save_arrays(
+        directory, ARRAY_ARTIFACT,
+        {
+            "components": components,
+            "user_factors": np.asarray(user_factors, dtype=np.float32),
+            "standardized": np.asarray(standardized, dtype=np.float32),
+        },
+        n_components=int(components.shape[0]),
+    )
+
+
+def load_latent_model(model_path: str, mmap: bool = True):
+    """The model version's LatentModel, or None if it was trained without one."""
+    loaded = load_arrays(model_path, ARRAY_ARTIFACT, mmap=mmap)
+    if loaded is None:
+        return None
+    arrays, _ = loaded
+    return LatentModel(arrays["components"], arrays["user_factors"], arrays.get("standardized"))
@@ -0,0 +1,108 @@
+"""
+Precomputed (materialized) top-N collaborative-filtering lists for every user.
+
+`notebooks/materialize_recommendations.py` scores all users of a model
+version offline, with the same logic as `/recommend/user/{user_id}`
+(`score_users`), and saves the result as the memory-mappable `recommendations`
+array artifact: the customer ids, one fixed-width row of int32 item columns
+(-1 padded) and one of float32 scores per user, aligned with the user-item
+matrix rows. The manifest records the list length, the scoring mode, the
+model version scored and when it was generated.
+
+Serving is then an O(1) row read. Because the top-N order breaks ties by item
+column, the first `top_n` entries of a longer list are exactly the online
+top-`top_n`.
+"""
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.services.array_store import is_memory_mapped, load_arrays, save_arrays
+
+ARRAY_ARTIFACT = "recommendations"
+
+
+class MaterializedRecommendations:
+    """Fixed-width per-user top-N item columns and scores, aligned with the user-item matrix rows."""
+
+    def __init__(self, user_ids, items, scores, weighted: bool = False, model_version=None, generated_at=None):
+        self.user_ids = np.asarray(user_ids)
+        self.items = np.asarray(items, dtype=np.int32)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        if self.items.shape != self.scores.shape or self.items.shape[0] != len(self.user_ids):
+            raise ValueError("user_ids, items and scores must have matching rows")
+        self.weighted = bool(weighted)
+        self.model_version = model_version
+        self.generated_at = generated_at if generated_at is not None else time.time()
+
+    @property
+    def n_users(self) -> int:
+        return int(self.items.shape[0])
+
+    @property
+    def top_n(self) -> int:
+        return int(self.items.shape[1])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.user_ids.nbytes + self.items.nbytes + self.scores.nbytes)
+
+    @property
+    def memory_mapped(self) -> bool:
+        return is_memory_mapped(self.items)
+
+    @property
+    def generated_at_iso(self) -> str:
+        return datetime.fromtimestamp(self.generated_at, tz=timezone.utc).isoformat(timespec="seconds")
+
+    def covers(self, top_n: int, weighted: bool) -> bool:
+        """True if a request for `top_n` items with this scoring mode can be served from the lists."""
+        return top_n <= self.top_n and weighted == self.weighted
+
+    def lookup(self, row: int, top_n: int):
+        """(item_columns, scores) of the user at matrix `row`, best first."""
+        # A negative top_n would slice from the end of the list
+        top_n = max(0, min(top_n, self.top_n))
+        items = self.items[row, :top_n]
+        valid = items >= 0
+        return items[valid], self.scores[row, :top_n][valid]
+
+    def lookup_rows(self, rows, top_n: int):
+        """`lookup()` for each of the matrix `rows`, reading all of them in one slice."""
+        top_n = max(0, min(top_n, self.top_n))
+        rows = np.asarray(rows, dtype=np.int64)
+        items, scores = self.items[rows, :top_n], self.scores[rows, :top_n]
+        valid = items >= 0
+        return [(row_items[row_valid], row_scores[row_valid]) for row_items, row_scores, row_valid in zip(items, scores, valid)]
+
+    def save(self, directory: str):
+        """Write the lists as a memory-mappable array artifact."""
+        save_arrays(
+            directory, ARRAY_ARTIFACT,
+            {"user_ids": self.user_ids.astype(np.int64), "items": self.items, "scores": self.scores},
+            top_n=self.top_n, weighted=self.weighted,
+            model_version=self.model_version, generated_at=self.generated_at,
+        )
+
+
+def load_materialized(model_path: str, user_ids=None, mmap: bool = True):
+    """
+    The model version's materialized lists, or None if it has none.
+
+    With `user_ids` (the user-item matrix rows), lists written for different
+    rows are ignored, so a stale artifact never serves another user's list.
+    """
+    loaded = load_arrays(model_path, ARRAY_ARTIFACT, mmap=mmap)
+    if loaded is None:
+        return None
+    arrays, manifest = loaded
+    if user_ids is not None and not np.array_equal(arrays["user_ids"], np.asarray(user_ids)):
+        print(f"⚠️  {ARRAY_ARTIFACT} in {model_path} does not match the user-item matrix rows; ignoring it.")
+        return None
+    return MaterializedRecommendations(
+        arrays["user_ids"], arrays["items"], arrays["scores"],
+        weighted=manifest.get("weighted", False),
+        model_version=manifest.get("model_version"),
+        generated_at=manifest.get("generated_at"),
+    )
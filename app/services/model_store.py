@@ -0,0 +1,391 @@
+"""
+Shared model store.
+
+Every artifact in the model directory is loaded exactly once per process into
+a `ModelBundle`, which both the recommendation and the dashboard routers read
+through `get_models()`. The bundle also records how long each artifact took to
+load and how much memory it holds.
+
+Models are versioned: each training run writes a new `models/<version>/`
+directory and points the `models/CURRENT` file at it. `reload_models()` loads
+a version in a background thread and swaps it in with a single reference
+assignment, so requests that already hold the previous bundle finish on it.
+Only one reload runs at a time, which bounds peak memory to the serving
+bundle plus the one being loaded.
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from app.services.association import RuleIndex
+from app.services.ann import load_ivf_index
+from app.services.item_similarity import load_item_neighbors
+from app.services.latent import load_latent_model
+from app.services.materialized import load_materialized
+from app.services.names import LANGUAGES, NameTable
+from app.services.neighbors import load_neighbor_index
+from app.services.search import ProductSearchIndex, UserIdIndex
+from app.services.summary import ModelSummary
+from app.services.user_item import load_user_item_matrix
+
+MODEL_PATH = os.environ.get(
+    "RECSYS_MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+)
+# Memory-map numeric array artifacts so uvicorn workers share their pages
+MMAP_ARTIFACTS = os.environ.get("RECSYS_MMAP", "1").lower() not in ("0", "false", "no")
+CURRENT_FILE = "CURRENT"
+UNVERSIONED = "unversioned"
+TRANSLATIONS_ARTIFACT = "product_translations.pkl"
+
+
+# ─── Versioned model directories ──────────────────────────────
+def list_versions(root: str = MODEL_PATH):
+    """Version directories under `root`, oldest first (names sort chronologically)."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if os.path.isdir(os.path.join(root, name)) and not name.startswith((".", "_"))
+    )
+
+
+def current_version(root: str = MODEL_PATH):
+    """Version named in `root/CURRENT`, else the newest version directory, else None."""
+    path = os.path.join(root, CURRENT_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            version = f.read().strip()
+        if version:
+            return version
+    versions = list_versions(root)
+    return versions[-1] if versions else None
+
+
+def resolve_model_dir(root: str = MODEL_PATH, version=None):
+    """
+    (version, directory) to load.
+
+    Model directories written before versioning keep their artifacts directly
+    in `root`; they are served as the "unversioned" version.
+    """
+    version = version or current_version(root)
+    if version is None or version == UNVERSIONED:
+        return UNVERSIONED, root
+    path = os.path.join(root, version)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"Model version {version!r} not found in {root}")
+    return version, path
+
+
+def create_version_dir(root: str = MODEL_PATH) -> tuple:
+    """Create an empty, timestamp-named version directory and return (version, path)."""
+    base = time.strftime("%Y%m%d-%H%M%S")
+    version, suffix = base, 1
+    while os.path.exists(os.path.join(root, version)):
+        suffix += 1
+        version = f"{base}-{suffix}"
+    path = os.path.join(root, version)
+    os.makedirs(path)
+    return version, path
+
+
+def _link_or_copy(source: str, target: str):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def copy_version_dir(source: str, target: str, exclude=()):
+    """
+    Populate the new version directory `target` with the artifacts of `source`.
+
+    Files are hard-linked (copied where links are not supported), so this is
+    cheap even for large arrays; writers must replace files rather than
+    rewrite them (see array_store.save_arrays). Names starting with any prefix
+    in `exclude` are skipped.
+    """
+    shutil.copytree(
+        source, target, dirs_exist_ok=True, copy_function=_link_or_copy,
+        ignore=lambda _, names: [name for name in names if name.startswith(tuple(exclude))],
+    )
+
+
+def activate_version(root: str, version: str):
+    """Atomically point `root/CURRENT` at `version`."""
+    tmp_path = os.path.join(root, f".{CURRENT_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+
+
+def _load_pickle(model_path, name):
+    path = os.path.join(model_path, name)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    return None
+
+
+def _cart_item_payloads(rule_index, names) -> dict:
+    """{lang: (json_bytes, etag)} of the antecedent items with their display names."""
+    ids = rule_index.antecedent_item_ids()
+    payloads = {}
+    for lang in LANGUAGES:
+        items = [{"stock_code": names.keys[i], "product_name": name} for i, name in zip(ids, names.lookup(ids, lang))]
+        body = json.dumps(items, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        payloads[lang] = (body, '"' + hashlib.sha1(body).hexdigest() + '"')
+    return payloads
+
+
+def footprint(obj) -> int:
+    """Approximate in-memory size of a loaded artifact, in bytes."""
+    if obj is None:
+        return 0
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(obj, pd.DataFrame) else usage)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(sys.getsizeof(k) + footprint(v) for k, v in obj.items())
+    if isinstance(obj, tuple):
+        # e.g. the (json_bytes, etag) payloads of cart_items
+        return sys.getsizeof(obj) + sum(footprint(v) for v in obj)
+    if hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+    return sys.getsizeof(obj)
+
+
+class ModelBundle:
+    """All artifacts of one model version, plus per-artifact load timings and footprints."""
+
+    def __init__(self, model_path: str = MODEL_PATH, version: str = UNVERSIONED, translations_path=None):
+        self.model_path = model_path
+        self.version = version
+        self.loaded_at = time.time()
+        self.load_timings = {}
+        self.memory = {}
+        self.loaded = {}
+        self.mapped = {}
+
+        self.rules = self._timed("association_rules", lambda: _load_pickle(model_path, "association_rules.pkl"))
+        self.rule_index = self._timed("rule_index", lambda: RuleIndex(self.rules) if self.rules is not None else None)
+        self.neighbor_index = self._timed("user_neighbors", lambda: load_neighbor_index(model_path, mmap=MMAP_ARTIFACTS))
+        self.user_item_matrix = self._timed("user_item_matrix", lambda: load_user_item_matrix(model_path, mmap=MMAP_ARTIFACTS))
+        # Precomputed per-user top-N lists (notebooks/materialize_recommendations.py)
+        self.materialized = self._timed(
+            "recommendations",
+            lambda: load_materialized(model_path, self.user_item_matrix.user_ids, mmap=MMAP_ARTIFACTS)
+            if self.user_item_matrix is not None else None,
+            hint="Run notebooks/materialize_recommendations.py to serve precomputed recommendations.",
+        )
+        self.item_neighbors = self._timed(
+            "item_neighbors", lambda: load_item_neighbors(model_path, mmap=MMAP_ARTIFACTS),
+            hint="Retrain with notebooks/train_and_save.py to enable item-to-item recommendations.",
+        )
+        self.latent = self._timed(
+            "svd", lambda: load_latent_model(model_path, mmap=MMAP_ARTIFACTS),
+            hint="Retrain with notebooks/train_and_save.py to enable fold-in scoring.",
+        )
+        # Approximate nearest-user search over the SVD factors (exact scan without it)
+        self.user_ann = self._timed(
+            "user_ann", lambda: load_ivf_index(model_path, mmap=MMAP_ARTIFACTS) if self.latent is not None else None,
+            hint="Retrain with notebooks/train_and_save.py to enable approximate neighbor search.",
+        )
+        self.product_catalog = self._timed("product_catalog", lambda: _load_pickle(model_path, "product_catalog.pkl"))
+        self.product_translations = self._timed(
+            "product_translations",
+            lambda: _load_pickle(model_path, TRANSLATIONS_ARTIFACT) or _load_pickle(translations_path or model_path, TRANSLATIONS_ARTIFACT),
+            hint="Run scripts/translate_catalog.py first.",
+        ) or {}
+        # Dense EN/ES display names per matrix column and per rule item
+        self.item_names = self._timed(
+            "item_names",
+            lambda: NameTable(self.user_item_matrix.stock_codes, self.product_catalog, self.translate)
+            if self.user_item_matrix is not None else None,
+        )
+        self.rule_item_names = self._timed(
+            "rule_item_names",
+            lambda: NameTable(self.rule_index.items, self.product_catalog, self.translate) if self.rule_index is not None else None,
+        )
+        # Cart simulator vocabulary (rule antecedents), serialized once per language
+        self.cart_items = self._timed(
+            "cart_items",
+            lambda: _cart_item_payloads(self.rule_index, self.rule_item_names) if self.rule_index is not None else None,
+        )
+        self.search_index = self._timed(
+            "search_index",
+            lambda: ProductSearchIndex(self.product_catalog, self.translate) if self.product_catalog is not None else None,
+        )
+        self.user_index = self._timed(
+            "user_index",
+            lambda: UserIdIndex(self.user_item_matrix.user_ids) if self.user_item_matrix is not None else None,
+        )
+        # Dashboard KPIs, popularity ranking and rule statistics for this version
+        self.summary = self._timed("summary", lambda: ModelSummary(self.user_item_matrix, self.rules))
+
+    def _timed(self, name, loader, hint="Run the training script first."):
+        start = time.perf_counter()
+        artifact = loader()
+        self.load_timings[name] = time.perf_counter() - start
+        self.memory[name] = footprint(artifact)
+        self.loaded[name] = artifact is not None
+        self.mapped[name] = bool(getattr(artifact, "memory_mapped", False))
+        if artifact is None:
+            print(f"⚠️  {name} not found in {self.model_path}. {hint}")
+        else:
+            kind = "mapped" if self.mapped[name] else "in memory"
+            print(f"✅ {name} loaded in {self.load_timings[name]:.3f}s ({self.memory[name] / 1e6:.1f} MB {kind}).")
+        return artifact
+
+    def translate(self, name: str, lang: str) -> str:
+        """Translate a product name to the requested language."""
+        if lang == "es" and self.product_translations:
+            # Try exact match first, then uppercase match
+            return self.product_translations.get(name, self.product_translations.get(name.upper(), name))
+        return name
+
+    def info(self) -> dict:
+        """Load timings (seconds) and memory footprints (bytes) per artifact."""
+        return {
+            "version": self.version,
+            "model_path": os.path.abspath(self.model_path),
+            "loaded_at": self.loaded_at,
+            "artifacts": {
+                name: {
+                    "loaded": self.loaded[name],
+                    "load_seconds": round(self.load_timings[name], 4),
+                    "memory_bytes": self.memory[name],
+                    "memory_mapped": self.mapped[name],
+                }
+                for name in self.load_timings
+            },
+            "total_load_seconds": round(sum(self.load_timings.values()), 4),
+            "total_memory_bytes": sum(self.memory.values()),
+        }
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self.memory.values())
+
+    @property
+    def mapped_bytes(self) -> int:
+        """Part of `nbytes` held by memory-mapped artifacts (page cache shared between workers)."""
+        return sum(size for name, size in self.memory.items() if self.mapped[name])
+
+
+def load_bundle(root: str = MODEL_PATH, version=None) -> ModelBundle:
+    """Load one model version (default: the CURRENT one) from `root`."""
+    version, path = resolve_model_dir(root, version)
+    # Translations are shared by all versions and may live in the models root
+    return ModelBundle(path, version=version, translations_path=root)
+
+
+# ─── Serving bundle and hot reload ────────────────────────────
+class ReloadInProgress(RuntimeError):
+    pass
+
+
+_models = None
+_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_reload_status = {"state": "idle"}
+
+
+def get_models() -> ModelBundle:
+    """The bundle currently serving requests, loaded on first use."""
+    global _models
+    if _models is None:
+        with _lock:
+            if _models is None:
+                _models = load_bundle(MODEL_PATH)
+    return _models
+
+
+def reload_status() -> dict:
+    """State of the last (or running) reload."""
+    return dict(_reload_status)
+
+
+def _reload(version, started: float) -> bool:
+    """
+    Load `version` and swap it in; the caller holds `_reload_lock`, released here.
+
+    The memory reported is the bundle's per-artifact footprint (memory-mapped
+    artifacts included), not traced allocations: tracing would slow every
+    serving thread while the load runs. Returns True if the new bundle was
+    swapped in.
+    """
+    global _models
+    previous = _models
+    try:
+        bundle = load_bundle(MODEL_PATH, version)
+        # Atomic swap: requests that already resolved the old bundle keep using it
+        with _lock:
+            _models = bundle
+        _reload_status.update(
+            state="done",
+            version=bundle.version,
+            previous_version=previous.version if previous is not None else None,
+            load_seconds=round(time.time() - started, 4),
+            bundle_bytes=bundle.nbytes,
+            mapped_bundle_bytes=bundle.mapped_bytes,
+            previous_bundle_bytes=previous.nbytes if previous is not None else 0,
+        )
+        print(f"🔄 Models swapped to version {bundle.version} ({bundle.nbytes / 1e6:.1f} MB, {bundle.mapped_bytes / 1e6:.1f} MB mapped).")
+        return True
+    except Exception as e:
+        _reload_status.update(state="failed", error=str(e))
+        print(f"⚠️  Model reload failed: {e}")
+        return False
+    finally:
+        _reload_status["finished_at"] = time.time()
+        _reload_lock.release()
+
+
+def reload_models(version=None, background: bool = True) -> dict:
+    """
+    Load `version` (default: the CURRENT one) and swap it in.
+
+    Raises ReloadInProgress if another reload is still loading.
+    """
+    if not _reload_lock.acquire(blocking=False):
+        raise ReloadInProgress("A model reload is already in progress")
+    # Mark the reload as loading before the thread starts, so the returned status never shows the previous one
+    started = time.time()
+    _reload_status.clear()
+    _reload_status.update(state="loading", requested_version=version, started_at=started, finished_at=None, error=None)
+    if background:
+        threading.Thread(target=_reload, args=(version, started), name="model-reload", daemon=True).start()
+    else:
+        _reload(version, started)
+    return reload_status()
+
+
+def watch_models(interval: float = 5.0) -> threading.Thread:
+    """Poll `CURRENT` every `interval` seconds and reload when it changes."""
+    def _watch():
+        last_seen = current_version(MODEL_PATH)
+        while True:
+            time.sleep(interval)
+            try:
+                version = current_version(MODEL_PATH)
+                if version and version != last_seen:
+                    status = reload_models(version, background=False)
+                    # Only a successful reload counts as seen; a failed one is retried on the next tick
+                    if status.get("state") == "done":
+                        last_seen = version
+            except ReloadInProgress:
+                pass  # retry on the next tick
+            except Exception as e:
+                print(f"⚠️  Model watcher error: {e}")
+
+    thread = threading.Thread(target=_watch, name="model-watcher", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,75 @@
+"""
+Per-language product display names, resolved once per model version.
+
+A `NameTable` maps a fixed key vocabulary (the user-item matrix columns, or
+the items that appear in association rules) to dense English and Spanish
+name arrays, so turning a batch of item ids into display names is a single
+array gather instead of a catalog `.loc` lookup plus translation per item.
+"""
+import numpy as np
+import pandas as pd
+
+LANGUAGES = ("en", "es")
+
+
+def _catalog_names(catalog, keys) -> pd.Series:
+    """English catalog description for each key (NaN where unknown)."""
+    if catalog is None or "Description" not in catalog:
+        return pd.Series(np.nan, index=range(len(keys)), dtype=object)
+    desc = catalog["Description"]
+    # Duplicate stock codes resolve to their first description
+    desc = desc[~desc.index.duplicated(keep="first")]
+    return pd.Series(desc.reindex(keys).to_numpy(), dtype=object)
+
+
+class NameTable:
+    """Display names of a key vocabulary in every supported language."""
+
+    def __init__(self, keys, catalog, translate):
+        self.keys = [str(k) for k in keys]
+        self._ids = {k: i for i, k in enumerate(self.keys)}
+
+        found = _catalog_names(catalog, list(keys))
+        self.known = found.notna().to_numpy()
+        # Unknown keys display as themselves (rule items are already names)
+        english = [str(name) if ok else key for name, key, ok in zip(found, self.keys, self.known)]
+
+        translated = {name: translate(name, "es") for name in set(english)}
+        self.names = {
+            "en": np.array(english, dtype=object),
+            "es": np.array([translated[name] for name in english], dtype=object),
+        }
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.known.nbytes + sum(names.nbytes for names in self.names.values()))
+
+    def id_of(self, key):
+        return self._ids.get(str(key))
+
+    def lookup(self, ids, lang: str = "en", unknown: str = None) -> list:
+        """
+        Display names of `ids` in `lang` (English if unsupported).
+
+        With `unknown`, ids missing from the catalog use `unknown.format(code=...)`.
+        """
+        ids = np.asarray(ids, dtype=np.intp)
+        names = self.names[lang if lang in LANGUAGES else "en"][ids].tolist()
+        if unknown is not None:
+            for pos in np.flatnonzero(~self.known[ids]):
+                names[pos] = unknown.format(code=self.keys[ids[pos]])
+        return names
+
+
+def rule_items(rules) -> list:
+    """Sorted distinct items that appear in any rule's antecedents or consequents."""
+    if rules is None:
+        return []
+    items = set()
+    for column in ("antecedents", "consequents"):
+        for itemset in rules[column]:
+            items.update(itemset)
+    return sorted(items, key=str)
@@ -0,0 +1,225 @@
+"""
+Top-K user neighbor index for user-based collaborative filtering.
+
+Instead of the dense users x users correlation matrix, training stores for
+every user only its K most correlated users (int32 row ids) and their
+correlations (float32). Rows are filled with -1 / NaN when a user has fewer
+than K neighbors.
+
+The table is saved as a memory-mappable array artifact (`user_neighbors.json`
+plus `.npy` files); `user_neighbors.pkl` is still read as a fallback.
+"""
+import os
+import pickle
+
+import numpy as np
+
+from app.services.array_store import is_memory_mapped, load_arrays, save_arrays
+
+ARRAY_ARTIFACT = "user_neighbors"
+NEIGHBORS_ARTIFACT = "user_neighbors.pkl"
+LEGACY_CORRELATION_ARTIFACT = "user_correlation_matrix.pkl"
+DEFAULT_K = 20
+DEFAULT_BLOCK_SIZE = 1024
+# Cells of the dense (users x changed users) similarity block computed at once
+BLOCK_CELLS = 16_000_000
+
+
+class NeighborIndex:
+    """Fixed-width table of the K nearest users of every user, sorted by similarity."""
+
+    def __init__(self, neighbors, similarities):
+        self.neighbors = np.asarray(neighbors, dtype=np.int32)
+        self.similarities = np.asarray(similarities, dtype=np.float32)
+        if self.neighbors.shape != self.similarities.shape:
+            raise ValueError("neighbors and similarities must have the same shape")
+
+    @property
+    def n_users(self) -> int:
+        return int(self.neighbors.shape[0])
+
+    @property
+    def k(self) -> int:
+        return int(self.neighbors.shape[1])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.neighbors.nbytes + self.similarities.nbytes)
+
+    @property
+    def memory_mapped(self) -> bool:
+        return is_memory_mapped(self.neighbors)
+
+    def neighbors_of(self, row: int, n: int):
+        """The `n` most similar users of `row` and their similarities, best first."""
+        # A negative n would slice from the end of the row
+        n = max(0, min(n, self.k))
+        ids = self.neighbors[row, :n]
+        sims = self.similarities[row, :n]
+        valid = ids >= 0
+        return ids[valid], sims[valid]
+
+    def to_artifact(self) -> dict:
+        return {"neighbors": self.neighbors, "similarities": self.similarities}
+
+    def save(self, directory: str):
+        """Write the table as a memory-mappable array artifact."""
+        save_arrays(directory, ARRAY_ARTIFACT, self.to_artifact(), k=self.k)
+
+
+def standardize_rows(factors) -> np.ndarray:
+    """Center and L2-normalize rows, so the dot product of two rows is their Pearson correlation."""
+    z = np.asarray(factors, dtype=np.float64)
+    z = z - z.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(z, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (z / norms).astype(np.float32)
+
+
+def _top_k_rows(sims: np.ndarray, k: int):
+    """Column ids and values of the `k` largest entries per row, sorted descending."""
+    part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    part_sims = np.take_along_axis(sims, part, axis=1)
+    order = np.argsort(-part_sims, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_sims, order, axis=1)
+
+
+def build_neighbor_index(factors, k: int = DEFAULT_K, block_size: int = DEFAULT_BLOCK_SIZE) -> NeighborIndex:
+    """
+    Build the top-K neighbor table from user latent factors (e.g. TruncatedSVD output).
+
+    Similarity is the row-wise Pearson correlation, same as `np.corrcoef(factors)`,
+    but computed `block_size` users at a time with partial selection, so memory
+    stays O(block_size x users) instead of O(users^2).
+    """
+    z = standardize_rows(factors)
+    n_users = z.shape[0]
+    k = max(0, min(k, n_users - 1))
+
+    neighbors = np.full((n_users, k), -1, dtype=np.int32)
+    similarities = np.full((n_users, k), np.nan, dtype=np.float32)
+    if k == 0:
+        return NeighborIndex(neighbors, similarities)
+
+    for start in range(0, n_users, block_size):
+        end = min(start + block_size, n_users)
+        neighbors[start:end], similarities[start:end] = _rows_top_k(z, np.arange(start, end), k)
+
+    return NeighborIndex(neighbors, similarities)
+
+
+def _rows_top_k(z: np.ndarray, rows: np.ndarray, k: int):
+    """Exact top-`k` (ids, similarities) of `rows` of standardized `z` among all rows."""
+    block = z[rows] @ z.T
+    # A user is never its own neighbor
+    block[np.arange(len(rows)), rows] = -np.inf
+    return _top_k_rows(block, k)
+
+
+def exact_neighbor_rows(z: np.ndarray, rows, k: int, block_size: int = DEFAULT_BLOCK_SIZE):
+    """
+    (neighbors, similarities) of only `rows` of standardized factors `z`,
+    exact, computed `block_size` rows at a time; -1 / NaN padded to `k` columns.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    neighbors = np.full((len(rows), k), -1, dtype=np.int32)
+    similarities = np.full((len(rows), k), np.nan, dtype=np.float32)
+    width = max(0, min(k, len(z) - 1))
+    for start in range(0, len(rows) if width else 0, block_size):
+        block = rows[start:start + block_size]
+        neighbors[start:start + len(block), :width], similarities[start:start + len(block), :width] = _rows_top_k(z, block, width)
+    return neighbors, similarities
+
+
+def merge_changed_neighbors(index: NeighborIndex, z: np.ndarray, changed_rows, block_cells: int = BLOCK_CELLS) -> NeighborIndex:
+    """
+    The table with every user outside `changed_rows` re-scored against the
+    users at `changed_rows` (new users, or users whose factors changed; their
+    own rows must already be recomputed).
+
+    A correlation changes only if one of its two users changed, so each other
+    user keeps its list minus the changed users, merged with its similarities
+    to the changed users in `z`. If a user lost changed neighbors and its
+    merged K-th entry fell below its old K-th similarity (the bound on users
+    outside its old list), its row is recomputed exactly. Costs
+    O(changed users x users) dot products instead of the all-pairs rebuild.
+    """
+    changed_rows = np.unique(np.asarray(changed_rows, dtype=np.int64))
+    neighbors = np.array(index.neighbors)
+    similarities = np.array(index.similarities)
+    n_users, k = neighbors.shape
+    if k == 0 or not len(changed_rows):
+        return NeighborIndex(neighbors, similarities)
+    changed = np.zeros(n_users, dtype=bool)
+    changed[changed_rows] = True
+    others = np.flatnonzero(~changed)
+
+    ids = neighbors[others]
+    # Lower bound of the users outside each full old list (-inf: the list held every user)
+    bound = np.where(ids[:, -1] >= 0, similarities[others, -1], -np.inf)
+    # Drop changed users from the kept lists; they come back with their new similarities
+    stale = (ids >= 0) & changed[np.maximum(ids, 0)]
+    ids = np.where(stale, -1, ids)
+    sims = np.where(ids >= 0, similarities[others], -np.inf)
+
+    block_size = max(1, block_cells // n_users)
+    for start in range(0, len(changed_rows), block_size):
+        block_rows = changed_rows[start:start + block_size]
+        block = z[others] @ z[block_rows].T
+        merged = np.hstack([sims, block])
+        merged_ids = np.hstack([ids, np.broadcast_to(block_rows.astype(np.int32), (len(others), len(block_rows)))])
+        top, sims = _top_k_rows(merged, k)
+        ids = np.take_along_axis(merged_ids, top, axis=1)
+
+    found = np.isfinite(sims)
+    neighbors[others] = np.where(found, ids, -1)
+    similarities[others] = np.where(found, sims, np.nan)
+
+    # Users whose merged K-th entry no longer covers the users outside their old list
+    dirty = others[stale.any(axis=1) & (sims[:, -1] < bound)]
+    if len(dirty):
+        neighbors[dirty], similarities[dirty] = exact_neighbor_rows(z, dirty, k)
+    return NeighborIndex(neighbors, similarities)
+
+
+def neighbors_from_correlation(corr_matrix, k: int = DEFAULT_K) -> NeighborIndex:
+    """Build the neighbor table from a legacy dense correlation matrix."""
+    corr = np.array(corr_matrix, dtype=np.float32)
+    n_users = corr.shape[0]
+    k = max(0, min(k, n_users - 1))
+    corr[np.isnan(corr)] = -np.inf
+    np.fill_diagonal(corr, -np.inf)
+    if k == 0:
+        return NeighborIndex(np.empty((n_users, 0)), np.empty((n_users, 0)))
+    ids, sims = _top_k_rows(corr, k)
+    return NeighborIndex(ids, sims)
+
+
+def load_neighbor_index(model_path: str, mmap: bool = True):
+    """
+    Load the neighbor table from `model_path`.
+
+    Prefers the memory-mapped array artifact, then `user_neighbors.pkl`, and
+    falls back to deriving it once from a legacy `user_correlation_matrix.pkl`.
+    """
+    loaded = load_arrays(model_path, ARRAY_ARTIFACT, mmap=mmap)
+    if loaded is not None:
+        arrays, _ = loaded
+        return NeighborIndex(arrays["neighbors"], arrays["similarities"])
+
+    path = os.path.join(model_path, NEIGHBORS_ARTIFACT)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            artifact = pickle.load(f)
+        return NeighborIndex(artifact["neighbors"], artifact["similarities"])
+
+    legacy_path = os.path.join(model_path, LEGACY_CORRELATION_ARTIFACT)
+    if os.path.exists(legacy_path):
+        print(f"⚠️  {NEIGHBORS_ARTIFACT} not found, deriving it from legacy {LEGACY_CORRELATION_ARTIFACT}. Re-run training.")
+        with open(legacy_path, "rb") as f:
+            corr_matrix = pickle.load(f)
+        index = neighbors_from_correlation(corr_matrix)
+        del corr_matrix
+        return index
+
+    return None
@@ -0,0 +1,206 @@
+"""
+In-memory search indexes for the catalog, autocomplete and user-id endpoints.
+
+Built once per model version over stock codes and English/Spanish
+descriptions. Text is normalized (lowercase, accents folded) and indexed two
+ways per field:
+
+- sorted distinct tokens with their product postings, so a prefix query is a
+  binary-search range over the tokens (autocomplete);
+- 1- to 3-character n-gram postings, so a substring query intersects the
+  postings of its n-grams and only verifies the surviving candidates.
+
+Postings are sorted catalog row ids, so results come back in catalog order.
+
+User ids are kept sorted numerically (pagination is a slice) and as sorted
+ASCII strings (prefix search is a binary-search range); substring search is a
+chunked, capped scan used only when prefixes do not fill the result.
+"""
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+NGRAM = 3
+_TOKEN_RE = re.compile(r"\w+")
+_EMPTY = np.empty(0, dtype=np.int32)
+# Substring fallback for user ids: ids converted per chunk, and at most
+# USER_SCAN_LIMIT ids examined per query (matches beyond it are not reported)
+USER_SCAN_CHUNK = 65536
+USER_SCAN_LIMIT = 1_000_000
+
+
+def normalize(text) -> str:
+    """Lowercase and strip accents, so "Café" and "cafe" match."""
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _postings(doc_sets: dict) -> dict:
+    return {key: np.fromiter(sorted(docs), dtype=np.int32, count=len(docs)) for key, docs in doc_sets.items()}
+
+
+class _FieldIndex:
+    """Token and n-gram postings over one normalized text field."""
+
+    def __init__(self, texts):
+        self.texts = texts
+        grams = defaultdict(set)
+        tokens = defaultdict(set)
+        for doc, text in enumerate(texts):
+            for n in range(1, NGRAM + 1):
+                for i in range(len(text) - n + 1):
+                    grams[text[i:i + n]].add(doc)
+            for token in _TOKEN_RE.findall(text):
+                tokens[token].add(doc)
+        self.grams = _postings(grams)
+        token_postings = _postings(tokens)
+        self.tokens = sorted(token_postings)
+        self.token_docs = [token_postings[t] for t in self.tokens]
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(p.nbytes for p in self.grams.values()) + sum(p.nbytes for p in self.token_docs))
+
+    def substring(self, q: str) -> np.ndarray:
+        """Rows whose text contains `q` (already normalized)."""
+        if len(q) <= NGRAM:
+            return self.grams.get(q, _EMPTY)
+        postings = [self.grams.get(q[i:i + NGRAM]) for i in range(len(q) - NGRAM + 1)]
+        if any(p is None for p in postings):
+            return _EMPTY
+        candidates = reduce(np.intersect1d, sorted(postings, key=len))
+        return np.array([d for d in candidates if q in self.texts[d]], dtype=np.int32)
+
+    def prefix(self, q: str) -> np.ndarray:
+        """Rows with a token starting with `q` (already normalized)."""
+        # An empty prefix would match every token
+        if not q:
+            return _EMPTY
+        lo = bisect_left(self.tokens, q)
+        hi = bisect_left(self.tokens, q + "\uffff")
+        if lo == hi:
+            return _EMPTY
+        return np.unique(np.concatenate(self.token_docs[lo:hi]))
+
+
+class ProductSearchIndex:
+    """Search index over the product catalog (stock code, EN and ES descriptions)."""
+
+    def __init__(self, catalog, translate):
+        df = catalog.reset_index() if catalog.index.name else catalog
+        code_col = next((c for c in df.columns if c.lower() in ("stockcode", "stock_code")), df.columns[0])
+        self.code_column = code_col
+        self.codes = [str(c) for c in df[code_col].tolist()]
+        self.descriptions = {"en": [None if pd.isna(d) else str(d) for d in df["Description"].tolist()]}
+        self.descriptions["es"] = [translate(d, "es") if d is not None else None for d in self.descriptions["en"]]
+
+        self.fields = {
+            "code": _FieldIndex([normalize(c) for c in self.codes]),
+            "en": _FieldIndex([normalize(d or "") for d in self.descriptions["en"]]),
+        }
+        if self.descriptions["es"] != self.descriptions["en"]:
+            self.fields["es"] = _FieldIndex([normalize(d or "") for d in self.descriptions["es"]])
+        else:
+            # No translations: Spanish queries search the English index
+            self.fields["es"] = self.fields["en"]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(f.nbytes for f in {id(f): f for f in self.fields.values()}.values())
+
+    def _field_names(self, fields):
+        names = []
+        for f in fields:
+            if f in self.fields and all(self.fields[f] is not self.fields[n] for n in names):
+                names.append(f)
+        return names
+
+    def search(self, q: str, fields, limit: int = None) -> np.ndarray:
+        """Rows where any of `fields` contains `q`, in catalog order, capped at `limit`."""
+        q = normalize(q)
+        hits = [self.fields[f].substring(q) for f in self._field_names(fields)]
+        rows = reduce(np.union1d, hits) if hits else _EMPTY
+        return rows[:limit] if limit is not None else rows
+
+    def autocomplete(self, q: str, fields, limit: int) -> np.ndarray:
+        """Up to `limit` rows: token-prefix matches first, then other substring matches."""
+        q = normalize(q)
+        # A query that normalizes to nothing (e.g. a lone combining accent) matches nothing
+        if not q:
+            return _EMPTY
+        names = self._field_names(fields)
+        prefix_hits = [self.fields[f].prefix(q) for f in names]
+        rows = reduce(np.union1d, prefix_hits) if prefix_hits else _EMPTY
+        if len(rows) < limit:
+            rest = self.search(q, names)
+            rows = np.concatenate([rows, rest[~np.isin(rest, rows)]])
+        return rows[:limit]
+
+    def description(self, row: int, lang: str):
+        return self.descriptions["es" if lang == "es" else "en"][row]
+
+
+class UserIdIndex:
+    """Sorted user ids, numerically and as strings, for listing and id autocomplete."""
+
+    def __init__(self, user_ids):
+        self.ids = np.sort(np.asarray(user_ids, dtype=np.int64))
+        # Fixed-width bytes: a fraction of the memory of Python str objects
+        strings = self.ids.astype("S")
+        order = np.argsort(strings, kind="stable")
+        self.strings = strings[order]
+        self.string_ids = self.ids[order]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.ids.nbytes + self.strings.nbytes + self.string_ids.nbytes)
+
+    def page(self, start: int, end: int) -> np.ndarray:
+        return self.ids[max(start, 0):max(end, 0)]
+
+    def prefix(self, q: str, limit: int) -> np.ndarray:
+        """Up to `limit` ids whose decimal form starts with `q`, in string order."""
+        # Only ASCII digits can match; anything else would encode to a prefix of every id
+        if not (q.isascii() and q.isdigit()):
+            return self.ids[:0]
+        key = q.encode("ascii")
+        lo = np.searchsorted(self.strings, key, side="left")
+        hi = np.searchsorted(self.strings, key + b"\xff", side="left")
+        return self.string_ids[lo:min(hi, lo + limit)]
+
+    def search(self, q: str, limit: int) -> np.ndarray:
+        """
+        Prefix matches first, then ids containing `q` elsewhere (numeric order), capped at `limit`.
+
+        The substring fallback only examines the first USER_SCAN_LIMIT ids.
+        """
+        if not q:
+            return self.ids[:limit]
+        if not (q.isascii() and q.isdigit()):
+            return self.ids[:0]
+        found = self.prefix(q, limit)
+        if len(found) >= limit:
+            return found
+        key = q.encode("ascii")
+        extra = []
+        needed = limit - len(found)
+        for start in range(0, min(len(self.ids), USER_SCAN_LIMIT), USER_SCAN_CHUNK):
+            chunk = self.ids[start:start + USER_SCAN_CHUNK]
+            # find() > 0: contains q but does not start with it (already in `found`)
+            hits = chunk[np.char.find(chunk.astype("S"), key) > 0]
+            extra.append(hits[:needed])
+            needed -= len(extra[-1])
+            if needed <= 0:
+                break
+        return np.concatenate([found] + extra)
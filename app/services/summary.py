@@ -0,0 +1,47 @@
+"""
+Dashboard aggregates materialized once per model version.
+
+The Overview and Model Performance pages poll KPIs that only change when a
+new model version is loaded, so they are computed here at load time and the
+endpoints serve them from this snapshot.
+"""
+import numpy as np
+
+
+class ModelSummary:
+    """KPIs, product popularity ranking and rule statistics of one model version."""
+
+    def __init__(self, user_item_matrix, rules):
+        self.total_users = user_item_matrix.n_users if user_item_matrix is not None else 0
+        self.total_products = user_item_matrix.n_items if user_item_matrix is not None else 0
+        # Total transactions approximated from user-item matrix non-zero entries
+        self.total_transactions = user_item_matrix.total() if user_item_matrix is not None else 0
+        self.nonzero = user_item_matrix.nonzero_count() if user_item_matrix is not None else 0
+        cells = self.total_users * self.total_products
+        self.matrix_density = round(float(self.nonzero) / cells * 100, 2) if cells else 0.0
+
+        # Products by total quantity, best first (ties keep column order)
+        if user_item_matrix is not None:
+            self.item_totals = user_item_matrix.item_totals()
+            self.popularity = np.argsort(-self.item_totals, kind="stable").astype(np.int32)
+        else:
+            self.item_totals = np.empty(0)
+            self.popularity = np.empty(0, dtype=np.int32)
+
+        has_rules = rules is not None and len(rules) > 0
+        self.total_rules = int(len(rules)) if rules is not None else 0
+        self.avg_confidence = float(rules["confidence"].mean()) if has_rules else 0.0
+        self.avg_lift = float(rules["lift"].mean()) if has_rules else 0.0
+        self.avg_support = float(rules["support"].mean()) if has_rules else 0.0
+        self.max_rule_length = (
+            int(rules["antecedents"].apply(len).max() + rules["consequents"].apply(len).max()) if has_rules else 0
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.item_totals.nbytes + self.popularity.nbytes)
+
+    def top_items(self, limit: int):
+        """(item_columns, totals) of the `limit` most popular products."""
+        cols = self.popularity[:max(limit, 0)]
+        return cols, self.item_totals[cols]
@@ -0,0 +1,174 @@
+"""
+Sparse user-item matrix used by the recommendation and dashboard APIs.
+
+The training pipeline saves the matrix as a CSR array plus two index arrays
+(customer ids for the rows, stock codes for the columns) instead of a dense
+pandas DataFrame, which at customer x SKU scale is almost entirely zeros.
+
+The preferred on-disk format is the memory-mappable `user_item` array artifact
+(see `app.services.array_store`); `user_item_sparse.pkl` and the legacy dense
+`user_item_matrix.pkl` are still read as fallbacks.
+"""
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from app.services.array_store import is_memory_mapped, load_arrays, save_arrays
+
+ARRAY_ARTIFACT = "user_item"
+SPARSE_ARTIFACT = "user_item_sparse.pkl"
+LEGACY_DENSE_ARTIFACT = "user_item_matrix.pkl"
+
+
+class SparseUserItemMatrix:
+    """CSR user x item matrix with its row (user) and column (stock code) labels."""
+
+    def __init__(self, matrix, user_ids, stock_codes):
+        self.matrix = sparse.csr_matrix(matrix)
+        # Memory-mapped arrays are read-only; artifacts are saved without explicit zeros
+        if not (self.matrix.data != 0).all():
+            self.matrix.eliminate_zeros()
+        self.user_ids = np.asarray(user_ids)
+        self.stock_codes = np.asarray(stock_codes, dtype=object)
+        if self.matrix.shape != (len(self.user_ids), len(self.stock_codes)):
+            raise ValueError(
+                f"Matrix shape {self.matrix.shape} does not match "
+                f"{len(self.user_ids)} users x {len(self.stock_codes)} items"
+            )
+        # Hash index for O(1) customer id -> row lookups
+        self._user_index = pd.Index(self.user_ids)
+        self._item_index = None
+        self._purchased = None
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Build from a dense user x item DataFrame (index: CustomerID, columns: StockCode)."""
+        return cls(sparse.csr_matrix(df.values), df.index.values, df.columns.values)
+
+    def to_artifact(self) -> dict:
+        """Plain dict saved to disk, so the pickle does not depend on this class."""
+        return {"matrix": self.matrix, "user_ids": self.user_ids, "stock_codes": self.stock_codes}
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    @property
+    def n_users(self) -> int:
+        return int(self.matrix.shape[0])
+
+    @property
+    def n_items(self) -> int:
+        return int(self.matrix.shape[1])
+
+    @property
+    def nbytes(self) -> int:
+        m = self.matrix
+        return int(m.data.nbytes + m.indices.nbytes + m.indptr.nbytes + self.user_ids.nbytes + self.stock_codes.nbytes)
+
+    @property
+    def memory_mapped(self) -> bool:
+        return is_memory_mapped(self.matrix.data)
+
+    @property
+    def purchased(self):
+        """Binary float32 view (1.0 where the user bought the item), sharing the CSR index arrays."""
+        if self._purchased is None:
+            m = self.matrix
+            if m.dtype == np.float32 and (m.data == 1).all():
+                # Already binary float32 (array artifacts): reuse it, memory maps included
+                self._purchased = m
+            else:
+                self._purchased = sparse.csr_matrix(
+                    ((m.data > 0).astype(np.float32), m.indices, m.indptr), shape=m.shape, copy=False
+                )
+        return self._purchased
+
+    def row_of(self, user_id):
+        """Row index of a customer id, or None if the customer is not in the matrix."""
+        rows = self.rows_of([user_id])
+        return int(rows[0]) if rows[0] >= 0 else None
+
+    def rows_of(self, user_ids) -> np.ndarray:
+        """Row indices of several customer ids at once (-1 for unknown customers)."""
+        return self._user_index.get_indexer(user_ids)
+
+    def cols_of(self, stock_codes) -> np.ndarray:
+        """Matrix columns of `stock_codes` (-1 for unknown codes)."""
+        if self._item_index is None:
+            self._item_index = pd.Index([str(c) for c in self.stock_codes])
+        return self._item_index.get_indexer([str(c) for c in stock_codes])
+
+    def row_items(self, row: int):
+        """Column indices and values of the items bought by the user in `row`."""
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        return self.matrix.indices[start:end], self.matrix.data[start:end]
+
+    def item_totals(self) -> np.ndarray:
+        """Per-item column sums."""
+        return np.asarray(self.matrix.sum(axis=0)).ravel()
+
+    def total(self) -> int:
+        return int(self.matrix.data.sum())
+
+    def nonzero_count(self) -> int:
+        return int(np.count_nonzero(self.matrix.data > 0))
+
+
+def _json_scalar(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def save_user_item_matrix(matrix: SparseUserItemMatrix, directory: str):
+    """Write the matrix as a memory-mappable array artifact (binary float32 CSR)."""
+    m = matrix.matrix
+    save_arrays(
+        directory,
+        ARRAY_ARTIFACT,
+        {
+            "data": (m.data > 0).astype(np.float32),
+            "indices": m.indices,
+            "indptr": m.indptr.astype(m.indices.dtype),
+            "user_ids": matrix.user_ids.astype(np.int64),
+        },
+        format="csr",
+        shape=list(m.shape),
+        vocab={"stock_codes": [_json_scalar(c) for c in matrix.stock_codes]},
+    )
+
+
+def load_user_item_matrix(model_path: str, mmap: bool = True):
+    """
+    Load the sparse user-item artifact from `model_path`.
+
+    Prefers the memory-mapped array artifact, then `user_item_sparse.pkl`.
+    Falls back to converting the legacy dense `user_item_matrix.pkl` once at
+    load time, so older model directories keep working until retrained.
+    """
+    loaded = load_arrays(model_path, ARRAY_ARTIFACT, mmap=mmap)
+    if loaded is not None:
+        arrays, manifest = loaded
+        csr = sparse.csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]), shape=tuple(manifest["shape"]), copy=False
+        )
+        return SparseUserItemMatrix(csr, arrays["user_ids"], manifest["vocab"]["stock_codes"])
+
+    sparse_path = os.path.join(model_path, SPARSE_ARTIFACT)
+    if os.path.exists(sparse_path):
+        with open(sparse_path, "rb") as f:
+            artifact = pickle.load(f)
+        return SparseUserItemMatrix(artifact["matrix"], artifact["user_ids"], artifact["stock_codes"])
+
+    legacy_path = os.path.join(model_path, LEGACY_DENSE_ARTIFACT)
+    if os.path.exists(legacy_path):
+        print(f"⚠️  {SPARSE_ARTIFACT} not found, converting legacy {LEGACY_DENSE_ARTIFACT}. Re-run training.")
+        with open(legacy_path, "rb") as f:
+            dense = pickle.load(f)
+        matrix = SparseUserItemMatrix.from_dataframe(dense)
+        del dense
+        return matrix
+
+    return None
@@ -3,26 +3,38 @@
 # Guardamos los artefactos necesarios para la API
 import pickle
 
-# Crear directorio de modelos si no existe
+import sys
+sys.path.insert(0, '..')
+from app.services.model_store import activate_version, create_version_dir
+
+# Crear directorio de una nueva versión de modelos (app/services/models/<versión>)
 os.makedirs('../app/services/models', exist_ok=True)
+version, save_dir = create_version_dir('../app/services/models')
 
 # 1. Guardar Reglas de Asociación
-rules.to_pickle("../app/services/models/association_rules.pkl")
+rules.to_pickle(f"{save_dir}/association_rules.pkl")
 
-# 2. Guardar Matriz de Correlación de Usuarios (SVD)
-# Nota: En producción idealmente se recalcula o se usa una base de datos vectorial, 
-# pero para este MVP guardamos la matriz numpy.
-with open("../app/services/models/user_correlation_matrix.pkl", "wb") as f:
-    pickle.dump(corr_matrix, f)
+# 2. Guardar vecinos top-K de cada usuario (SVD)
+# En lugar de la matriz de correlación N×N guardamos solo los K usuarios más similares.
+from app.services.neighbors import build_neighbor_index
+with open(f"{save_dir}/user_neighbors.pkl", "wb") as f:
+    pickle.dump(build_neighbor_index(matrix_svd).to_artifact(), f)
 
 # 3. Guardar Matriz Usuario-Item (necesaria para filtrar qué ya compró el usuario)
-# Guardamos solo los índices y columnas para ahorrar espacio si es posible, 
-# pero necesitamos los datos para saber qué compró. 
-# Para optimizar, podríamos guardar una versión esparsa o solo un diccionario {user: [items_bought]}
-user_item_matrix.to_pickle("../app/services/models/user_item_matrix.pkl")
+# Se guarda en formato esparso (CSR) junto con los índices de usuarios y productos.
+from scipy import sparse
+with open(f"{save_dir}/user_item_sparse.pkl", "wb") as f:
+    pickle.dump({
+        "matrix": sparse.csr_matrix(user_item_matrix.values.astype(np.uint8)),
+        "user_ids": user_item_matrix.index.values,
+        "stock_codes": user_item_matrix.columns.values.astype(object),
+    }, f)
 
 # 4. Guardar catálogo de productos (StockCode -> Description) para mostrar nombres en la API
 product_catalog = df[['StockCode', 'Description']].drop_duplicates('StockCode').set_index('StockCode')
-product_catalog.to_pickle("../app/services/models/product_catalog.pkl")
+product_catalog.to_pickle(f"{save_dir}/product_catalog.pkl")
+
+# 5. Activar la nueva versión para la API
+activate_version('../app/services/models', version)
 
-print("Modelos y artefactos guardados exitosamente en ../app/services/models/")
+print(f"Modelos y artefactos guardados exitosamente en {save_dir}")
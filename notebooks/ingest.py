@@ -0,0 +1,208 @@
+"""
+Ingesta por bloques de archivos de transacciones para el entrenamiento.
+
+Lee CSV (y Parquet, si `pyarrow` está instalado) desde disco en bloques,
+aplica la limpieza del pipeline a cada bloque y acumula los conteos esparsos
+(usuario x producto y factura x descripción) de forma incremental, de modo que
+la memoria depende del número de pares distintos y no de la longitud del
+historial. No necesita conexión: solo una ruta local.
+"""
+import codecs
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+DEFAULT_CHUNKSIZE = 200_000
+# Triples pendientes mínimos antes de fusionarlos con la matriz acumulada
+MERGE_MIN_ENTRIES = 1_000_000
+# Columnas clave leídas como texto para que todos los bloques usen el mismo tipo
+KEY_DTYPES = {'InvoiceNo': str, 'StockCode': str, 'Description': str, 'Country': str}
+INPUT_EXTENSIONS = ('.csv', '.parquet', '.pq')
+
+
+def clean_transactions(df):
+    """Limpieza básica: sin CustomerID nulos, sin facturas canceladas ('C') y descripciones sin espacios."""
+    df = df.dropna(subset=['CustomerID'])
+    df = df[~df['InvoiceNo'].astype(str).str.contains('C')]
+    df = df.assign(
+        Description=df['Description'].str.strip(),
+        CustomerID=df['CustomerID'].astype(int),
+    )
+    return df
+
+
+def binarize(totals):
+    """Matriz CSR float32 con 1 donde la suma es positiva."""
+    binary = totals.tocsr().copy()
+    binary.data = (binary.data > 0).astype(np.float64)
+    binary.eliminate_zeros()
+    return binary.astype(np.float32)
+
+
+class SparseCounts:
+    """
+    Suma de valores por (fila, item) acumulada bloque a bloque.
+
+    Las claves se codifican con vocabularios que crecen con cada bloque; al
+    final `binary()` reordena filas e items por etiqueta (el mismo orden que
+    pivot_table) y marca con 1 las celdas cuya suma es positiva.
+
+    Los triples de cada bloque se guardan pendientes y se fusionan con la
+    matriz acumulada solo cuando superan a sus celdas (y MERGE_MIN_ENTRIES):
+    cada fusión recorre la matriz completa, así el costo total queda lineal
+    en el número de filas leídas y la memoria pendiente acotada por la de la
+    matriz.
+    """
+
+    def __init__(self):
+        self.row_labels = []
+        self.item_labels = []
+        self._row_codes = {}
+        self._item_codes = {}
+        self._totals = sparse.csr_matrix((0, 0), dtype=np.float64)
+        self._pending = []
+        self._pending_entries = 0
+
+    @staticmethod
+    def _encode(keys, codes, labels):
+        uniques, inverse = np.unique(np.asarray(keys, dtype=object), return_inverse=True)
+        mapped = np.empty(len(uniques), dtype=np.int64)
+        for i, key in enumerate(uniques):
+            code = codes.get(key)
+            if code is None:
+                code = codes[key] = len(labels)
+                labels.append(key)
+            mapped[i] = code
+        return mapped[inverse]
+
+    def add(self, rows, items, values):
+        """Acumula un bloque de triples (fila, item, valor)."""
+        if len(rows) == 0:
+            return
+        row_codes = self._encode(rows, self._row_codes, self.row_labels)
+        item_codes = self._encode(items, self._item_codes, self.item_labels)
+        self._pending.append((row_codes, item_codes, np.asarray(values, dtype=np.float64)))
+        self._pending_entries += len(row_codes)
+        if self._pending_entries >= max(self._totals.nnz, MERGE_MIN_ENTRIES):
+            self._merge()
+
+    def _merge(self):
+        """Suma los triples pendientes a la matriz acumulada (una sola conversión COO -> CSR)."""
+        shape = (len(self.row_labels), len(self.item_labels))
+        totals = self._totals
+        totals.resize(shape)
+        if self._pending:
+            rows, items, values = (np.concatenate(parts) for parts in zip(*self._pending))
+            totals = totals + sparse.coo_matrix((values, (rows, items)), shape=shape).tocsr()
+        self._totals = totals
+        self._pending = []
+        self._pending_entries = 0
+
+    @property
+    def totals(self):
+        """Sumas CSR float64 por (fila, item), en el orden de codificación."""
+        if self._pending or self._totals.shape != (len(self.row_labels), len(self.item_labels)):
+            self._merge()
+        return self._totals
+
+    def sorted_totals(self):
+        """(sumas CSR float64, etiquetas de filas, etiquetas de items), ordenadas por etiqueta."""
+        row_order = np.argsort(np.asarray(self.row_labels, dtype=object), kind="stable")
+        item_order = np.argsort(np.asarray(self.item_labels, dtype=object), kind="stable")
+        totals = self.totals[row_order][:, item_order]
+        totals.sum_duplicates()
+        row_labels = pd.Index([self.row_labels[i] for i in row_order])
+        item_labels = pd.Index([self.item_labels[i] for i in item_order])
+        return totals, row_labels, item_labels
+
+    def binary(self):
+        """(matriz CSR float32 binaria, etiquetas de filas, etiquetas de items), ordenadas por etiqueta."""
+        totals, row_labels, item_labels = self.sorted_totals()
+        return binarize(totals), row_labels, item_labels
+
+
+class TransactionAccumulator:
+    """Matriz usuario-item, canasta del país de Apriori y catálogo, construidos bloque a bloque."""
+
+    def __init__(self, country='France'):
+        self.country = country
+        self.user_item = SparseCounts()
+        self.basket = SparseCounts()
+        self.catalog = {}
+        self.rows = 0
+
+    def add(self, df):
+        df = clean_transactions(df)
+        # Claves como texto también para fuentes sin KEY_DTYPES (read_excel): códigos
+        # mixtos int/str no se pueden ordenar ni comparar entre bloques
+        df = df.astype({'InvoiceNo': str, 'StockCode': str})
+        self.rows += len(df)
+        self.user_item.add(df['CustomerID'].to_numpy(), df['StockCode'].to_numpy(), df['Quantity'].to_numpy())
+
+        local = df[(df['Country'] == self.country) & df['Description'].notna()]
+        self.basket.add(local['InvoiceNo'].to_numpy(), local['Description'].astype(str).to_numpy(), local['Quantity'].to_numpy())
+
+        # Catálogo: primera descripción vista de cada StockCode (como drop_duplicates)
+        first = df.drop_duplicates('StockCode')
+        for code, desc in zip(first['StockCode'], first['Description']):
+            self.catalog.setdefault(code, desc)
+
+    def product_catalog(self):
+        catalog = pd.DataFrame(
+            {'StockCode': list(self.catalog), 'Description': list(self.catalog.values())}
+        )
+        return catalog.set_index('StockCode')
+
+
+def _detect_encoding(path, block_size=1 << 20):
+    """'utf-8' si todo el archivo es UTF-8 válido (leído por bloques), si no 'ISO-8859-1'."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                decoder.decode(block)
+            decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return 'ISO-8859-1'
+    return 'utf-8'
+
+
+def input_files(path):
+    """Archivos de transacciones en `path` (un archivo o un directorio), en orden de nombre."""
+    if os.path.isdir(path):
+        files = sorted(
+            f for f in glob.glob(os.path.join(path, '*')) if f.lower().endswith(INPUT_EXTENSIONS)
+        )
+        if not files:
+            raise FileNotFoundError(f"No hay archivos CSV/Parquet en {path}")
+        return files
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    return [path]
+
+
+def iter_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    """Bloques (DataFrames) de a lo sumo `chunksize` filas de cada archivo en `path`."""
+    for file in input_files(path):
+        if file.lower().endswith(('.parquet', '.pq')):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise ImportError("Leer Parquet requiere pyarrow: pip install pyarrow") from e
+            for batch in pq.ParquetFile(file).iter_batches(batch_size=chunksize):
+                df = batch.to_pandas()
+                yield df.astype({'InvoiceNo': str, 'StockCode': str})
+        else:
+            yield from pd.read_csv(file, encoding=_detect_encoding(file), dtype=KEY_DTYPES, chunksize=chunksize)
+
+
+def ingest(path, chunksize=DEFAULT_CHUNKSIZE, country='France'):
+    """Lee y acumula todas las transacciones de `path`; devuelve el TransactionAccumulator."""
+    accumulator = TransactionAccumulator(country)
+    for i, chunk in enumerate(iter_chunks(path, chunksize), 1):
+        accumulator.add(chunk)
+        print(f"  bloque {i}: {accumulator.rows} filas válidas acumuladas")
+    return accumulator
@@ -0,0 +1,115 @@
+"""
+Materialización offline de las recomendaciones top-N de todos los usuarios.
+
+Calcula, para cada usuario de una versión de los modelos (por defecto la
+CURRENT), la misma lista que `/recommend/user/{user_id}` (filtro colaborativo
+con la tabla de vecinos) y la guarda en la versión como el artefacto
+`recommendations` (arrays .npy + manifiesto JSON, ver
+app/services/materialized.py). Los usuarios se reparten por bloques entre
+procesos (uno por núcleo); cada proceso abre los artefactos con memory-mapping,
+así no se copian los modelos.
+
+La API sirve desde estas listas con una lectura O(1) y puntúa en línea cuando
+la petición no está cubierta (top_n mayor, otro modo de puntaje, fold-in).
+Tras ejecutarlo, la API la carga sola con RECSYS_WATCH_MODELS=1, o con
+POST /admin/models/reload.
+
+Uso:
+    python notebooks/materialize_recommendations.py --top-n 20 --workers 8
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Permite importar los módulos compartidos con la API (app.services)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app.services.collaborative import score_users
+from app.services.materialized import ARRAY_ARTIFACT, MaterializedRecommendations
+from app.services.model_store import (
+    MODEL_PATH, UNVERSIONED, activate_version, copy_version_dir, create_version_dir, resolve_model_dir,
+)
+from app.services.neighbors import load_neighbor_index
+from app.services.user_item import load_user_item_matrix
+
+DEFAULT_TOP_N = 20
+DEFAULT_CHUNK_USERS = 5000
+
+# Modelos de cada proceso, cargados una sola vez en `_init_worker`
+_worker_models = {}
+
+
+def _init_worker(model_path):
+    _worker_models["user_item"] = load_user_item_matrix(model_path, mmap=True)
+    _worker_models["neighbors"] = load_neighbor_index(model_path, mmap=True)
+
+
+def _score_chunk(start, end, top_n, weighted):
+    """Listas top-N (columnas -1 y puntajes 0 de relleno) de las filas [start, end)."""
+    scored = score_users(
+        _worker_models["user_item"], _worker_models["neighbors"], np.arange(start, end), top_n, weighted=weighted
+    )
+    items = np.full((end - start, top_n), -1, dtype=np.int32)
+    scores = np.zeros((end - start, top_n), dtype=np.float32)
+    for i, (cols, vals) in enumerate(scored):
+        items[i, :len(cols)] = cols
+        scores[i, :len(vals)] = vals
+    return start, items, scores
+
+
+def materialize(version=None, top_n=DEFAULT_TOP_N, weighted=False, workers=None, chunk_users=DEFAULT_CHUNK_USERS):
+    version, model_path = resolve_model_dir(MODEL_PATH, version)
+    user_item = load_user_item_matrix(model_path, mmap=True)
+    if user_item is None or load_neighbor_index(model_path, mmap=True) is None:
+        print(f"La versión {version} no tiene matriz usuario-item o tabla de vecinos; ejecute train_and_save.py primero.")
+        return
+
+    n_users = user_item.n_users
+    workers = workers or os.cpu_count() or 1
+    print(f"Materializando top-{top_n} de {n_users} usuarios (versión {version}) con {workers} procesos...")
+    start_time = time.perf_counter()
+
+    items = np.full((n_users, top_n), -1, dtype=np.int32)
+    scores = np.zeros((n_users, top_n), dtype=np.float32)
+    chunks = [(start, min(start + chunk_users, n_users)) for start in range(0, n_users, chunk_users)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+        futures = [pool.submit(_score_chunk, start, end, top_n, weighted) for start, end in chunks]
+        for done, future in enumerate(futures, 1):
+            start, chunk_items, chunk_scores = future.result()
+            items[start:start + len(chunk_items)] = chunk_items
+            scores[start:start + len(chunk_scores)] = chunk_scores
+            print(f"  bloque {done}/{len(chunks)}")
+
+    materialized = MaterializedRecommendations(
+        user_item.user_ids, items, scores, weighted=weighted, model_version=version,
+    )
+    if version == UNVERSIONED:
+        # Directorio sin versiones: se reemplazan los archivos (nunca se truncan los mapeados)
+        save_version, save_path = version, model_path
+    else:
+        save_version, save_path = create_version_dir(MODEL_PATH)
+        copy_version_dir(model_path, save_path, exclude=(f"{ARRAY_ARTIFACT}.", "."))
+    materialized.save(save_path)
+    seconds = time.perf_counter() - start_time
+    print(f"Listas guardadas en {save_path} en {seconds:.2f}s ({n_users / max(seconds, 1e-9):.0f} usuarios/s, "
+          f"{materialized.nbytes / 1e6:.1f} MB)")
+    if save_version != UNVERSIONED:
+        activate_version(MODEL_PATH, save_version)
+        print(f"Nueva versión {save_version} (base {version}) activada como CURRENT.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precalcula las recomendaciones top-N de todos los usuarios.")
+    parser.add_argument("--version", default=None, help="Versión a materializar (por defecto la CURRENT)")
+    parser.add_argument("--top-n", type=int, default=DEFAULT_TOP_N, help="Recomendaciones guardadas por usuario")
+    parser.add_argument("--weighted", action="store_true", help="Puntaje por similitud de los vecinos (weighted=true)")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos (por defecto uno por núcleo)")
+    parser.add_argument("--chunk-users", type=int, default=DEFAULT_CHUNK_USERS, help="Usuarios por tarea")
+    args = parser.parse_args()
+    materialize(
+        version=args.version, top_n=args.top_n, weighted=args.weighted,
+        workers=args.workers, chunk_users=args.chunk_users,
+    )
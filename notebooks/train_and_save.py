@@ -1,6 +1,4 @@
-
 import os
-import pickle
 import pandas as pd
 import numpy as np
 
@@ -16,87 +14,276 @@ import numpy as np
 # ESTRATEGIA: Crear un script completo que cargue datos, entrene y guarde.
 # Esto sirve como el script de entrenamiento para la API también (pipeline de entrenamiento).
 
-import kagglehub
 import glob
+import argparse
+import json
+import shutil
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:  # Windows: sin ru_maxrss, el pico se informa como 0
+    resource = None
 from mlxtend.frequent_patterns import apriori
 from mlxtend.frequent_patterns import association_rules
 from sklearn.decomposition import TruncatedSVD
 
-def train_and_save_models():
-    print("Iniciando pipeline de entrenamiento y guardado...")
-    
-    # 1. Cargar Datos
-    print("Cargando datos...")
-    try:
-        path = kagglehub.dataset_download("tunguz/online-retail")
-        csv_files = glob.glob(os.path.join(path, "*.csv"))
-        if csv_files:
-            try:
-                df = pd.read_csv(csv_files[0], encoding='utf-8')
-            except UnicodeDecodeError:
-                df = pd.read_csv(csv_files[0], encoding='ISO-8859-1')
-        else:
-            excel_files = glob.glob(os.path.join(path, "*.xlsx"))
-            df = pd.read_excel(excel_files[0])
-            
-        # Limpieza básica
-        df = df.dropna(subset=['CustomerID'])
-        df = df[~df['InvoiceNo'].astype(str).str.contains('C')]
-        df['Description'] = df['Description'].str.strip()
-        df['CustomerID'] = df['CustomerID'].astype(int)
-    except Exception as e:
-        print(f"Error cargando datos: {e}")
-        return
+# Permite importar los módulos compartidos con la API (app.services)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app.services.ann import DEFAULT_N_PROBE, build_ivf_index, build_neighbor_index_ann, recall_report
+from app.services.item_similarity import build_item_neighbors
+from app.services.latent import save_latent_model
+from app.services.model_store import MODEL_PATH, activate_version, create_version_dir
+from app.services.neighbors import DEFAULT_K, build_neighbor_index, standardize_rows
+from app.services.user_item import SparseUserItemMatrix, save_user_item_matrix
+from ingest import DEFAULT_CHUNKSIZE, TransactionAccumulator, binarize, ingest
+from training_state import save_itemset_counts, save_user_item_counts
+
+TRAINING_REPORT = "training_report.json"
+ANN_REPORT = "ann_report.json"
+# Con "auto", la tabla de vecinos se calcula con el índice ANN a partir de este número de usuarios
+ANN_MIN_USERS = 50_000
+COUNTRY = 'France'
+MIN_SUPPORT = 0.07
+MIN_LIFT = 1
+
+
+class StageTimer:
+    """
+    Tiempo y pico de memoria de cada etapa del entrenamiento.
+
+    Por defecto el pico es el RSS máximo del proceso hasta el fin de la etapa
+    (`ru_maxrss`, sin costo por asignación). Con `trace_memory=True` se usa
+    tracemalloc, que da el pico propio de cada etapa pero hace varias veces
+    más lentas las etapas con muchas asignaciones (pandas, Apriori), así que
+    sus tiempos no son comparables con los de una corrida sin trazado.
+    """
 
-    # Crear directorio
-    save_path = os.path.join(os.path.dirname(__file__), '../app/services/models')
-    os.makedirs(save_path, exist_ok=True)
+    def __init__(self, trace_memory=False):
+        self.stages = {}
+        self.memory = "tracemalloc" if trace_memory else "max_rss"
+        self._tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start()
 
+    def _peak_bytes(self):
+        if self.memory == "tracemalloc":
+            return tracemalloc.get_traced_memory()[1]
+        if resource is None:
+            return 0
+        # ru_maxrss está en KB en Linux y en bytes en macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    @contextmanager
+    def stage(self, name):
+        if self.memory == "tracemalloc":
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        peak = self._peak_bytes()
+        self.stages[name] = {"seconds": round(seconds, 4), "peak_bytes": int(peak)}
+        print(f"⏱️  {name}: {seconds:.2f}s, pico {peak / 1e6:.1f} MB")
+
+    def close(self):
+        """Detiene tracemalloc si lo inició este timer."""
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def report(self):
+        return {
+            "stages": self.stages,
+            "memory": self.memory,
+            "total_seconds": round(sum(s["seconds"] for s in self.stages.values()), 4),
+            "peak_bytes": max((s["peak_bytes"] for s in self.stages.values()), default=0),
+        }
+
+
+def write_report(save_path, timer, **extra):
+    """Guarda el informe de tiempos y memoria por etapa en la versión y lo devuelve."""
+    report = {**extra, **timer.report()}
+    with open(os.path.join(save_path, TRAINING_REPORT), "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def write_ann_report(save_path, report):
+    """Guarda el informe recall@k vs búsqueda exacta del índice ANN y lo imprime."""
+    with open(os.path.join(save_path, ANN_REPORT), "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Índice ANN: {report['n_lists']} celdas, {report['n_users']} usuarios, "
+          f"exacta {report['exact_query_ms']:.3f} ms/consulta")
+    for row in report["results"]:
+        print(f"   n_probe={row['n_probe']:>3}: recall@{report['k']} {row['recall_at_k']:.3f}, "
+              f"{row['query_ms']:.3f} ms/consulta ({row['scanned_fraction']:.1%} de las celdas)")
+
+
+def _train_models(data, save_path, timer, country, n_neighbors, neighbor_search, ann_lists, ann_probe):
+    """
+    Entrena los modelos a partir de los conteos acumulados en `data` y guarda
+    todos los artefactos en `save_path`. Devuelve el modo de búsqueda de
+    vecinos usado ("exact" o "ann").
+    """
     # --- MODELO 1: APRIORI (France) ---
     print("Entrenando Modelo de Reglas de Asociación...")
-    country = 'France'
-    basket = (df[df['Country'] == country]
-            .groupby(['InvoiceNo', 'Description'])['Quantity']
-            .sum().unstack().reset_index().fillna(0)
-            .set_index('InvoiceNo'))
-    
-    def encode_units(x):
-        if x <= 0: return 0
-        if x >= 1: return 1
-    
-    basket_sets = basket.map(encode_units)
-    if 'POSTAGE' in basket_sets.columns:
-        basket_sets.drop('POSTAGE', inplace=True, axis=1)
-        
-    frequent_itemsets = apriori(basket_sets, min_support=0.07, use_colnames=True)
-    rules = association_rules(frequent_itemsets, metric="lift", min_threshold=1)
+    with timer.stage("basket"):
+        # Canasta factura x producto como matriz booleana esparsa (sin unstack denso
+        # ni map celda a celda)
+        basket, invoices, products = data.basket.binary()
+        keep = np.asarray(products != 'POSTAGE')
+        basket_sets = pd.DataFrame.sparse.from_spmatrix(
+            basket[:, np.flatnonzero(keep)].astype(bool), index=invoices, columns=products[keep]
+        )
+
+    with timer.stage("apriori"):
+        frequent_itemsets = apriori(basket_sets, min_support=MIN_SUPPORT, use_colnames=True)
+        rules = association_rules(frequent_itemsets, metric="lift", min_threshold=MIN_LIFT)
     
-    # Guardar Reglas
+    # Guardar Reglas y los conteos de itemsets (para update_models.py)
     rules.to_pickle(os.path.join(save_path, "association_rules.pkl"))
+    save_itemset_counts(save_path, frequent_itemsets, basket.shape[0], MIN_SUPPORT, MIN_LIFT, country)
     print("Reglas guardadas.")
 
     # --- MODELO 2: SVD ---
     print("Entrenando Modelo Filtro Colaborativo (SVD)...")
-    user_item_matrix = df.pivot_table(index='CustomerID', columns='StockCode', values='Quantity', aggfunc='sum').fillna(0)
-    user_item_matrix = user_item_matrix.map(lambda x: 1 if x > 0 else 0)
-    
-    SVD = TruncatedSVD(n_components=12, random_state=42)
-    matrix_svd = SVD.fit_transform(user_item_matrix)
-    corr_matrix = np.corrcoef(matrix_svd)
-    
-    # Guardar Matriz Correlación
-    with open(os.path.join(save_path, "user_correlation_matrix.pkl"), "wb") as f:
-        pickle.dump(corr_matrix, f)
+    with timer.stage("user_item_matrix"):
+        # Matriz usuario-item binaria construida directamente en CSR
+        # (CustomerID por fila, StockCode por columna)
+        totals, customers, stock_codes = data.user_item.sorted_totals()
+        user_item_matrix = SparseUserItemMatrix(binarize(totals), customers.to_numpy(), stock_codes.to_numpy())
+
+    with timer.stage("svd"):
+        # TruncatedSVD trabaja directamente sobre la matriz esparsa
+        SVD = TruncatedSVD(n_components=12, random_state=42)
+        matrix_svd = SVD.fit_transform(user_item_matrix.matrix)
+        # Componentes, factores de usuario y sus filas estandarizadas para el fold-in
+        # de la API (se guardan para que los workers las compartan mapeadas en memoria)
+        standardized = standardize_rows(matrix_svd)
+        save_latent_model(save_path, SVD.components_, matrix_svd, standardized)
+
+    with timer.stage("ann_index"):
+        # Índice IVF (k-means sobre los factores estandarizados) para la búsqueda
+        # aproximada de vecinos de la API (fold-in) y, con muchos usuarios, del entrenamiento
+        ann = build_ivf_index(standardized, n_lists=ann_lists, n_probe=ann_probe or DEFAULT_N_PROBE)
+        ann.save(save_path)
+
+    with timer.stage("neighbors"):
+        # Vecinos top-K por usuario (correlación sobre los factores SVD), calculados
+        # por bloques con selección parcial en lugar de la matriz N×N completa,
+        # o solo contra las celdas ANN cercanas (sin costo cuadrático)
+        # Se guarda como arrays .npy + manifiesto JSON que la API abre con memory-mapping
+        if neighbor_search == "auto":
+            neighbor_search = "ann" if user_item_matrix.n_users >= ANN_MIN_USERS else "exact"
+        if neighbor_search == "ann":
+            neighbor_index = build_neighbor_index_ann(standardized, ann, k=n_neighbors)
+        else:
+            neighbor_index = build_neighbor_index(matrix_svd, k=n_neighbors)
+        neighbor_index.save(save_path)
+
+    with timer.stage("ann_report"):
+        # Recall@k frente a la búsqueda exacta para varios n_probe (ann_report.json)
+        write_ann_report(save_path, recall_report(standardized, ann, k=n_neighbors))
+
+    # --- MODELO 3: SIMILITUD ENTRE PRODUCTOS ---
+    with timer.stage("item_neighbors"):
+        # Coseno entre columnas (StockCode) de la matriz binaria, por bloques esparsos;
+        # se guardan los K productos más similares de cada producto
+        item_neighbors = build_item_neighbors(user_item_matrix.purchased, k=n_neighbors)
+        item_neighbors.save(save_path)
+
+    with timer.stage("save"):
+        # Guardar Matriz Usuario-Item en formato esparso (CSR) con sus índices;
+        # arrays .npy + manifiesto JSON, abiertos con memory-mapping por la API.
+        save_user_item_matrix(user_item_matrix, save_path)
+        # Sumas de cantidades alineadas con la matriz, para update_models.py
+        save_user_item_counts(save_path, totals)
         
-    # Guardar Matriz Usuario-Item (Indices y Columnas para referencia)
-    # Para ahorrar espacio, guardamos el dataframe tal cual (esparso sería mejor, pero esto cumple)
-    user_item_matrix.to_pickle(os.path.join(save_path, "user_item_matrix.pkl"))
+        # Guardar Catálogo
+        product_catalog = data.product_catalog()
+        product_catalog.to_pickle(os.path.join(save_path, "product_catalog.pkl"))
+    return neighbor_search
+
+
+def train_and_save_models(n_neighbors=DEFAULT_K, input_path=None, chunksize=DEFAULT_CHUNKSIZE,
+                          neighbor_search="auto", ann_lists=None, ann_probe=None, trace_memory=False):
+    """
+    Entrena y guarda una nueva versión de los modelos.
+
+    Con `input_path` (CSV/Parquet, o un directorio con ellos) los datos se leen
+    de disco por bloques, sin conexión; si no, se descarga el dataset de Kaggle.
+    `neighbor_search` ("auto", "exact" o "ann") elige cómo se calcula la tabla
+    de vecinos; `ann_lists` / `ann_probe` configuran el índice ANN.
+    `trace_memory` mide el pico de memoria por etapa con tracemalloc (más lento).
+    """
+    print("Iniciando pipeline de entrenamiento y guardado...")
+    timer = StageTimer(trace_memory=trace_memory)
+    country = COUNTRY
     
-    # Guardar Catálogo
-    product_catalog = df[['StockCode', 'Description']].drop_duplicates('StockCode').set_index('StockCode')
-    product_catalog.to_pickle(os.path.join(save_path, "product_catalog.pkl"))
+    # 1. Cargar Datos: limpieza y conteos esparsos acumulados bloque a bloque
+    print("Cargando datos...")
+    try:
+        with timer.stage("load_data"):
+            if input_path is None:
+                # Solo se necesita kagglehub (y conexión) sin --input
+                import kagglehub
+                path = kagglehub.dataset_download("tunguz/online-retail")
+                csv_files = glob.glob(os.path.join(path, "*.csv"))
+                if csv_files:
+                    input_path = csv_files[0]
+            if input_path is not None:
+                data = ingest(input_path, chunksize=chunksize, country=country)
+            else:
+                excel_files = glob.glob(os.path.join(path, "*.xlsx"))
+                data = TransactionAccumulator(country)
+                data.add(pd.read_excel(excel_files[0]))
+    except Exception as e:
+        print(f"Error cargando datos: {e}")
+        raise
+
+    # Crear directorio de la nueva versión (app/services/models/<versión>)
+    os.makedirs(MODEL_PATH, exist_ok=True)
+    version, save_path = create_version_dir(MODEL_PATH)
+
+    try:
+        neighbor_search = _train_models(
+            data, save_path, timer, country, n_neighbors=n_neighbors,
+            neighbor_search=neighbor_search, ann_lists=ann_lists, ann_probe=ann_probe,
+        )
+    except BaseException:
+        # Sin CURRENT, la API cargaría la versión más nueva: no se deja una versión incompleta
+        shutil.rmtree(save_path, ignore_errors=True)
+        timer.close()
+        raise
+
+    timer.close()
+
+    # Tiempos y pico de memoria por etapa, junto a los artefactos de la versión
+    report = write_report(save_path, timer, mode="full", neighbor_search=neighbor_search)
+    print(f"Entrenamiento completo en {report['total_seconds']:.2f}s (pico {report['peak_bytes'] / 1e6:.1f} MB)")
     
-    print("Todos los modelos guardados en app/services/models")
+    # Activar la versión solo cuando todos los artefactos están escritos;
+    # la API la toma con POST /admin/models/reload o con RECSYS_WATCH_MODELS=1
+    activate_version(MODEL_PATH, version)
+    print(f"Todos los modelos guardados en {save_path} (versión {version})")
 
 if __name__ == "__main__":
-    train_and_save_models()
+    parser = argparse.ArgumentParser(description="Entrena y guarda una nueva versión de los modelos.")
+    parser.add_argument("--input", help="CSV/Parquet local (o directorio) a leer por bloques, sin descargar de Kaggle")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Filas por bloque al leer --input")
+    parser.add_argument("--neighbors", type=int, default=DEFAULT_K, help="Vecinos guardados por usuario")
+    parser.add_argument("--neighbor-search", choices=["auto", "exact", "ann"], default="auto",
+                        help=f"Tabla de vecinos exacta o con el índice ANN (auto: ANN desde {ANN_MIN_USERS} usuarios)")
+    parser.add_argument("--ann-lists", type=int, default=None, help="Celdas del índice ANN (por defecto ~raíz de los usuarios)")
+    parser.add_argument("--ann-probe", type=int, default=None, help="Celdas recorridas por consulta ANN (recall vs latencia)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Pico de memoria por etapa con tracemalloc (infla los tiempos)")
+    args = parser.parse_args()
+    train_and_save_models(
+        n_neighbors=args.neighbors, input_path=args.input, chunksize=args.chunksize,
+        neighbor_search=args.neighbor_search, ann_lists=args.ann_lists, ann_probe=args.ann_probe,
+        trace_memory=args.trace_memory,
+    )
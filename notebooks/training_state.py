@@ -0,0 +1,104 @@
+"""
+Estado de entrenamiento guardado junto a cada versión de los modelos.
+
+Permite actualizar una versión con un lote nuevo de transacciones sin volver a
+leer el historial (ver update_models.py):
+
+- `user_item_counts`: sumas de cantidades usuario x producto (CSR float64),
+  alineadas con las filas y columnas del artefacto `user_item`. La matriz
+  binaria de la API se deriva de estas sumas (1 donde la suma es positiva).
+- `itemset_counts.pkl`: conteo absoluto de cada itemset frecuente de Apriori,
+  el número de canastas y los umbrales (soporte mínimo, lift mínimo, país),
+  más las canastas del último entrenamiento completo y las actualizaciones
+  incrementales aplicadas desde entonces (ver `retrain_reason`).
+"""
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from app.services.array_store import load_arrays, save_arrays
+
+COUNTS_ARTIFACT = "user_item_counts"
+ITEMSETS_ARTIFACT = "itemset_counts.pkl"
+# Límites por defecto de update_models.py antes de exigir un reentrenamiento completo
+MAX_UPDATES = 10
+MAX_GROWTH = 0.5
+
+
+def save_user_item_counts(directory, totals):
+    totals = sparse.csr_matrix(totals, dtype=np.float64)
+    totals.sort_indices()
+    save_arrays(
+        directory, COUNTS_ARTIFACT,
+        {"data": totals.data, "indices": totals.indices, "indptr": totals.indptr},
+        format="csr", shape=list(totals.shape),
+    )
+
+
+def load_user_item_counts(directory):
+    """Sumas usuario x producto de la versión, o None si se entrenó sin estado."""
+    loaded = load_arrays(directory, COUNTS_ARTIFACT, mmap=False)
+    if loaded is None:
+        return None
+    arrays, manifest = loaded
+    return sparse.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]), shape=tuple(manifest["shape"]))
+
+
+def save_itemset_counts(directory, frequent_itemsets, n_baskets, min_support, min_lift, country,
+                        full_baskets=None, updates=0):
+    """
+    Guarda los itemsets frecuentes (columnas 'itemsets' y 'support' de Apriori)
+    como conteos absolutos. `full_baskets` son las canastas del último
+    entrenamiento completo (por defecto `n_baskets`) y `updates` las
+    actualizaciones incrementales aplicadas desde entonces.
+    """
+    state = {
+        "itemsets": list(frequent_itemsets["itemsets"]),
+        "counts": np.rint(frequent_itemsets["support"].to_numpy() * n_baskets).astype(np.int64),
+        "n_baskets": int(n_baskets),
+        "min_support": float(min_support),
+        "min_lift": float(min_lift),
+        "country": country,
+        "full_baskets": int(n_baskets if full_baskets is None else full_baskets),
+        "updates": int(updates),
+    }
+    with open(os.path.join(directory, ITEMSETS_ARTIFACT), "wb") as f:
+        pickle.dump(state, f)
+
+
+def load_itemset_counts(directory):
+    path = os.path.join(directory, ITEMSETS_ARTIFACT)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def retrain_reason(state, max_updates=MAX_UPDATES, max_growth=MAX_GROWTH):
+    """
+    Motivo para reentrenar por completo en lugar de actualizar, o None.
+
+    Las actualizaciones no descubren itemsets nuevos ni vuelven a entrenar el
+    SVD ni el k-means del índice ANN, así que la calidad se degrada a medida
+    que se acumulan lotes: se exige un reentrenamiento tras `max_updates`
+    actualizaciones o cuando las canastas crecieron más de `max_growth` desde
+    el último entrenamiento completo.
+    """
+    updates = state.get("updates", 0)
+    full_baskets = state.get("full_baskets", state["n_baskets"])
+    if updates >= max_updates:
+        return f"{updates} actualizaciones incrementales desde el último entrenamiento completo (máximo {max_updates})"
+    if full_baskets and state["n_baskets"] > full_baskets * (1 + max_growth):
+        growth = state["n_baskets"] / full_baskets - 1
+        return f"las canastas crecieron {growth:.0%} desde el último entrenamiento completo (máximo {max_growth:.0%})"
+    return None
+
+
+def frequent_itemsets_frame(state):
+    """DataFrame de Apriori ('support', 'itemsets') con los itemsets que alcanzan el soporte mínimo."""
+    support = state["counts"] / state["n_baskets"] if state["n_baskets"] else np.zeros(len(state["counts"]))
+    frame = pd.DataFrame({"support": support, "itemsets": state["itemsets"]})
+    return frame[frame["support"] >= state["min_support"]].reset_index(drop=True)
@@ -0,0 +1,284 @@
+"""
+Actualización incremental de los modelos con un lote nuevo de transacciones.
+
+Parte de una versión existente (por defecto la CURRENT) y de su estado de
+entrenamiento (training_state.py), lee solo el lote nuevo y escribe una nueva
+versión:
+
+- Matriz usuario-item: se suman las cantidades del lote a las sumas guardadas;
+  usuarios y productos nuevos se agregan al final, así las filas existentes
+  siguen alineadas con la tabla de vecinos.
+- Vecinos: los factores latentes de los usuarios del lote (nuevos o con
+  compras nuevas) se recalculan por fold-in con los componentes SVD
+  guardados, se reasignan a la celda más cercana del índice ANN (sin volver
+  a entrenar k-means) y sus filas de la tabla de vecinos se recalculan con
+  ese índice (o con búsqueda exacta si la versión no tiene índice ANN). Las
+  filas de los demás usuarios se vuelven a puntuar solo contra los usuarios
+  del lote (merge_changed_neighbors: O(usuarios del lote x usuarios), no
+  todos los pares). Sin modelo SVD, los usuarios nuevos quedan sin vecinos
+  (-1 / NaN) y las demás filas sin cambios hasta el próximo reentrenamiento.
+- Similitud entre productos: solo cambia la de los productos comprados en el
+  lote; sus listas top-K se recalculan de forma exacta y se insertan en las
+  listas de los demás productos (que se recalculan solo si perdieron vecinos
+  y la cota de su lista anterior ya no alcanza). El costo depende de los
+  productos del lote y de sus compradores, no de todo el catálogo.
+- Reglas: se suman los conteos del lote a cada itemset frecuente guardado y
+  se recalculan soporte, confianza, lift, etc. con Apriori sobre los itemsets
+  (no sobre el historial).
+- Catálogo: se agregan los productos nuevos.
+
+Los cálculos (fold-in, vecinos, similitudes, conteos de itemsets) dependen del
+lote, pero la escritura no: cada actualización copia la matriz de sumas CSR al
+agregarle filas y columnas, copia la tabla de vecinos y escribe una versión
+completa con todos sus artefactos, así que también tiene un costo O(tamaño del
+modelo) en memoria y disco, aunque sin leer el historial ni reentrenar.
+
+Los itemsets que no eran frecuentes en el entrenamiento no se descubren aquí,
+ni se reentrenan el SVD ni el k-means del índice ANN: tras MAX_UPDATES
+actualizaciones, o si las canastas crecieron más de MAX_GROWTH desde el último
+entrenamiento completo, el script se niega a actualizar y pide ejecutar
+train_and_save.py (--force lo omite). Se asume que el lote trae facturas nuevas
+(una factura no se reparte entre lotes).
+
+Uso:
+    python notebooks/update_models.py --input nuevas_transacciones.csv
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from mlxtend.frequent_patterns import association_rules
+from scipy import sparse
+
+# Permite importar los módulos compartidos con la API (app.services)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app.services.ann import load_ivf_index
+from app.services.item_similarity import load_item_neighbors, update_item_neighbors
+from app.services.latent import load_latent_model, save_latent_model
+from app.services.model_store import MODEL_PATH, activate_version, create_version_dir, resolve_model_dir
+from app.services.neighbors import (
+    NeighborIndex, exact_neighbor_rows, load_neighbor_index, merge_changed_neighbors, standardize_rows,
+)
+from app.services.user_item import SparseUserItemMatrix, load_user_item_matrix, save_user_item_matrix
+from ingest import DEFAULT_CHUNKSIZE, binarize, ingest
+from train_and_save import StageTimer, write_report
+from training_state import (
+    MAX_GROWTH, MAX_UPDATES, frequent_itemsets_frame, load_itemset_counts, load_user_item_counts,
+    retrain_reason, save_itemset_counts, save_user_item_counts,
+)
+
+
+def _positions(existing, labels):
+    """Posición de cada etiqueta en `existing`; las nuevas se numeran a continuación."""
+    positions = pd.Index(existing).get_indexer(labels)
+    new = np.flatnonzero(positions < 0)
+    positions[new] = len(existing) + np.arange(len(new))
+    return positions, [labels[i] for i in new]
+
+
+def merge_user_item(user_item, totals, batch):
+    """Suma las cantidades del lote a `totals`; devuelve (totals, user_ids, stock_codes)."""
+    rows, new_users = _positions(user_item.user_ids, batch.row_labels)
+    cols, new_items = _positions(user_item.stock_codes, batch.item_labels)
+    user_ids = np.concatenate([user_item.user_ids, np.asarray(new_users, dtype=user_item.user_ids.dtype)])
+    stock_codes = np.concatenate([user_item.stock_codes, np.asarray(new_items, dtype=object)])
+    shape = (len(user_ids), len(stock_codes))
+
+    # Las filas y columnas del lote se llevan a los índices globales
+    chunk = batch.totals.tocoo()
+    chunk = sparse.csr_matrix((chunk.data, (rows[chunk.row], cols[chunk.col])), shape=shape)
+    totals = totals.tocsr().copy()
+    totals.resize(shape)
+    return (totals + chunk).tocsr(), user_ids, stock_codes
+
+
+def pad_neighbors(neighbor_index, n_users):
+    """Tabla de vecinos con filas vacías (-1 / NaN, como en el entrenamiento) para los usuarios nuevos."""
+    extra = n_users - neighbor_index.n_users
+    neighbors = np.vstack([
+        np.asarray(neighbor_index.neighbors),
+        np.full((extra, neighbor_index.k), -1, dtype=np.int32),
+    ])
+    similarities = np.vstack([
+        np.asarray(neighbor_index.similarities),
+        np.full((extra, neighbor_index.k), np.nan, dtype=np.float32),
+    ])
+    return NeighborIndex(neighbors, similarities)
+
+
+def refresh_neighbors(neighbor_index, z, rows, ann=None):
+    """
+    Recalcula en la tabla (ya con filas para todos los usuarios) los vecinos de
+    `rows` sobre los factores estandarizados `z`: con el índice ANN si lo hay,
+    si no por búsqueda exacta en bloques. Luego vuelve a puntuar las filas de
+    los demás usuarios contra `rows`.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    k = neighbor_index.k
+    if ann is None:
+        neighbor_index.neighbors[rows], neighbor_index.similarities[rows] = exact_neighbor_rows(z, rows, k)
+    else:
+        for row in rows:
+            ids, sims = ann.search(z, z[row], k, exclude=row)
+            neighbor_index.neighbors[row] = -1
+            neighbor_index.similarities[row] = np.nan
+            neighbor_index.neighbors[row, :len(ids)] = ids
+            neighbor_index.similarities[row, :len(ids)] = sims
+    return merge_changed_neighbors(neighbor_index, z, rows)
+
+
+def fold_in_factors(latent, user_item, rows):
+    """
+    Componentes (con columnas en cero para productos nuevos) y factores de
+    usuario con las filas `rows` recalculadas desde sus compras actuales.
+    """
+    components = np.zeros((latent.n_components, user_item.n_items), dtype=np.float32)
+    components[:, :latent.n_items] = latent.components
+    factors = np.zeros((user_item.n_users, latent.n_components), dtype=np.float32)
+    factors[:latent.n_users] = latent.user_factors
+    # Para una compra binaria x, el fold-in de TruncatedSVD es x @ components.T
+    factors[rows] = user_item.matrix[rows] @ components.T
+    return components, factors
+
+
+def count_itemsets(itemsets, basket, products):
+    """Canastas del lote (matriz binaria factura x producto) que contienen cada itemset."""
+    basket = basket.tocsc()
+    column = {product: i for i, product in enumerate(products)}
+    counts = np.zeros(len(itemsets), dtype=np.int64)
+    for i, itemset in enumerate(itemsets):
+        cols = [column.get(item) for item in itemset]
+        if any(c is None for c in cols):
+            continue
+        hits = np.asarray(basket[:, cols].sum(axis=1)).ravel()
+        counts[i] = int((hits == len(cols)).sum())
+    return counts
+
+
+def update_models(input_path, base_version=None, chunksize=DEFAULT_CHUNKSIZE, trace_memory=False,
+                  max_updates=MAX_UPDATES, max_growth=MAX_GROWTH, force=False):
+    print("Iniciando actualización incremental...")
+    base_version, base_path = resolve_model_dir(MODEL_PATH, base_version)
+    itemset_state = load_itemset_counts(base_path)
+    if itemset_state is None:
+        print(f"La versión {base_version} no tiene estado de entrenamiento; ejecute train_and_save.py primero.")
+        return
+    reason = retrain_reason(itemset_state, max_updates=max_updates, max_growth=max_growth)
+    if reason is not None:
+        if not force:
+            print(f"Se requiere un reentrenamiento completo: {reason}. Ejecute train_and_save.py (o use --force).")
+            return
+        print(f"⚠️  {reason}; se actualiza igualmente (--force).")
+
+    timer = StageTimer(trace_memory=trace_memory)
+
+    with timer.stage("load_base"):
+        user_item = load_user_item_matrix(base_path, mmap=False)
+        neighbor_index = load_neighbor_index(base_path, mmap=False)
+        totals = load_user_item_counts(base_path)
+        if totals is None:
+            # Versiones sin sumas guardadas: la matriz binaria es la mejor aproximación
+            print("⚠️  Sin user_item_counts en la versión base; se usan las compras binarias.")
+            totals = user_item.matrix.astype(np.float64)
+        product_catalog = pd.read_pickle(os.path.join(base_path, "product_catalog.pkl"))
+        latent = load_latent_model(base_path, mmap=False)
+        ann = load_ivf_index(base_path, mmap=False)
+        item_neighbors = load_item_neighbors(base_path, mmap=False)
+
+    print("Cargando lote nuevo...")
+    with timer.stage("load_batch"):
+        batch = ingest(input_path, chunksize=chunksize, country=itemset_state["country"])
+
+    with timer.stage("user_item_matrix"):
+        n_users = user_item.n_users
+        totals, user_ids, stock_codes = merge_user_item(user_item, totals, batch.user_item)
+        new_users = len(user_ids) - n_users
+        user_item = SparseUserItemMatrix(binarize(totals), user_ids, stock_codes)
+        neighbor_index = pad_neighbors(neighbor_index, user_item.n_users)
+        if latent is not None:
+            batch_rows = np.unique(user_item.rows_of(batch.user_item.row_labels))
+            components, user_factors = fold_in_factors(latent, user_item, batch_rows)
+            z = standardize_rows(user_factors)
+            if ann is not None:
+                ann = ann.reassign(z, batch_rows)
+
+    with timer.stage("neighbors"):
+        # Vecinos de los usuarios nuevos y de los que compraron en el lote, con sus factores recalculados
+        if latent is not None:
+            neighbor_index = refresh_neighbors(neighbor_index, z, batch_rows, ann)
+
+    with timer.stage("item_neighbors"):
+        if item_neighbors is not None:
+            # Solo cambian los cosenos de los productos comprados en el lote (incluidos los nuevos)
+            batch_cols = user_item.cols_of(batch.user_item.item_labels)
+            item_neighbors = update_item_neighbors(item_neighbors, user_item.purchased, batch_cols)
+
+    with timer.stage("rules"):
+        basket, invoices, products = batch.basket.binary()
+        itemset_state["counts"] = itemset_state["counts"] + count_itemsets(itemset_state["itemsets"], basket, products)
+        itemset_state["n_baskets"] += basket.shape[0]
+        rules = association_rules(
+            frequent_itemsets_frame(itemset_state), metric="lift", min_threshold=itemset_state["min_lift"]
+        )
+
+    with timer.stage("catalog"):
+        new_products = batch.product_catalog()
+        new_products = new_products[~new_products.index.isin(product_catalog.index)]
+        product_catalog = pd.concat([product_catalog, new_products])
+
+    version, save_path = create_version_dir(MODEL_PATH)
+    with timer.stage("save"):
+        rules.to_pickle(os.path.join(save_path, "association_rules.pkl"))
+        frequent = pd.DataFrame({
+            "support": itemset_state["counts"] / max(itemset_state["n_baskets"], 1),
+            "itemsets": itemset_state["itemsets"],
+        })
+        save_itemset_counts(
+            save_path, frequent, itemset_state["n_baskets"],
+            itemset_state["min_support"], itemset_state["min_lift"], itemset_state["country"],
+            full_baskets=itemset_state.get("full_baskets", itemset_state["n_baskets"] - basket.shape[0]),
+            updates=itemset_state.get("updates", 0) + 1,
+        )
+        save_user_item_matrix(user_item, save_path)
+        save_user_item_counts(save_path, totals)
+        neighbor_index.save(save_path)
+        if item_neighbors is not None:
+            item_neighbors.save(save_path)
+        if latent is not None:
+            save_latent_model(save_path, components, user_factors, z)
+            if ann is not None:
+                ann.save(save_path)
+        product_catalog.to_pickle(os.path.join(save_path, "product_catalog.pkl"))
+
+    timer.close()
+
+    report = write_report(
+        save_path, timer, mode="incremental", base_version=base_version,
+        batch_rows=batch.rows, new_users=new_users, new_products=len(new_products),
+        baskets=itemset_state["n_baskets"], rules=len(rules),
+    )
+    print(f"Actualización completa en {report['total_seconds']:.2f}s (pico {report['peak_bytes'] / 1e6:.1f} MB)")
+
+    activate_version(MODEL_PATH, version)
+    print(f"Nueva versión {version} guardada en {save_path} (base {base_version})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Actualiza los modelos con un lote nuevo de transacciones.")
+    parser.add_argument("--input", required=True, help="CSV/Parquet local (o directorio) con las transacciones nuevas")
+    parser.add_argument("--base-version", default=None, help="Versión a actualizar (por defecto la CURRENT)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Filas por bloque al leer --input")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Pico de memoria por etapa con tracemalloc (infla los tiempos)")
+    parser.add_argument("--max-updates", type=int, default=MAX_UPDATES,
+                        help="Actualizaciones seguidas permitidas antes de exigir un reentrenamiento completo")
+    parser.add_argument("--max-growth", type=float, default=MAX_GROWTH,
+                        help="Crecimiento de las canastas (fracción) permitido desde el último entrenamiento completo")
+    parser.add_argument("--force", action="store_true", help="Actualiza aunque se haya superado algún límite")
+    args = parser.parse_args()
+    update_models(
+        args.input, base_version=args.base_version, chunksize=args.chunksize, trace_memory=args.trace_memory,
+        max_updates=args.max_updates, max_growth=args.max_growth, force=args.force,
+    )
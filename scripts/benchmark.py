@@ -0,0 +1,267 @@
+"""
+Load-test and benchmark suite for the RecSys API.
+
+Runs end to end without a live server or kagglehub:
+1. generates a synthetic Online-Retail-shaped dataset (scripts/generate_synthetic_data.py)
+   at a preset or custom scale;
+2. trains a model version on it with notebooks/train_and_save.py (its
+   per-stage timings and peak memory come from training_report.json);
+3. loads the API in process (FastAPI TestClient) against that version and
+   fires requests at every endpoint under each concurrency level, recording
+   latency percentiles, throughput and errors.
+
+Everything lands in one JSON results file; `--compare` prints the change of
+each metric against an earlier run. The generated dataset and the trained
+models live in a temporary directory that is removed afterwards, unless
+`--keep` is given.
+
+    python scripts/benchmark.py --scale small
+    python scripts/benchmark.py --scale medium --concurrency 1,8,32 --output bench/medium.json --compare bench/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+# ─── Paths ────────────────────────────────────────────────────
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+from generate_synthetic_data import generate, write
+
+# ─── Scales ───────────────────────────────────────────────────
+SCALES = {
+    "small": {"users": 2000, "skus": 500, "invoices": 10000},
+    "medium": {"users": 20000, "skus": 3000, "invoices": 100000},
+    "large": {"users": 200000, "skus": 10000, "invoices": 1000000},
+}
+DEFAULT_CONCURRENCY = "1,8,32"
+DEFAULT_REQUESTS = 200
+PERCENTILES = (50, 90, 95, 99)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def train(data_path: str, models_dir: str, env: dict) -> dict:
+    """Train a version on `data_path` into `models_dir` and return its training report."""
+    print(f"🏋️  Training on {data_path}...")
+    subprocess.run(
+        [sys.executable, os.path.join(BASE_DIR, "notebooks", "train_and_save.py"), "--input", data_path],
+        cwd=BASE_DIR, env=env, check=True, stdout=subprocess.DEVNULL,
+    )
+    with open(os.path.join(models_dir, "CURRENT")) as f:
+        version = f.read().strip()
+    with open(os.path.join(models_dir, version, "training_report.json")) as f:
+        return {"version": version, **json.load(f)}
+
+
+# ─── Request mix ──────────────────────────────────────────────
+def build_requests(models, rng, n: int) -> dict:
+    """{endpoint name: [(method, url, json body), ...]} with `n` requests each, drawn from the model's own ids."""
+    user_ids = np.asarray(models.user_item_matrix.user_ids)
+    codes = [str(c) for c in models.user_item_matrix.stock_codes]
+    # A model without rules has an empty rule vocabulary: fall back to the product codes
+    cart_vocabulary = [str(i) for i in models.rule_index.items] if models.rule_index is not None else []
+    cart_vocabulary = cart_vocabulary or codes
+
+    def users(size=None):
+        return rng.choice(user_ids, size=size).tolist()
+
+    def items(size=None):
+        return rng.choice(codes, size=size).tolist()
+
+    names = models.item_names.lookup(np.arange(min(len(codes), 50)), "en")
+    words = [name.split()[0].lower() for name in names if name.split()] or ["heart"]
+    mix = {
+        "GET /recommend/user/{id}": lambda: ("GET", f"/recommend/user/{users()}?top_n=5", None),
+        "GET /recommend/user/{id}?fold_in": lambda: ("GET", f"/recommend/user/{users()}?top_n=5&fold_in=true", None),
+        "POST /recommend/users/batch": lambda: ("POST", "/recommend/users/batch", {"user_ids": users(50), "top_n": 5}),
+        "POST /recommend/fold-in": lambda: ("POST", "/recommend/fold-in", {"items": items(5), "top_n": 5}),
+        "GET /recommend/item/{code}": lambda: ("GET", f"/recommend/item/{items()}?top_n=5", None),
+        "POST /recommend/similar-items": lambda: ("POST", "/recommend/similar-items", {"items": items(5), "top_n": 5}),
+        "POST /recommend/association": lambda: (
+            "POST", "/recommend/association", {"cart_items": rng.choice(cart_vocabulary, size=3).tolist(), "top_n": 3},
+        ),
+        "GET /dashboard/stats": lambda: ("GET", "/dashboard/stats", None),
+        "GET /dashboard/top-products": lambda: ("GET", "/dashboard/top-products?limit=10", None),
+        "GET /dashboard/products?search": lambda: ("GET", f"/dashboard/products?page=1&page_size=20&search={rng.choice(words)}", None),
+        "GET /dashboard/product-search": lambda: ("GET", f"/dashboard/product-search?q={rng.choice(words)[:3]}&limit=10", None),
+        "GET /dashboard/rules": lambda: ("GET", f"/dashboard/rules?page={rng.integers(1, 4)}&page_size=20&min_confidence=0.1", None),
+        "GET /dashboard/user/{id}": lambda: ("GET", f"/dashboard/user/{users()}", None),
+        "GET /dashboard/users": lambda: ("GET", f"/dashboard/users?page={rng.integers(1, 50)}&page_size=20", None),
+        "GET /dashboard/user-search": lambda: ("GET", f"/dashboard/user-search?q={str(users())[:3]}&limit=10", None),
+        "GET /dashboard/cart-items": lambda: ("GET", "/dashboard/cart-items", None),
+    }
+    return {name: [make() for _ in range(n)] for name, make in mix.items()}
+
+
+def summarize(latencies, errors: int, wall: float) -> dict:
+    ms = np.asarray(latencies) * 1000
+    stats = {f"p{p}_ms": round(float(np.percentile(ms, p)), 3) for p in PERCENTILES}
+    stats.update({
+        "mean_ms": round(float(ms.mean()), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "throughput_rps": round(len(ms) / wall, 1),
+        "requests": len(ms),
+        "errors": errors,
+    })
+    return stats
+
+
+def run_load(client, requests_, concurrency: int) -> dict:
+    """Send `requests_` with `concurrency` client threads; per-request latency and overall throughput."""
+    def send(request):
+        method, url, body = request
+        start = time.perf_counter()
+        response = client.request(method, url, json=body)
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, requests_))
+    wall = time.perf_counter() - start
+    errors = sum(1 for _, status in results if status >= 400)
+    return summarize([latency for latency, _ in results], errors, wall)
+
+
+def benchmark_api(models_dir: str, levels, n_requests: int, seed: int) -> dict:
+    # The API reads its settings at import time: point it at the benchmark models first
+    os.environ["RECSYS_MODEL_PATH"] = models_dir
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services.model_store import get_models
+
+    results = {}
+    with TestClient(app) as client:
+        models = get_models()
+        requests_ = build_requests(models, np.random.default_rng(seed), n_requests)
+        load = models.info()
+        for name, batch in requests_.items():
+            # One warm-up request (lazy indexes, first-call overhead)
+            method, url, body = batch[0]
+            client.request(method, url, json=body)
+            results[name] = {}
+            for level in levels:
+                stats = run_load(client, batch, level)
+                results[name][str(level)] = stats
+                print(f"   {name:<40} c={level:<3} p50 {stats['p50_ms']:>8.2f} ms  p99 {stats['p99_ms']:>8.2f} ms  "
+                      f"{stats['throughput_rps']:>8.1f} req/s  errors {stats['errors']}")
+    return {"model_load": load, "endpoints": results}
+
+
+# ─── Comparison ───────────────────────────────────────────────
+def compare(current: dict, baseline: dict):
+    """Print the relative change of latency and throughput per endpoint and concurrency."""
+    print(f"\n📊 Compared with {baseline.get('meta', {}).get('timestamp')} ({baseline.get('meta', {}).get('git_commit')}):")
+    for stage, stats in current.get("training", {}).get("stages", {}).items():
+        before = baseline.get("training", {}).get("stages", {}).get(stage)
+        if before and before["seconds"]:
+            print(f"   training {stage:<22} {stats['seconds']:>8.2f}s ({(stats['seconds'] / before['seconds'] - 1):+.0%})")
+    for name, levels in current["endpoints"].items():
+        for level, stats in levels.items():
+            before = baseline.get("endpoints", {}).get(name, {}).get(level)
+            if not before:
+                continue
+            p50 = stats["p50_ms"] / before["p50_ms"] - 1 if before["p50_ms"] else 0.0
+            p99 = stats["p99_ms"] / before["p99_ms"] - 1 if before["p99_ms"] else 0.0
+            rps = stats["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+            print(f"   {name:<40} c={level:<3} p50 {p50:+6.0%}  p99 {p99:+6.0%}  throughput {rps:+6.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark training and the API on a synthetic dataset.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="Dataset size preset")
+    parser.add_argument("--users", type=int, help="Override the preset's customers")
+    parser.add_argument("--skus", type=int, help="Override the preset's stock codes")
+    parser.add_argument("--invoices", type=int, help="Override the preset's invoices")
+    parser.add_argument("--basket-size", type=float, default=8.0, help="Mean lines per invoice")
+    parser.add_argument("--data", help="Use this CSV/Parquet (or directory) instead of generating one")
+    parser.add_argument("--models-dir", help="Models root to train into / serve from (default: a temporary directory)")
+    parser.add_argument("--skip-train", action="store_true", help="Serve the CURRENT version of --models-dir as is")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help="Comma-separated client thread counts")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--cache", action="store_true", help="Keep the response cache on (off by default to measure scoring)")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary dataset and models directory")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.json", help="Results JSON path")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    if args.skip_train and not args.models_dir:
+        parser.error("--skip-train needs --models-dir")
+    os.environ["RECSYS_CACHE"] = "1" if args.cache else "0"
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    scale = {**SCALES[args.scale], **{k: v for k, v in (("users", args.users), ("skus", args.skus), ("invoices", args.invoices)) if v}}
+
+    workdir = tempfile.mkdtemp(prefix="recsys-bench-")
+    try:
+        models_dir = os.path.abspath(args.models_dir or os.path.join(workdir, "models"))
+        results = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "git_commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "concurrency": levels,
+                "requests_per_level": args.requests,
+                "response_cache": args.cache,
+            },
+        }
+
+        # ─── Dataset ──────────────────────────────────────────────
+        data_path = args.data
+        if data_path is None and not args.skip_train:
+            print(f"🧪 Generating {args.scale} dataset: {scale}...")
+            start = time.perf_counter()
+            df = generate(n_users=scale["users"], n_skus=scale["skus"], n_invoices=scale["invoices"],
+                          mean_basket=args.basket_size, seed=args.seed)
+            data_path = os.path.join(workdir, "data", "OnlineRetail.csv")
+            write(df, data_path)
+            results["dataset"] = {**scale, "basket_size": args.basket_size, "rows": len(df),
+                                  "generate_seconds": round(time.perf_counter() - start, 4)}
+        elif data_path is not None:
+            results["dataset"] = {"path": os.path.abspath(data_path)}
+
+        # ─── Training ─────────────────────────────────────────────
+        if not args.skip_train:
+            os.makedirs(models_dir, exist_ok=True)
+            results["training"] = train(data_path, models_dir, {**os.environ, "RECSYS_MODEL_PATH": models_dir})
+            print(f"   ✅ {results['training']['total_seconds']:.2f}s, peak {results['training']['peak_bytes'] / 1e6:.1f} MB")
+
+        # ─── API ──────────────────────────────────────────────────
+        print(f"🚀 Benchmarking the API ({args.requests} requests per endpoint, concurrency {levels})...")
+        results.update(benchmark_api(models_dir, levels, args.requests, args.seed))
+    finally:
+        # --data and --models-dir point at the caller's own files; only the scratch directory is removed
+        if args.keep:
+            print(f"📁 Dataset and models kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Generate a synthetic dataset shaped like the UCI Online Retail file.
+
+Same columns as the Kaggle CSV (InvoiceNo, StockCode, Description, Quantity,
+InvoiceDate, UnitPrice, CustomerID, Country), including the quirks the
+training pipeline cleans up: cancelled invoices ("C" prefix), rows without
+CustomerID, alphanumeric stock codes and trailing spaces in descriptions.
+There is enough structure for both models to learn something:
+- customers belong to taste segments that favour their own slice of the
+  catalog, on top of a long-tail (Zipf) global popularity;
+- a few fixed product bundles are added to a share of the invoices; by default
+  each bundle lands in 1.5x the training support threshold of them, so Apriori
+  turns every bundle into association rules.
+
+Runs fully offline, so training and benchmarks do not need kagglehub:
+
+    python scripts/generate_synthetic_data.py --users 20000 --skus 3000 --invoices 100000 --output data/synthetic.csv
+    python notebooks/train_and_save.py --input data/synthetic.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# ─── Defaults ─────────────────────────────────────────────────
+DEFAULT_USERS = 5000
+DEFAULT_SKUS = 1000
+DEFAULT_INVOICES = 25000
+DEFAULT_BASKET = 8.0
+DEFAULT_BUNDLES = 5
+TRAINING_MIN_SUPPORT = 0.07  # MIN_SUPPORT in notebooks/train_and_save.py
+BUNDLE_SUPPORT = 1.5 * TRAINING_MIN_SUPPORT  # Default share of invoices per bundle
+COUNTRY = "France"  # The country the training script keeps
+OTHER_COUNTRIES = ["United Kingdom", "Germany", "Spain", "Netherlands"]
+
+COLORS = ["RED", "BLUE", "PINK", "WHITE", "GREEN", "IVORY", "BLACK", "VINTAGE"]
+NOUNS = ["HEART", "LANTERN", "MUG", "BUNTING", "TEA SET", "CAKE STAND", "LUNCH BAG", "DOORMAT", "CANDLE", "FRAME"]
+
+
+def _catalog(n_skus: int, rng):
+    """Stock codes (some with a letter suffix), descriptions and unit prices."""
+    codes = np.array([
+        f"{20000 + i}{'ABCDE'[i % 5]}" if i % 7 == 0 else str(20000 + i) for i in range(n_skus)
+    ], dtype=object)
+    descriptions = np.array([
+        f"{COLORS[i % len(COLORS)]} {NOUNS[(i // len(COLORS)) % len(NOUNS)]} {i}" for i in range(n_skus)
+    ], dtype=object)
+    prices = np.round(rng.lognormal(mean=1.0, sigma=0.7, size=n_skus), 2)
+    return codes, descriptions, prices
+
+
+def generate(
+    n_users: int = DEFAULT_USERS,
+    n_skus: int = DEFAULT_SKUS,
+    n_invoices: int = DEFAULT_INVOICES,
+    mean_basket: float = DEFAULT_BASKET,
+    n_segments: int = 20,
+    segment_share: float = 0.6,
+    n_bundles: int = DEFAULT_BUNDLES,
+    bundle_rate: float = None,
+    country_share: float = 1.0,
+    cancel_rate: float = 0.02,
+    missing_customer_rate: float = 0.05,
+    seed: int = 42,
+) -> pd.DataFrame:
+    """
+    One row per invoice line, fully vectorized (no per-row Python loop).
+
+    `bundle_rate` is the share of invoices that get a bundle; by default
+    `n_bundles * BUNDLE_SUPPORT` (capped at 1), so each bundle clears the
+    training support threshold.
+    """
+    if bundle_rate is None:
+        bundle_rate = min(1.0, n_bundles * BUNDLE_SUPPORT)
+    rng = np.random.default_rng(seed)
+    codes, descriptions, prices = _catalog(n_skus, rng)
+
+    # Long-tail global popularity over a shuffled catalog
+    popularity = 1.0 / np.arange(1, n_skus + 1) ** 1.1
+    popularity = popularity[rng.permutation(n_skus)]
+    popularity /= popularity.sum()
+
+    # Customers: uneven activity and one taste segment each; a segment favours a
+    # contiguous slice of a shuffled catalog
+    activity = rng.lognormal(sigma=1.0, size=n_users)
+    invoice_user = rng.choice(n_users, size=n_invoices, p=activity / activity.sum())
+    segment_of_user = rng.integers(n_segments, size=n_users)
+    segment_items = np.array_split(rng.permutation(n_skus), n_segments)
+    segment_offsets = np.concatenate([[0], np.cumsum([len(s) for s in segment_items])])
+    segment_items = np.concatenate(segment_items)
+
+    # Invoice lines: basket sizes, then each line from the segment slice or global popularity
+    sizes = 1 + rng.poisson(max(mean_basket - 1, 0), size=n_invoices)
+    line_invoice = np.repeat(np.arange(n_invoices), sizes)
+    segment = segment_of_user[invoice_user[line_invoice]]
+    start, end = segment_offsets[segment], segment_offsets[segment + 1]
+    from_segment = segment_items[start + (rng.random(len(line_invoice)) * (end - start)).astype(np.int64)]
+    from_popularity = rng.choice(n_skus, size=len(line_invoice), p=popularity)
+    line_item = np.where(rng.random(len(line_invoice)) < segment_share, from_segment, from_popularity)
+
+    # Bundles bought together (three products each) for the association rules
+    bundles = rng.choice(n_skus, size=(n_bundles, 3), replace=False) if n_bundles * 3 <= n_skus else np.empty((0, 3), int)
+    if len(bundles):
+        with_bundle = np.flatnonzero(rng.random(n_invoices) < bundle_rate)
+        bundle = bundles[rng.integers(len(bundles), size=len(with_bundle))]
+        line_invoice = np.concatenate([line_invoice, np.repeat(with_bundle, 3)])
+        line_item = np.concatenate([line_item, bundle.ravel()])
+        # Bundle lines go with the rest of their invoice
+        order = np.argsort(line_invoice, kind="stable")
+        line_invoice, line_item = line_invoice[order], line_item[order]
+
+    invoice_no = (536365 + np.arange(n_invoices)).astype(str).astype(object)
+    cancelled = rng.random(n_invoices) < cancel_rate
+    invoice_no[cancelled] = "C" + invoice_no[cancelled]
+    country = np.where(
+        rng.random(n_invoices) < country_share, COUNTRY,
+        np.array(OTHER_COUNTRIES, dtype=object)[rng.integers(len(OTHER_COUNTRIES), size=n_invoices)],
+    )
+    customer = (12346 + invoice_user).astype(np.float64)
+    customer[rng.random(n_invoices) < missing_customer_rate] = np.nan
+    minutes = np.sort(rng.integers(0, 365 * 24 * 60, size=n_invoices))
+    dates = (pd.Timestamp("2010-12-01") + pd.to_timedelta(minutes, unit="min")).strftime("%m/%d/%Y %H:%M").to_numpy()
+
+    quantity = rng.geometric(0.35, size=len(line_invoice))
+    quantity[cancelled[line_invoice]] *= -1
+    return pd.DataFrame({
+        "InvoiceNo": invoice_no[line_invoice],
+        "StockCode": codes[line_item],
+        "Description": descriptions[line_item] + " ",
+        "Quantity": quantity,
+        "InvoiceDate": dates[line_invoice],
+        "UnitPrice": prices[line_item],
+        "CustomerID": customer[line_invoice],
+        "Country": country[line_invoice],
+    })
+
+
+def write(df: pd.DataFrame, output: str):
+    """CSV, or Parquet for a `.parquet` path (needs pyarrow)."""
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    if output.endswith(".parquet"):
+        df.to_parquet(output, index=False)
+    else:
+        df.to_csv(output, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Online-Retail-shaped dataset.")
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS, help="Distinct customers")
+    parser.add_argument("--skus", type=int, default=DEFAULT_SKUS, help="Distinct stock codes")
+    parser.add_argument("--invoices", type=int, default=DEFAULT_INVOICES, help="Invoices (baskets)")
+    parser.add_argument("--basket-size", type=float, default=DEFAULT_BASKET, help="Mean lines per invoice")
+    parser.add_argument("--segments", type=int, default=20, help="Customer taste segments")
+    parser.add_argument("--bundles", type=int, default=DEFAULT_BUNDLES, help="Product bundles bought together")
+    parser.add_argument("--bundle-rate", type=float, default=None,
+                        help=f"Share of invoices with a bundle (default: {BUNDLE_SUPPORT:.3f} per bundle)")
+    parser.add_argument("--country-share", type=float, default=1.0, help=f"Share of invoices from {COUNTRY}")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="data/synthetic/OnlineRetail.csv", help="Output .csv or .parquet path")
+    args = parser.parse_args()
+
+    print(f"🧪 Generating {args.invoices} invoices for {args.users} customers and {args.skus} products...")
+    df = generate(
+        n_users=args.users, n_skus=args.skus, n_invoices=args.invoices, mean_basket=args.basket_size,
+        n_segments=args.segments, n_bundles=args.bundles, bundle_rate=args.bundle_rate,
+        country_share=args.country_share, seed=args.seed,
+    )
+    write(df, args.output)
+    print(f"✅ {len(df)} rows written to {args.output}")
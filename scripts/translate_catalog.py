@@ -12,8 +12,13 @@ from deep_translator import GoogleTranslator
 
 # ─── Paths ────────────────────────────────────────────────────
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-MODEL_PATH = os.path.join(BASE_DIR, "app", "services", "models")
-CATALOG_PATH = os.path.join(MODEL_PATH, "product_catalog.pkl")
+sys.path.insert(0, BASE_DIR)
+from app.services.model_store import MODEL_PATH, resolve_model_dir
+
+# The catalog comes from the CURRENT model version; translations live in the
+# models root and are shared by every version.
+_, VERSION_PATH = resolve_model_dir(MODEL_PATH)
+CATALOG_PATH = os.path.join(VERSION_PATH, "product_catalog.pkl")
 TRANSLATION_PATH = os.path.join(MODEL_PATH, "product_translations.pkl")
 
 # ─── Load catalog ─────────────────────────────────────────────
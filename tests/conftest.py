@@ -0,0 +1,53 @@
+"""
+Shared test setup.
+
+The API reads its settings at import time, so they are pointed at an empty
+model directory (and the response cache turned off) before `app` is imported.
+Tests that need models train a small version on a deterministic synthetic
+dataset into that directory (`trained_models`).
+"""
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("RECSYS_MODEL_PATH", tempfile.mkdtemp(prefix="recsys-test-models-"))
+os.environ.setdefault("RECSYS_CACHE", "0")
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Training scripts and the synthetic data generator import their siblings directly
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "notebooks"))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+# Small enough to train in about a second, with association rules and a few users per segment
+SYNTHETIC = {"n_users": 300, "n_skus": 120, "n_invoices": 2000, "n_segments": 6, "seed": 7}
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def transactions_csv(tmp_path_factory):
+    from generate_synthetic_data import generate, write
+
+    path = str(tmp_path_factory.mktemp("data") / "transactions.csv")
+    write(generate(**SYNTHETIC), path)
+    return path
+
+
+@pytest.fixture(scope="session")
+def trained_models(client, transactions_csv):
+    """The bundle served by the API after training a version on `transactions_csv`."""
+    from app.services.model_store import get_models, reload_models
+    from train_and_save import train_and_save_models
+
+    train_and_save_models(input_path=transactions_csv)
+    reload_models(background=False)
+    return get_models()
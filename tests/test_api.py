@@ -0,0 +1,75 @@
+"""
+Request validation and routing of the recommendation endpoints.
+
+A top_n below 1 is rejected with 422 before any model is read, so those tests
+need no trained artifacts; the batch route is compared with the single-user
+route on the trained test model.
+"""
+import pytest
+
+
+@pytest.mark.parametrize("top_n", [0, -1])
+@pytest.mark.parametrize("url", ["/recommend/user/12345", "/recommend/item/85123A"])
+def test_get_routes_reject_top_n_below_one(client, url, top_n):
+    response = client.get(url, params={"top_n": top_n})
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("top_n", [0, -1])
+@pytest.mark.parametrize("url, body", [
+    ("/recommend/users/batch", {"user_ids": [12345]}),
+    ("/recommend/fold-in", {"items": ["85123A"]}),
+    ("/recommend/similar-items", {"items": ["85123A"]}),
+    ("/recommend/association", {"cart_items": ["WHITE HANGING HEART T-LIGHT HOLDER"]}),
+])
+def test_request_bodies_reject_top_n_below_one(client, url, body, top_n):
+    response = client.post(url, json={**body, "top_n": top_n})
+    assert response.status_code == 422
+
+
+def test_materialized_lookup_clamps_top_n():
+    import numpy as np
+    from app.services.materialized import MaterializedRecommendations
+
+    lists = MaterializedRecommendations([1], [[3, 1, -1]], [[0.9, 0.5, np.nan]])
+    assert lists.lookup(0, -1)[0].tolist() == []
+    assert lists.lookup(0, 2)[0].tolist() == [3, 1]
+    assert lists.lookup(0, 10)[0].tolist() == [3, 1]
+    [(cols, scores)] = lists.lookup_rows([0], 10)
+    assert cols.tolist() == [3, 1] and scores.tolist() == pytest.approx([0.9, 0.5])
+
+
+@pytest.mark.parametrize("params", [{}, {"weighted": True}, {"fold_in": True}, {"fold_in": True, "weighted": True, "n_probe": 1}])
+def test_batch_route_matches_single_user_route(client, trained_models, params):
+    user_ids = [int(uid) for uid in trained_models.user_item_matrix.user_ids[::9]]
+    response = client.post("/recommend/users/batch", json={"user_ids": user_ids + [-1], "top_n": 5, **params})
+    assert response.status_code == 200
+    body = response.json()
+    assert [error["user_id"] for error in body["errors"]] == [-1]
+    assert [result["user_id"] for result in body["results"]] == user_ids
+    for result in body["results"]:
+        single = client.get(f"/recommend/user/{result['user_id']}", params={"top_n": 5, **params})
+        assert single.status_code == 200
+        assert result["recommendations"] == single.json()
+
+
+@pytest.mark.parametrize("lang", ["en", "fr"])
+def test_catalog_search_falls_back_to_english_descriptions(client, trained_models, lang):
+    word = trained_models.search_index.descriptions["en"][0].split()[0].lower()
+    response = client.get("/dashboard/products", params={"search": word, "lang": lang})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total"] > 0
+    assert all(word in item["Description"].lower() for item in body["items"])
+
+
+def test_product_autocomplete_ignores_queries_that_normalize_to_nothing(client, trained_models):
+    # A lone combining accent normalizes to "", which would prefix-match every product
+    response = client.get("/dashboard/product-search", params={"q": "́"})
+    assert response.status_code == 200 and response.json() == []
+    assert trained_models.search_index.fields["en"].prefix("").size == 0
+
+
+def test_cart_items_footprint_counts_payload_bytes(trained_models):
+    payloads = trained_models.cart_items.values()
+    assert trained_models.memory["cart_items"] >= sum(len(body) + len(etag) for body, etag in payloads)
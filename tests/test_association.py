@@ -0,0 +1,59 @@
+"""
+RuleIndex cart matching against a scan of the rule table.
+
+`any` fires the rules sharing at least one antecedent with the cart (the
+original DataFrame filter) and `subset` those whose antecedents are all in
+the cart; both in (confidence, lift) order.
+"""
+import pandas as pd
+import pytest
+
+from app.services.association import MATCH_ANY, MATCH_SUBSET, RuleIndex
+
+
+@pytest.fixture
+def rules():
+    return pd.DataFrame({
+        "antecedents": [frozenset({"A"}), frozenset({"A", "B"}), frozenset({"C"}), frozenset({"B", "D"}), frozenset({"E"})],
+        "consequents": [frozenset({"X"}), frozenset({"Y"}), frozenset({"A"}), frozenset({"X", "Z"}), frozenset({"W"})],
+        "support": [0.1, 0.1, 0.1, 0.1, 0.1],
+        "confidence": [0.5, 0.9, 0.7, 0.9, 0.2],
+        "lift": [1.5, 2.0, 1.1, 3.0, 1.0],
+    })
+
+
+def scan(rules, cart, mode):
+    """Rule ids the cart fires, best first, by filtering and sorting the whole table."""
+    cart = set(cart)
+    if mode == MATCH_SUBSET:
+        fired = rules["antecedents"].apply(lambda a: a <= cart)
+    else:
+        fired = rules["antecedents"].apply(lambda a: bool(a & cart))
+    return rules[fired].sort_values(["confidence", "lift"], ascending=False, kind="stable").index.tolist()
+
+
+@pytest.mark.parametrize("cart", [["A"], ["A", "B"], ["B"], ["B", "D", "C"], ["Q"], []])
+@pytest.mark.parametrize("mode", [MATCH_ANY, MATCH_SUBSET])
+def test_matching_ranks_equal_table_scan(rules, cart, mode):
+    index = RuleIndex(rules)
+    assert index.rule_ids[index.matching_ranks(cart, mode)].tolist() == scan(rules, cart, mode)
+
+
+def test_recommend_skips_cart_and_repeated_products(rules):
+    index = RuleIndex(rules)
+    # Rules 1 (A, B -> Y), 2 (C -> A, already in the cart) and 0 (A -> X), by confidence
+    assert index.recommend(["A", "B", "C"], top_n=10, mode=MATCH_SUBSET) == [("Y", 0.9), ("X", 0.5)]
+    assert index.recommend(["C"], top_n=10) == [("A", 0.7)]
+    # Rules 3 (B, D -> X, Z) then 1 and 0; X is recommended once, with the best rule's confidence
+    recommended = index.recommend(["A", "B", "D"], top_n=10)
+    assert {product for product, _ in recommended[:2]} == {"X", "Z"}
+    assert recommended[2:] == [("Y", 0.9)]
+    assert len(index.recommend(["A", "B", "D"], top_n=2)) == 2
+
+
+@pytest.mark.parametrize("mode", [MATCH_ANY, MATCH_SUBSET])
+def test_trained_rules_match_table_scan(trained_models, mode):
+    rules, index = trained_models.rules, trained_models.rule_index
+    items = index.items
+    for cart in ([items[0]], items[:2], items[::3], items[1::2]):
+        assert index.rule_ids[index.matching_ranks(cart, mode)].tolist() == scan(rules, cart, mode)
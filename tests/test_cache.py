@@ -0,0 +1,82 @@
+"""
+Response cache: hits, ETag / 304 revalidation and invalidation on reload.
+
+The middleware wraps a one-route app whose handler counts its calls, and the
+serving bundle is replaced by a stub whose version or load time changes like
+a reload would.
+"""
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import cache
+from app.core.cache import ResponseCache, ResponseCacheMiddleware
+
+
+@pytest.fixture
+def bundle(monkeypatch):
+    bundle = SimpleNamespace(version="v1", loaded_at=1.0)
+    monkeypatch.setattr(cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(cache, "get_models", lambda: bundle)
+    return bundle
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def client(bundle, calls):
+    app = FastAPI()
+
+    @app.get("/dashboard/stats")
+    def stats(page: int = 1):
+        calls.append(page)
+        return {"version": bundle.version, "page": page}
+
+    app.add_middleware(ResponseCacheMiddleware, cache=ResponseCache(max_entries=16, max_bytes=1 << 20, ttl=60))
+    return TestClient(app)
+
+
+def test_second_request_is_served_from_cache(client, calls):
+    first = client.get("/dashboard/stats?page=2")
+    second = client.get("/dashboard/stats", params={"page": 2})
+    assert first.headers["x-cache"] == "MISS" and second.headers["x-cache"] == "HIT"
+    assert second.json() == first.json() and second.headers["etag"] == first.headers["etag"]
+    assert calls == [2]
+
+
+def test_matching_etag_gets_304_without_body(client, calls):
+    etag = client.get("/dashboard/stats").headers["etag"]
+    for headers in ({"If-None-Match": etag}, {"If-None-Match": f'"other", W/{etag}'}):
+        response = client.get("/dashboard/stats", headers=headers)
+        assert response.status_code == 304 and response.content == b""
+        assert response.headers["etag"] == etag
+    assert client.get("/dashboard/stats", headers={"If-None-Match": '"other"'}).status_code == 200
+    assert calls == [1]
+
+
+@pytest.mark.parametrize("reload", [
+    lambda bundle: setattr(bundle, "version", "v2"),
+    # Reloading the same version also counts as a change
+    lambda bundle: setattr(bundle, "loaded_at", 2.0),
+])
+def test_reload_invalidates_cached_responses(client, bundle, calls, reload):
+    client.get("/dashboard/stats")
+    reload(bundle)
+    response = client.get("/dashboard/stats")
+    assert response.headers["x-cache"] == "MISS"
+    assert response.json()["version"] == bundle.version
+    assert client.get("/dashboard/stats").headers["x-cache"] == "HIT"
+    assert calls == [1, 1]
+
+
+def test_etag_of_a_replaced_version_no_longer_matches(client, bundle):
+    etag = client.get("/dashboard/stats").headers["etag"]
+    bundle.version = "v2"
+    response = client.get("/dashboard/stats", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.json()["version"] == "v2"
+    assert response.headers["etag"] != etag
@@ -0,0 +1,63 @@
+"""
+Vectorized collaborative-filtering scoring against the original per-user loop.
+
+The loop counted, over the user's top neighbors, the products each neighbor
+bought that the user had not; `score_users` must give the same counts, ranked
+by count with ties broken by column. Batched scoring, including fold-in, must
+equal scoring each user on its own.
+"""
+from collections import Counter
+
+import numpy as np
+
+from app.services.collaborative import score_fold_in, score_fold_in_rows, score_users
+
+
+def baseline_scores(user_item, neighbor_index, row, n_neighbors=5):
+    """The pre-vectorization loop of /recommend/user/{id}, as {column: count}."""
+    similar_rows, _ = neighbor_index.neighbors_of(row, n_neighbors)
+    user_cols, user_values = user_item.row_items(row)
+    already_bought = set(user_cols[user_values > 0].tolist())
+    recommended = []
+    for similar_row in similar_rows:
+        cols, values = user_item.row_items(similar_row)
+        recommended.extend(c for c in cols[values > 0].tolist() if c not in already_bought)
+    return Counter(recommended)
+
+
+def test_score_users_matches_baseline_loop(trained_models):
+    user_item, neighbor_index = trained_models.user_item_matrix, trained_models.neighbor_index
+    rows = np.arange(user_item.n_users)
+    for row, (cols, scores) in zip(rows, score_users(user_item, neighbor_index, rows, top_n=10)):
+        counts = baseline_scores(user_item, neighbor_index, row)
+        expected = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:10]
+        assert list(zip(cols.tolist(), scores.tolist())) == [(c, float(n)) for c, n in expected]
+
+
+def test_score_users_is_independent_of_batching(trained_models):
+    user_item, neighbor_index = trained_models.user_item_matrix, trained_models.neighbor_index
+    rows = np.arange(0, user_item.n_users, 7)
+    together = score_users(user_item, neighbor_index, rows, top_n=5, weighted=True)
+    for row, (cols, scores) in zip(rows, together):
+        [(single_cols, single_scores)] = score_users(user_item, neighbor_index, [row], top_n=5, weighted=True)
+        assert cols.tolist() == single_cols.tolist()
+        np.testing.assert_allclose(scores, single_scores)
+
+
+def test_batched_fold_in_equals_single_queries(trained_models):
+    user_item, latent = trained_models.user_item_matrix, trained_models.latent
+    rows = np.arange(0, user_item.n_users, 5)
+    bought = user_item.purchased[rows]
+    factors = latent.project_rows(bought)
+    # Exact search (no ANN index), excluding each user from their own neighbors
+    neighbors = latent.nearest_rows(factors, 5, exclude=rows, block_size=4)
+    together = score_fold_in_rows(user_item, neighbors, bought, top_n=5, weighted=True)
+    for row, factor, (neighbor_rows, sims), (cols, scores) in zip(rows, factors, neighbors, together):
+        bought_cols, _ = user_item.row_items(row)
+        np.testing.assert_allclose(factor, latent.project(bought_cols), rtol=1e-5, atol=1e-6)
+        single_rows, single_sims = latent.nearest(latent.project(bought_cols), 5, exclude=row)
+        assert row not in neighbor_rows and neighbor_rows.tolist() == single_rows.tolist()
+        np.testing.assert_allclose(sims, single_sims, rtol=1e-5)
+        single_cols, single_scores = score_fold_in(user_item, neighbor_rows, sims, bought_cols, top_n=5, weighted=True)
+        assert cols.tolist() == single_cols.tolist()
+        np.testing.assert_allclose(scores, single_scores)
@@ -0,0 +1,43 @@
+"""
+Chunked ingestion: reading a file in many chunks must accumulate exactly what
+one chunk does (counts, vocabularies, basket and catalog).
+"""
+import numpy as np
+import pytest
+
+import ingest as ingest_module
+from ingest import ingest
+
+
+def assert_same_counts(many, one):
+    many_totals, many_rows, many_items = many.sorted_totals()
+    one_totals, one_rows, one_items = one.sorted_totals()
+    assert many_rows.equals(one_rows) and many_items.equals(one_items)
+    assert (many_totals != one_totals).nnz == 0
+
+
+@pytest.mark.parametrize("merge_min_entries", [1, ingest_module.MERGE_MIN_ENTRIES])
+def test_multi_chunk_ingest_equals_single_chunk(transactions_csv, monkeypatch, merge_min_entries):
+    # A tiny merge threshold folds pending chunks into the accumulated matrix many times
+    monkeypatch.setattr(ingest_module, "MERGE_MIN_ENTRIES", merge_min_entries)
+    many = ingest(transactions_csv, chunksize=997)
+    one = ingest(transactions_csv, chunksize=10_000_000)
+
+    assert many.rows == one.rows
+    assert_same_counts(many.user_item, one.user_item)
+    assert_same_counts(many.basket, one.basket)
+    assert many.product_catalog().equals(one.product_catalog())
+
+
+def test_directory_input_equals_concatenated_file(transactions_csv, tmp_path):
+    lines = open(transactions_csv).read().splitlines(keepends=True)
+    header, body = lines[0], lines[1:]
+    half = len(body) // 2
+    (tmp_path / "a.csv").write_text(header + "".join(body[:half]))
+    (tmp_path / "b.csv").write_text(header + "".join(body[half:]))
+
+    split = ingest(str(tmp_path), chunksize=1500)
+    whole = ingest(transactions_csv)
+    assert split.rows == whole.rows
+    assert_same_counts(split.user_item, whole.user_item)
+    assert np.array_equal(split.basket.binary()[0].toarray(), whole.basket.binary()[0].toarray())
@@ -0,0 +1,53 @@
+"""
+Incremental item-neighbor updates against a full rebuild.
+
+Binary purchases produce many tied cosines, so lists are compared by their
+similarities, and every listed neighbor is checked against the exact cosine.
+"""
+import numpy as np
+import pytest
+from scipy import sparse
+
+from app.services.item_similarity import build_item_neighbors, update_item_neighbors
+
+
+def cosine(purchased):
+    x = sparse.csc_matrix(purchased, dtype=np.float64)
+    norms = np.sqrt(np.asarray(x.sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    return (x.T @ x).toarray() / np.outer(norms, norms)
+
+
+def assert_same_lists(updated, rebuilt, purchased):
+    np.testing.assert_allclose(updated.similarities, rebuilt.similarities, atol=1e-6, equal_nan=True)
+    exact = cosine(purchased)
+    rows, slots = np.nonzero(updated.neighbors >= 0)
+    cols = updated.neighbors[rows, slots]
+    assert (cols != rows).all()
+    np.testing.assert_allclose(updated.similarities[rows, slots], exact[rows, cols], atol=1e-6)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_update_item_neighbors_equals_full_rebuild(seed):
+    rng = np.random.default_rng(seed)
+    n_users, n_items, k = 150, 60, 8
+    purchased = rng.random((n_users, n_items)) < 0.08
+    index = build_item_neighbors(sparse.csr_matrix(purchased, dtype=np.float32), k=k)
+
+    # A batch: new users and items, and new purchases of a few existing items
+    grown = np.zeros((n_users + 10, n_items + 5), dtype=bool)
+    grown[:n_users, :n_items] = purchased
+    batch = rng.random(grown.shape) < 0.03
+    batch[:, rng.choice(n_items, size=n_items - 12, replace=False)] = False
+    grown |= batch
+    grown = sparse.csr_matrix(grown, dtype=np.float32)
+    changed_cols = np.flatnonzero(batch.any(axis=0))
+
+    updated = update_item_neighbors(index, grown, changed_cols)
+    assert_same_lists(updated, build_item_neighbors(grown, k=k), grown)
+
+
+def test_trained_item_neighbors_equal_rebuild(trained_models):
+    purchased = trained_models.user_item_matrix.purchased
+    index = trained_models.item_neighbors
+    assert_same_lists(index, build_item_neighbors(purchased, k=index.k), purchased)
@@ -0,0 +1,68 @@
+"""
+Offline materialization: the stored lists must be the online top-N lists (any
+prefix of them, for a smaller top_n), written to a new version so files the
+API has memory-mapped are never rewritten.
+"""
+import os
+
+import numpy as np
+import pytest
+
+import materialize_recommendations
+from app.services.array_store import load_arrays, save_arrays
+from app.services.collaborative import score_users
+from app.services.materialized import ARRAY_ARTIFACT
+from app.services.model_store import activate_version, copy_version_dir, current_version, load_bundle
+
+
+BASE = "base"
+
+
+@pytest.fixture
+def materialize(trained_models, tmp_path, monkeypatch):
+    """Run the job with top-10 lists on a copy of the trained version as CURRENT; returns the models root."""
+    copy_version_dir(trained_models.model_path, str(tmp_path / BASE))
+    activate_version(str(tmp_path), BASE)
+    monkeypatch.setattr(materialize_recommendations, "MODEL_PATH", str(tmp_path))
+
+    def run(weighted=False):
+        materialize_recommendations.materialize(top_n=10, weighted=weighted, workers=1, chunk_users=64)
+        return str(tmp_path)
+    return run
+
+
+@pytest.mark.parametrize("weighted", [False, True])
+def test_materialized_lists_equal_online_prefix(materialize, weighted):
+    bundle = load_bundle(materialize(weighted))
+    lists = bundle.materialized
+    assert lists is not None and lists.top_n == 10 and lists.covers(5, weighted)
+    rows = np.arange(bundle.user_item_matrix.n_users)
+    for top_n in (1, 5, 10):
+        online = score_users(bundle.user_item_matrix, bundle.neighbor_index, rows, top_n, weighted=weighted)
+        for row, (cols, scores) in zip(rows, online):
+            stored_cols, stored_scores = lists.lookup(row, top_n)
+            assert stored_cols.tolist() == cols.tolist()
+            np.testing.assert_allclose(stored_scores, scores, rtol=1e-6)
+
+
+def test_materialize_writes_and_activates_a_new_version(materialize):
+    root = materialize()
+    version = current_version(root)
+    assert version != BASE
+    assert not os.path.exists(os.path.join(root, BASE, f"{ARRAY_ARTIFACT}.json"))
+    assert os.path.exists(os.path.join(root, version, f"{ARRAY_ARTIFACT}.json"))
+    # The other artifacts are shared with the base version, not copied
+    base_file, new_file = (os.path.join(root, v, "user_item.data.npy") for v in (BASE, version))
+    assert os.path.samefile(base_file, new_file)
+
+
+def test_save_arrays_never_rewrites_a_mapped_file(tmp_path):
+    save_arrays(str(tmp_path), "demo", {"values": np.arange(1000, dtype=np.int64)})
+    mapped, _ = load_arrays(str(tmp_path), "demo", mmap=True)
+    save_arrays(str(tmp_path), "demo", {"values": np.zeros(10, dtype=np.int64)})
+
+    # The old map still reads the previous (replaced) file
+    assert mapped["values"][999] == 999
+    reloaded, manifest = load_arrays(str(tmp_path), "demo", mmap=True)
+    assert reloaded["values"].tolist() == [0] * 10 and manifest["arrays"]["values"]["shape"] == [10]
+    assert sorted(os.listdir(tmp_path)) == ["demo.json", "demo.values.npy"]
@@ -0,0 +1,109 @@
+"""
+Incremental updates: a version trained on the first invoices and updated with
+the rest must hold the same purchase and itemset counts as a full recount of
+all of them, and the merged user neighbor table must equal a full rebuild.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import train_and_save
+import update_models
+from app.services.model_store import current_version, resolve_model_dir
+from app.services.neighbors import (
+    NeighborIndex, build_neighbor_index, exact_neighbor_rows, merge_changed_neighbors, standardize_rows,
+)
+from app.services.user_item import load_user_item_matrix
+from ingest import ingest
+from training_state import load_itemset_counts, load_user_item_counts, retrain_reason
+
+
+def cells(totals, user_ids, stock_codes) -> pd.Series:
+    """Non-zero sums keyed by (customer id, stock code), independent of row/column order."""
+    coo = totals.tocoo()
+    index = pd.MultiIndex.from_arrays([np.asarray(user_ids)[coo.row], np.asarray(stock_codes, dtype=object)[coo.col]])
+    return pd.Series(coo.data, index=index).sort_index()
+
+
+@pytest.fixture
+def updated(transactions_csv, tmp_path, monkeypatch):
+    """(updated version directory, full transactions path) after training on part of the invoices."""
+    df = pd.read_csv(transactions_csv, dtype=str)
+    # Split by invoice: the update batch only brings new invoices
+    invoices = df["InvoiceNo"].str.lstrip("C").astype(int)
+    cutoff = invoices.quantile(0.7)
+    df[invoices <= cutoff].to_csv(tmp_path / "history.csv", index=False)
+    df[invoices > cutoff].to_csv(tmp_path / "batch.csv", index=False)
+
+    root = tmp_path / "models"
+    root.mkdir()
+    monkeypatch.setattr(train_and_save, "MODEL_PATH", str(root))
+    monkeypatch.setattr(update_models, "MODEL_PATH", str(root))
+    train_and_save.train_and_save_models(input_path=str(tmp_path / "history.csv"))
+    base = current_version(str(root))
+    update_models.update_models(str(tmp_path / "batch.csv"))
+    version, path = resolve_model_dir(str(root))
+    assert version != base
+    return path
+
+
+def test_update_counts_equal_full_recount(updated, transactions_csv):
+    full = ingest(transactions_csv)
+    totals, user_ids, stock_codes = full.user_item.sorted_totals()
+
+    user_item = load_user_item_matrix(updated, mmap=False)
+    counts = load_user_item_counts(updated)
+    pd.testing.assert_series_equal(cells(counts, user_item.user_ids, user_item.stock_codes), cells(totals, user_ids, stock_codes))
+    assert sorted(user_item.user_ids.tolist()) == sorted(user_ids.tolist())
+
+    state = load_itemset_counts(updated)
+    basket, _, products = full.basket.binary()
+    assert state["n_baskets"] == basket.shape[0]
+    np.testing.assert_array_equal(state["counts"], update_models.count_itemsets(state["itemsets"], basket, products))
+    assert state["updates"] == 1 and state["full_baskets"] < state["n_baskets"]
+
+
+def test_failed_training_leaves_no_version(transactions_csv, tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(train_and_save, "MODEL_PATH", str(tmp_path))
+    monkeypatch.setattr(train_and_save, "save_user_item_counts", fail)
+    with pytest.raises(RuntimeError):
+        train_and_save.train_and_save_models(input_path=transactions_csv)
+    assert os.listdir(tmp_path) == []
+
+
+def test_retrain_guard():
+    state = {"n_baskets": 100, "full_baskets": 100, "updates": 0}
+    assert retrain_reason(state) is None
+    assert retrain_reason({**state, "updates": 3}, max_updates=3) is not None
+    assert retrain_reason({**state, "n_baskets": 151}, max_growth=0.5) is not None
+    # States saved before the guard existed count as freshly trained
+    assert retrain_reason({"n_baskets": 100}) is None
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_merged_neighbors_equal_full_rebuild(seed):
+    rng = np.random.default_rng(seed)
+    n_users, new_users, k = 200, 15, 10
+    factors = rng.normal(size=(n_users, 6))
+    old = build_neighbor_index(factors, k=k)
+
+    # New users appended, and some existing users with new factors
+    changed_users = rng.choice(n_users, size=20, replace=False)
+    factors = np.vstack([factors, rng.normal(size=(new_users, 6))])
+    factors[changed_users] = rng.normal(size=(len(changed_users), 6))
+    z = standardize_rows(factors)
+    changed = np.concatenate([changed_users, np.arange(n_users, n_users + new_users)])
+
+    neighbors = np.vstack([old.neighbors, np.full((new_users, k), -1, dtype=np.int32)])
+    similarities = np.vstack([old.similarities, np.full((new_users, k), np.nan, dtype=np.float32)])
+    neighbors[changed], similarities[changed] = exact_neighbor_rows(z, changed, k)
+    merged = merge_changed_neighbors(NeighborIndex(neighbors, similarities), z, changed)
+
+    rebuilt = build_neighbor_index(factors, k=k)
+    np.testing.assert_array_equal(merged.neighbors, rebuilt.neighbors)
+    np.testing.assert_allclose(merged.similarities, rebuilt.similarities, atol=1e-5)